@@ -28,8 +28,8 @@ bl_info = {
 }
 
 import bpy
-from .ui import panel_bbox, save_panel
-from .operators import bbox_tracker
+from .ui import panel_bbox, save_panel, panel_randomization, panel_gate
+from .operators import bbox_tracker, randomization, frame_gate, resume
 from . import addon_updater_ops
 
 
@@ -104,6 +104,11 @@ def register():
 
     panel_bbox.register()
     bbox_tracker.register()
+    panel_randomization.register()
+    randomization.register()
+    panel_gate.register()
+    frame_gate.register()
+    resume.register()
 
     save_panel.register()
 
@@ -118,6 +123,11 @@ def unregister():
 
     panel_bbox.unregister()
     bbox_tracker.unregister()
+    resume.unregister()
+    frame_gate.unregister()
+    panel_gate.unregister()
+    randomization.unregister()
+    panel_randomization.unregister()
 
     save_panel.unregister()
 
@@ -0,0 +1,136 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+"""
+Micro-benchmarks of the bpy-free annotation core (utils/bbox_core.py and utils/occlusion.py).
+Runs with plain CPython and NumPy, no Blender needed:
+
+    python benchmarks/bench_core.py --counts 1000 100000 1000000
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+UTILS_DIR = Path(__file__).resolve().parent.parent / "utils"
+
+
+def load_module(name):
+    """Load a standalone module from utils/ without importing the add-on package (which needs bpy)."""
+    spec = importlib.util.spec_from_file_location(f"blv_{name}", UTILS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+core = load_module("bbox_core")
+occlusion = load_module("occlusion")
+
+
+def make_camera(resolution):
+    """A 50mm / 36mm sensor perspective camera at the origin looking down -Z, as (world_to_camera, frame, is_ortho)."""
+    res_x, res_y = resolution
+    half_x = 18.0 / 50.0
+    half_y = half_x * res_y / res_x
+    frame = np.array([[half_x, half_y, -1.0], [half_x, -half_y, -1.0], [-half_x, -half_y, -1.0]])
+    return np.eye(4), frame, False
+
+
+def make_instances(count, rng):
+    """Random transforms of unit cubes scattered in front of the camera."""
+    extent = max(2.0, 1.5 * count ** (1 / 3))
+    locations = rng.uniform(-extent, extent, (count, 3))
+    locations[:, 2] -= 3 * extent
+    rotations = rng.normal(size=(count, 4))
+    sizes = rng.uniform(0.5, 1.5, count)
+    return locations, rotations, sizes
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, {"min_s": min(times), "mean_s": sum(times) / len(times)}
+
+
+def run(count, args):
+    rng = np.random.default_rng(args.seed)
+    camera = make_camera(args.resolution)
+    local_corners = np.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)])
+    locations, rotations, sizes = make_instances(count, rng)
+    phases = {}
+
+    matrices, phases["compose_matrices"] = timed(lambda: core.compose_matrices(locations, rotations, sizes), args.repeat)
+    corners, phases["transform_corners"] = timed(lambda: core.transform_corners(matrices, local_corners), args.repeat)
+    corners_ndc, phases["project"] = timed(lambda: core.project_points_to_ndc(corners, *camera), args.repeat)
+    (accepted, boxes, fraction), phases["bbox_filter"] = timed(
+        lambda: core.calculate_bboxes_from_ndc_batch(corners_ndc, args.resolution), args.repeat)
+    _, phases["keypoints"] = timed(
+        lambda: core.calculate_keypoints_from_ndc(corners_ndc[accepted], args.resolution), args.repeat)
+
+    def occlusion_prepass():
+        depths = corners_ndc[..., 2]
+        points, valid = occlusion.clip_boxes_to_near_plane(corners, depths, 0.1, core.BBOX_KEYPOINT_SKELETON)
+        occluders, near, keep = occlusion.project_occluder_boxes(
+            core.project_points_to_ndc(points, *camera), valid, args.resolution, 0.1)
+        hzb = occlusion.HierarchicalZBuffer(*args.resolution)
+        hzb.insert(occluders[keep], near[keep], np.flatnonzero(keep))
+        centers = core.project_points_to_ndc(corners.mean(axis=1), *camera)
+        pixels = np.stack([centers[:, 0] * args.resolution[0], (1 - centers[:, 1]) * args.resolution[1]], axis=1)
+        return hzb.occluder_depth(pixels, np.arange(count)) >= centers[:, 2]
+    clear, phases["occlusion_prepass"] = timed(occlusion_prepass, args.repeat)
+
+    total = sum(phase["mean_s"] for phase in phases.values())
+    return {
+        "count": count,
+        "boxes": int(accepted.sum()),
+        "occlusion_clear": int((clear & accepted).sum()),
+        "phases": phases,
+        "instances_per_sec": count / total if total else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the bpy-free annotation core.")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--resolution", type=int, nargs=2, default=[1920, 1080])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    args.resolution = tuple(args.resolution)
+
+    report = {"numpy": np.__version__, "python": sys.version.split()[0], "cases": [run(n, args) for n in args.counts]}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
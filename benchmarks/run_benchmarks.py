@@ -0,0 +1,395 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+"""
+Headless annotation benchmarks for bl-vision.
+
+Builds procedural scenes of mesh objects, geometry nodes instances and particles at several scales,
+times compute_bounding_boxes (without raycast and with every raycast method) and every label writer,
+and writes a JSON report with per-phase times, frames/sec and peak memory.
+
+Usage (from the repository root):
+    blender -b --factory-startup --python benchmarks/run_benchmarks.py -- \\
+        --scales 10 1000 10000 100000 1000000 --output bench_output.json
+
+Run `... --python benchmarks/run_benchmarks.py -- --help` for all options.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import bpy
+import bmesh
+import numpy as np
+from mathutils import Vector
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ADDON_NAME = "bl_vision"
+
+SCENE_TYPES = ["objects", "instances", "particles"]
+RAYCAST_METHODS = ["fast", "fast_prepass", "multi", "accurate"]
+WRITERS = ["YOLO", "COCO", "COLUMNAR"]
+
+
+###
+# Add-on loading
+###
+
+def load_addon():
+    """Import the add-on from the repository (its folder name is not a valid module name) and register it."""
+    spec = importlib.util.spec_from_file_location(
+        ADDON_NAME, REPO_ROOT / "__init__.py", submodule_search_locations=[str(REPO_ROOT)]
+    )
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_NAME] = addon
+    spec.loader.exec_module(addon)
+
+    # Only the parts the annotation pipeline needs; the updater is not used headless
+    addon.panel_bbox.register()
+    addon.bbox_tracker.register()
+    addon.save_panel.register()
+
+    modules = {}
+    for name in ("operators.bbox_tracker", "utils.yolo_bbox", "utils.coco_bbox",
+                 "utils.columnar_bbox", "utils.profiling"):
+        modules[name.split(".")[-1]] = importlib.import_module(f"{ADDON_NAME}.{name}")
+    return modules
+
+
+###
+# Scene building
+###
+
+def reset_scene():
+    """Remove everything the previous case created, keeping the (registered) scene properties."""
+    scene = bpy.context.scene
+    for collection in list(scene.collection.children):
+        scene.collection.children.unlink(collection)
+    bpy.data.batch_remove(list(bpy.data.objects) + list(bpy.data.meshes) + list(bpy.data.collections)
+                          + list(bpy.data.node_groups) + list(bpy.data.particles) + list(bpy.data.cameras))
+
+    settings = scene.blv_settings
+    settings.selected_objects.clear()
+    settings.selected_collections.clear()
+    settings.selected_emitter.clear()
+    return scene
+
+
+def make_cube_mesh(name, size=1.0):
+    mesh = bpy.data.meshes.new(name)
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=size)
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh
+
+
+def layout_extent(count):
+    """Half-size of the cube the items are scattered in, so density is similar at every scale."""
+    return max(2.0, 1.5 * count ** (1 / 3))
+
+
+def random_points(count, extent, seed=0):
+    return np.random.default_rng(seed).uniform(-extent, extent, (count, 3))
+
+
+def add_camera(scene, extent, resolution):
+    cam_data = bpy.data.cameras.new("BenchCamera")
+    cam_data.clip_end = extent * 10
+    cam = bpy.data.objects.new("BenchCamera", cam_data)
+    scene.collection.objects.link(cam)
+    cam.location = Vector((0.0, -3.0 * extent, 1.5 * extent))
+    cam.rotation_euler = (-cam.location).to_track_quat('-Z', 'Y').to_euler()
+    scene.camera = cam
+    scene.render.resolution_x, scene.render.resolution_y = resolution
+    scene.render.resolution_percentage = 100
+
+
+def build_objects_scene(scene, count, seed):
+    """`count` separate mesh objects sharing one cube mesh, labeled through a collection."""
+    collection = bpy.data.collections.new("BenchObjects")
+    scene.collection.children.link(collection)
+    mesh = make_cube_mesh("BenchCube")
+    extent = layout_extent(count)
+
+    for i, location in enumerate(random_points(count, extent, seed)):
+        obj = bpy.data.objects.new(f"BenchCube.{i:07d}", mesh)
+        obj.location = location
+        collection.objects.link(obj)
+
+    item = scene.blv_settings.selected_collections.add()
+    item.collection = collection
+    item.category_id = 1
+    scene.blv_settings.mode = 'COLLECTION'
+    return extent
+
+
+def build_instances_scene(scene, count, seed):
+    """A point cloud with `count` vertices instancing a cube through geometry nodes."""
+    collection = bpy.data.collections.new("BenchInstances")
+    scene.collection.children.link(collection)
+    extent = layout_extent(count)
+
+    source = bpy.data.objects.new("BenchSource", make_cube_mesh("BenchSourceMesh"))
+    source.location = (0.0, 0.0, -4.0 * extent)  # Out of view, only instanced
+    collection.objects.link(source)
+
+    points_mesh = bpy.data.meshes.new("BenchPoints")
+    points_mesh.vertices.add(count)
+    points_mesh.vertices.foreach_set("co", random_points(count, extent, seed).ravel())
+    points = bpy.data.objects.new("BenchPoints", points_mesh)
+    scene.collection.objects.link(points)
+
+    tree = bpy.data.node_groups.new("BenchInstanceOnPoints", 'GeometryNodeTree')
+    tree.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+    tree.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+    group_in = tree.nodes.new('NodeGroupInput')
+    group_out = tree.nodes.new('NodeGroupOutput')
+    info = tree.nodes.new('GeometryNodeObjectInfo')
+    info.inputs["Object"].default_value = source
+    info.inputs["As Instance"].default_value = True
+    rotation = tree.nodes.new('FunctionNodeRandomValue')
+    rotation.data_type = 'FLOAT_VECTOR'
+    rotation.inputs["Max"].default_value = (2 * math.pi,) * 3
+    instance = tree.nodes.new('GeometryNodeInstanceOnPoints')
+    tree.links.new(group_in.outputs[0], instance.inputs["Points"])
+    tree.links.new(info.outputs["Geometry"], instance.inputs["Instance"])
+    tree.links.new(rotation.outputs["Value"], instance.inputs["Rotation"])
+    tree.links.new(instance.outputs["Instances"], group_out.inputs[0])
+    points.modifiers.new("Instances", 'NODES').node_group = tree
+
+    item = scene.blv_settings.selected_collections.add()
+    item.collection = collection
+    item.category_id = 1
+    item.include_instances = True
+    scene.blv_settings.mode = 'COLLECTION'
+    return extent
+
+
+def build_particles_scene(scene, count, seed):
+    """A hidden cube emitter with `count` particles rendered as a cube object."""
+    extent = layout_extent(count)
+    source = bpy.data.objects.new("BenchParticle", make_cube_mesh("BenchParticleMesh"))
+    source.location = (0.0, 0.0, -4.0 * extent)
+    scene.collection.objects.link(source)
+
+    emitter = bpy.data.objects.new("BenchEmitter", make_cube_mesh("BenchEmitterMesh", size=2 * extent))
+    emitter.show_instancer_for_render = False
+    emitter.show_instancer_for_viewport = False
+    scene.collection.objects.link(emitter)
+
+    emitter.modifiers.new("Particles", 'PARTICLE_SYSTEM')
+    psys = emitter.particle_systems[0]
+    psys.seed = seed
+    particles = psys.settings
+    particles.count = count
+    particles.frame_start = particles.frame_end = 1
+    particles.lifetime = 10000
+    particles.emit_from = 'VOLUME'
+    particles.physics_type = 'NO'
+    particles.render_type = 'OBJECT'
+    particles.instance_object = source
+    particles.particle_size = 1.0
+    particles.use_rotations = True
+    particles.rotation_factor_random = 1.0
+
+    item = scene.blv_settings.selected_emitter.add()
+    item.emitter_obj = emitter
+    item.category_id = 1
+    scene.blv_settings.mode = 'PARTICLE'
+    return extent
+
+
+SCENE_BUILDERS = {
+    "objects": build_objects_scene,
+    "instances": build_instances_scene,
+    "particles": build_particles_scene,
+}
+
+
+###
+# Timing
+###
+
+def timed(fn, repeat, quiet=True):
+    """Run `fn` `repeat` times. Returns (last result, {"min_s", "mean_s"})."""
+    times = []
+    out = None
+    for _ in range(max(1, repeat)):
+        sink = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            start = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - start)
+    return out, {"min_s": min(times), "mean_s": sum(times) / len(times)}
+
+
+def configure_raycast(settings, method):
+    settings.raycast_bool = method is not None
+    if method is None:
+        return
+    settings.raycast_enum = "fast" if method == "fast_prepass" else method
+    settings.occlusion_prepass = method == "fast_prepass"
+
+
+def run_case(modules, scene_type, count, args):
+    compute_bounding_boxes = modules["bbox_tracker"].compute_bounding_boxes
+    scene = reset_scene()
+    settings = scene.blv_settings
+    phases = {}
+    case = {"scene": scene_type, "count": count, "phases": phases}
+
+    start = time.perf_counter()
+    extent = SCENE_BUILDERS[scene_type](scene, count, args.seed)
+    add_camera(scene, extent, args.resolution)
+    phases["build"] = {"min_s": time.perf_counter() - start}
+
+    # First evaluation of the dependency graph (modifiers, particles), outside of the annotation timings
+    def evaluate():
+        scene.frame_set(1)
+        bpy.context.evaluated_depsgraph_get()
+    _, phases["evaluate"] = timed(evaluate, 1, args.quiet)
+
+    configure_raycast(settings, None)
+    if scene_type == "particles":
+        settings.particle_source = 'INSTANCES'
+        _, phases["compute_render_instances"] = timed(
+            lambda: compute_bounding_boxes(scene, include_save=False), args.repeat, args.quiet)
+        settings.particle_source = 'PARTICLES'
+
+    (results, num_blocked, category_mapping, messages), phases["compute"] = timed(
+        lambda: compute_bounding_boxes(scene, include_save=False), args.repeat, args.quiet)
+    result = results[scene.camera.name]
+    case["boxes"] = len(result)
+    case["frames_per_sec"] = 1.0 / phases["compute"]["mean_s"] if phases["compute"]["mean_s"] else None
+
+    for method in RAYCAST_METHODS:
+        limit = args.max_accurate if method == "accurate" else args.max_raycast
+        if count > limit:
+            phases[f"raycast_{method}"] = {"skipped": f"count above {limit}"}
+            continue
+        configure_raycast(settings, method)
+        (ray_results, *_), phases[f"raycast_{method}"] = timed(
+            lambda: compute_bounding_boxes(scene, include_save=False), args.repeat, args.quiet)
+        phases[f"raycast_{method}"]["boxes"] = len(ray_results[scene.camera.name])
+    configure_raycast(settings, None)
+
+    render_size = (scene.render.resolution_x, scene.render.resolution_y)
+    with tempfile.TemporaryDirectory(prefix="blv_bench_") as tmp:
+        for writer in WRITERS:
+            runs = iter(range(max(1, args.repeat)))
+
+            def write():
+                # A fresh directory per run, so COCO doesn't merge into the previous run's file
+                out_dir = Path(tmp) / writer / str(next(runs))
+                out_dir.mkdir(parents=True)
+                if writer == "YOLO":
+                    modules["yolo_bbox"].save_bboxes_yolo_format(
+                        result, 1, *render_size, out_dir, category_mapping)
+                elif writer == "COCO":
+                    modules["coco_bbox"].save_bboxes_coco_format(result, 1, *render_size, out_dir)
+                else:
+                    modules["columnar_bbox"].save_bboxes_columnar_format(result, 1, out_dir)
+                    modules["columnar_bbox"].flush_columnar_writers()
+
+            _, phases[f"write_{writer.lower()}"] = timed(write, args.repeat, args.quiet)
+
+    # The peak is over the whole process (all cases so far), the current RSS is what this case left in use
+    case["rss_mb"] = modules["profiling"].get_current_rss_mb()
+    case["peak_rss_mb"] = modules["profiling"].get_peak_rss_mb()
+    return case
+
+
+###
+# Report
+###
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="run_benchmarks.py",
+                                     description="Headless annotation benchmarks for bl-vision.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 1000, 10000, 100000, 1000000])
+    parser.add_argument("--scenes", nargs="+", choices=SCENE_TYPES, default=SCENE_TYPES)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per phase")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[1920, 1080])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-objects", type=int, default=10000,
+                        help="Largest count for the separate objects scene (object creation is slow)")
+    parser.add_argument("--max-raycast", type=int, default=100000,
+                        help="Largest count timed with the fast and multi-ray methods")
+    parser.add_argument("--max-accurate", type=int, default=1000,
+                        help="Largest count timed with the accurate raycast method")
+    parser.add_argument("--output", type=Path, default=REPO_ROOT / "bench_output.json")
+    parser.add_argument("--verbose", dest="quiet", action="store_false",
+                        help="Keep the add-on's console output during timed runs")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    modules = load_addon()
+
+    report = {
+        "commit": git_commit(),
+        "blender": bpy.app.version_string,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "resolution": args.resolution,
+        "repeat": args.repeat,
+        "cases": [],
+    }
+
+    for scene_type in args.scenes:
+        for count in args.scales:
+            if scene_type == "objects" and count > args.max_objects:
+                report["cases"].append({"scene": scene_type, "count": count,
+                                        "skipped": f"count above --max-objects {args.max_objects}"})
+                continue
+            print(f"⏱️ Benchmark: {scene_type} x {count}")
+            case = run_case(modules, scene_type, count, args)
+            print(f"   {case['boxes']} boxes, {case['frames_per_sec']:.2f} frames/sec, "
+                  f"memory {case['rss_mb']} MB, process peak RSS {case['peak_rss_mb']} MB")
+            report["cases"].append(case)
+
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"📄 Benchmark report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,10 +19,19 @@ Created by Ryan Revilla
 '''
 
 from .bbox_tracker import register as register_bbox_tracker, unregister as unregister_bbox_tracker
+from .randomization import register as register_randomization, unregister as unregister_randomization
+from .frame_gate import register as register_frame_gate, unregister as unregister_frame_gate
+from .resume import register as register_resume, unregister as unregister_resume
 
 
 def register():
     register_bbox_tracker()
+    register_randomization()
+    register_frame_gate()
+    register_resume()
 
 def unregister():
+    unregister_resume()
+    unregister_frame_gate()
+    unregister_randomization()
     unregister_bbox_tracker()
\ No newline at end of file
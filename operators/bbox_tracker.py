@@ -20,9 +20,19 @@ Created by Ryan Revilla
 
 import bpy
 import os
+from pathlib import Path
 from ..utils.yolo_bbox import generate_yolo_category_files, save_bboxes_yolo_format
-from ..utils.coco_bbox import save_bboxes_coco_format
-from ..utils.bbox_utils import loop_over_particles, get_filtered_bbox, loop_over_instances_from_selection
+from ..utils.coco_bbox import save_bboxes_coco_format, coco_image_exists
+from ..utils.columnar_bbox import save_bboxes_columnar_format, flush_columnar_writers
+from ..utils.bbox_result import BBoxResult
+from ..utils.file_utils import should_fsync, file_exists
+from ..utils.dataset_split import get_frame_split
+from ..utils.manifest import (get_manifest_path, new_manifest_entry, state_hash, file_checksum,
+                              stage_manifest_entries, commit_manifest_entries, columnar_part_key)
+from ..utils.profiling import block_size_for_memory, get_current_rss_mb, get_peak_rss_mb
+from ..utils.bbox_utils import (loop_over_particles, get_filtered_bbox, loop_over_instances_from_selection,
+                                loop_over_particle_instances, apply_fast_occlusion, get_render_views)
+from ..utils.bbox_core import BBOX_KEYPOINT_NAMES, BBOX_KEYPOINT_SKELETON
 
 class RunMeshBBoxOperator(bpy.types.Operator):
     """Run Mesh Bounding Box Detection"""
@@ -32,15 +42,23 @@ class RunMeshBBoxOperator(bpy.types.Operator):
 
     def execute(self, context):
         scene = context.scene
-        bboxes, cat_ids, num_blocked, cat_map, messages = compute_bounding_boxes(scene, include_save=True)
-        
+        if keep_existing_labels(scene) and frame_labels_exist(scene, scene.frame_current):
+            self.report({'INFO'}, f"⏭️ Labels of frame {scene.frame_current} exist. Skipping (overwrite is off).")
+            return {'FINISHED'}
+
+        results, num_blocked, cat_map, messages = compute_bounding_boxes(scene, include_save=True)
+        num_boxes = sum(len(result) for result in results.values())
+
+        # Outside of a render there is no render_complete event, so write buffered columnar parts now
+        if not bpy.app.is_job_running('RENDER'):
+            flush_columnar_writers()
 
         for level, msg in messages:
             self.report({level}, msg)
 
 
-        if bboxes:
-            self.report({'INFO'}, f"✅ Found {len(bboxes)} bounding boxes | Out of View: {num_blocked}")
+        if num_boxes:
+            self.report({'INFO'}, f"✅ Found {num_boxes} bounding boxes in {len(results)} view(s) | Out of View: {num_blocked}")
         else:
             self.report({'WARNING'}, f"⚠️ No bounding boxes detected in frame {scene.frame_current}.")
 
@@ -53,13 +71,14 @@ class RunTestMeshBBoxOperator(bpy.types.Operator):
 
     def execute(self, context):
         scene = context.scene
-        bboxes, cat_ids, num_blocked, cat_map, messages = compute_bounding_boxes(scene, include_save=False)
+        results, num_blocked, cat_map, messages = compute_bounding_boxes(scene, include_save=False)
+        num_boxes = sum(len(result) for result in results.values())
 
         for level, msg in messages:
             self.report({level}, msg)
 
-        if bboxes:
-            self.report({'INFO'}, f"[TEST] Found {len(bboxes)} bounding boxes | Out of View: {num_blocked}")
+        if num_boxes:
+            self.report({'INFO'}, f"[TEST] Found {num_boxes} bounding boxes in {len(results)} view(s) | Out of View: {num_blocked}")
         else:
             self.report({'WARNING'}, f"⚠️ [TEST] No bounding boxes detected in frame {scene.frame_current}.")
 
@@ -78,40 +97,181 @@ class ChangeRenderDirectoryToFormat(bpy.types.Operator):
         return {'FINISHED'}
 
 
+def get_bbox_filters(settings):
+    """Box filter thresholds (see bbox_filter_mask) from the scene tracking settings."""
+    return {
+        "min_size": settings.min_bbox_size,
+        "min_area": settings.min_bbox_area,
+        "max_truncation": settings.max_truncation,
+        "max_aspect_ratio": settings.max_aspect_ratio,
+        "min_screen_fraction": settings.min_screen_fraction,
+        "max_depth": settings.max_depth,
+    }
+
+
+def get_rig_cameras(scene):
+    """Cameras to label: the camera rig when enabled, otherwise the scene camera."""
+    settings = scene.blv_settings
+    if settings.use_camera_rig:
+        cameras = []
+        for item in settings.rig_cameras:
+            if item.object is not None and item.object.type == 'CAMERA' and item.object not in cameras:
+                cameras.append(item.object)
+        return cameras
+    return [scene.camera] if scene.camera else []
+
+
+def get_camera_label_dir(scene, label_dir, cam):
+    """Label directory of one camera: a per-camera subfolder when the camera rig is enabled."""
+    if scene.blv_settings.use_camera_rig:
+        return os.path.join(label_dir, cam.name)
+    return label_dir
+
+
+def get_render_image_path(scene, suffix=""):
+    """Image file Blender writes for the current frame and render view (file suffix inserted before the extension)."""
+    path = Path(bpy.path.abspath(scene.render.frame_path(frame=scene.frame_current)))
+    if suffix:
+        path = path.with_name(f"{path.stem}{suffix}{path.suffix}")
+    return path
+
+
+def get_scene_state_hash(scene, label_views):
+    """
+    Hash of the scene state that determines the labels of the current frame: the camera views,
+    the render size and the label settings. Two exports with the same hash used the same setup.
+    """
+    settings = scene.blv_settings
+    state = {
+        "frame": scene.frame_current,
+        "resolution": [scene.render.resolution_x, scene.render.resolution_y,
+                       scene.render.pixel_aspect_x, scene.render.pixel_aspect_y],
+        "views": {
+            view.name: {
+                "matrix": [[round(value, 6) for value in row] for row in view.matrix_world],
+                "lens": round(view.data.lens, 6),
+                "ortho_scale": round(view.data.ortho_scale, 6),
+                "type": view.data.type,
+                "shift": [round(view.data.shift_x + view.shift_x, 6), round(view.data.shift_y, 6)],
+            }
+            for view, *_ in label_views
+        },
+        "mode": settings.mode,
+        "filters": get_bbox_filters(settings),
+        "raycast": [settings.raycast_bool, settings.raycast_enum, settings.visibility_threshold],
+        "keypoints": scene.blv_save.keypoint_bool,
+        "randomization": [scene.blv_random.use_randomization, scene.blv_random.seed],
+    }
+    return state_hash(state)
+
+
+def get_label_views(scene, label_dir, rendered_only=False):
+    """
+    Every view to label as (CameraView, label directory, file suffix, view index, number of views, camera):
+    the render views (stereo eyes, multi-view cameras, or just the camera) of each camera to label.
+    With `rendered_only`, only the views of the scene camera, the one camera a render produces images for.
+    """
+    cameras = get_rig_cameras(scene)
+    if rendered_only:
+        # Labels are only written next to an image. Rig cameras are rendered one at a time (see render_frames).
+        cameras = [scene.camera] if scene.camera else []
+
+    label_views = []
+    for cam in cameras:
+        cam_label_dir = get_camera_label_dir(scene, label_dir, cam)
+        render_views = get_render_views(cam, scene)
+        for view_index, (view, suffix) in enumerate(render_views):
+            label_views.append((view, cam_label_dir, suffix, view_index, len(render_views), cam))
+    return label_views
+
+
+def keep_existing_labels(scene):
+    """
+    Whether existing labels are kept instead of rewritten. Only when Blender keeps the existing images too
+    (render Overwrite off), so fresh images never end up next to stale labels.
+    """
+    return not scene.blv_save.overwrite_bool and not scene.render.use_overwrite
+
+
+def frame_labels_exist(scene, frame):
+    """
+    True if every view of `frame` already has labels in the resolved label directory: its YOLO label file,
+    or its image in the COCO file. Uses the cached directory listing and COCO index, so skipping a labeled
+    frame costs no file system calls. Columnar output can't be checked per frame and always returns False.
+    """
+    props = scene.blv_save
+    label_views = get_label_views(scene, props.label_path, rendered_only=True)
+    if not label_views or props.format_enum not in ("YOLO", "COCO"):
+        return False
+
+    split = get_frame_split(props, frame)
+    for view, view_label_dir, suffix, view_index, num_views, cam in label_views:
+        if props.format_enum == "YOLO":
+            if not file_exists(Path(view_label_dir) / f"{props.file_prefix}{frame:04d}{suffix}.txt"):
+                return False
+        elif not coco_image_exists(Path(view_label_dir) / f"{split}.json", frame * num_views + view_index):
+            return False
+    return True
+
+
 def compute_bounding_boxes(scene, include_save=True):
     """
-    Computes 2D bounding boxes for objects in the scene using the active camera.
+    Computes 2D bounding boxes for objects in the scene for the scene camera, or for every camera
+    of the camera rig, and for every render view when multiview is enabled. When saving, only the
+    scene camera is labeled, since a render only writes its image (see get_label_views).
+    The scene is walked once; every object is projected into all views.
     Returns:
-        bboxes: List of 2D bounding box data
-        cat_ids: Corresponding category IDs
+        results: Dict of view name -> BBoxResult holding the 2D boxes, category IDs, object/instance IDs, visibility and depth
         num_blocked: Number of objects filtered out / blocked
         category_mapping: Dict of category_id -> category_name
-        objects: List of objects that produced valid bboxes
+        messages: List of (level, message) tuples to report
     """
-    cam = scene.camera
-    if not cam:
-        return [], [], 0, {}, [], [('ERROR', 'Camera not found!')]
+    num_keypoints = len(BBOX_KEYPOINT_NAMES) if scene.blv_save.keypoint_bool else 0
+    use_raycast = scene.blv_settings.raycast_bool
+    raycast_method = scene.blv_settings.raycast_enum
+    # Fast-mode occlusion runs once over all boxes after projection instead of one ray per box
+    use_prepass = use_raycast and raycast_method == "fast" and scene.blv_settings.occlusion_prepass
+
+    label_dir = scene.blv_save.label_path
+    save_bool = include_save and scene.blv_save.bbox_bool
+    label_views = get_label_views(scene, label_dir, rendered_only=save_bool)
+    if not label_views:
+        return {}, 0, {}, [('ERROR', 'Camera not found!')]
+
+    results = {view.name: BBoxResult(num_keypoints=num_keypoints, world_bounds=use_prepass)
+               for view, *_ in label_views}
+    views = [(view, results[view.name]) for view, *_ in label_views]
 
     render_res = (scene.render.resolution_x, scene.render.resolution_y)
-    bboxes = []
-    cat_ids = []
     num_blocked = 0
     category_mapping = {}
     messages = []
-
-    label_dir = scene.blv_save.label_path
-    save_bool = include_save and scene.blv_save.bbox_bool
     mode = scene.blv_settings.mode
     formatting = scene.blv_save.format_enum
 
-    use_raycast = scene.blv_settings.raycast_bool
-    raycast_method = scene.blv_settings.raycast_enum
+    if use_prepass:
+        use_raycast = False
     visibility_threshold = scene.blv_settings.visibility_threshold
+    ray_samples = scene.blv_settings.ray_samples
+    filters = get_bbox_filters(scene.blv_settings)
+    block_size = block_size_for_memory(scene.blv_settings.memory_limit_mb)
+
+    def add_object_bbox(obj, cat_id):
+        added = [
+            get_filtered_bbox(obj, cam, render_res, result, cat_id,
+                              filters=filters,
+                              use_raycast=use_raycast,
+                              raycast_method=raycast_method,
+                              visibility_threshold=visibility_threshold,
+                              ray_samples=ray_samples)
+            for cam, result in views
+        ]
+        return any(added)
 
     if mode == "COLLECTION":
         collection_list = scene.blv_settings.selected_collections
         if not collection_list or not collection_list[0].collection:
-            return [], [], 0, {}, [], [('ERROR', 'No valid collection selected!')]
+            return results, 0, {}, [('ERROR', 'No valid collection selected!')]
 
         for col in collection_list:
             cat_id = col.category_id
@@ -122,14 +282,7 @@ def compute_bounding_boxes(scene, include_save=True):
 
             for obj in object_list:
                 if obj.type == 'MESH':
-                    bbox_2d = get_filtered_bbox(obj, cam, render_res,
-                                                use_raycast=use_raycast,
-                                                raycast_method=raycast_method,
-                                                visibility_threshold=visibility_threshold)
-                    if bbox_2d:
-                        bboxes.append(bbox_2d)
-                        cat_ids.append(cat_id)
-                    else:
+                    if not add_object_bbox(obj, cat_id):
                         num_blocked += 1
 
             # Include instances
@@ -141,20 +294,19 @@ def compute_bounding_boxes(scene, include_save=True):
                 }
 
                 if object_to_cat:
-                    instance_bboxes, instance_cat_ids = loop_over_instances_from_selection(
+                    num_added = loop_over_instances_from_selection(
                         object_to_cat=object_to_cat,
-                        cam=cam,
+                        views=views,
                         scene=scene,
-                        min_bbox_size=5,
+                        filters=filters,
                         use_raycast=use_raycast,
                         raycast_method=raycast_method,
-                        visibility_threshold=visibility_threshold
+                        visibility_threshold=visibility_threshold,
+                        ray_samples=ray_samples,
+                        block_size=block_size
                     )
 
-                    if instance_bboxes:
-                        bboxes.extend(instance_bboxes)
-                        cat_ids.extend(instance_cat_ids)
-                    else:
+                    if not num_added:
                         num_blocked += 1
 
     elif mode == "OBJECT":
@@ -166,14 +318,7 @@ def compute_bounding_boxes(scene, include_save=True):
             category_mapping[cat_id] = obj.name
 
             if obj and obj.type == 'MESH':
-                bbox_2d = get_filtered_bbox(obj, cam, render_res,
-                                            use_raycast=use_raycast,
-                                            raycast_method=raycast_method,
-                                            visibility_threshold=visibility_threshold)
-                if bbox_2d:
-                    bboxes.append(bbox_2d)
-                    cat_ids.append(cat_id)
-                else:
+                if not add_object_bbox(obj, cat_id):
                     num_blocked += 1
 
         # Include instances
@@ -184,54 +329,119 @@ def compute_bounding_boxes(scene, include_save=True):
         }
 
         if object_to_cat:
-            instance_bboxes, instance_cat_ids = loop_over_instances_from_selection(
+            num_added = loop_over_instances_from_selection(
                 object_to_cat=object_to_cat,
-                cam=cam,
+                views=views,
                 scene=scene,
-                min_bbox_size=5,
+                filters=filters,
                 use_raycast=use_raycast,
                 raycast_method=raycast_method,
-                visibility_threshold=visibility_threshold
+                visibility_threshold=visibility_threshold,
+                ray_samples=ray_samples,
+                block_size=block_size
             )
 
-            if instance_bboxes:
-                bboxes.extend(instance_bboxes)
-                cat_ids.extend(instance_cat_ids)
-            else:
+            if not num_added:
                 num_blocked += 1
 
     elif mode == 'PARTICLE':
         emitter_list = scene.blv_settings.selected_emitter
-        # get evaluated depsgraph
-
-        for emitr in emitter_list:
-            cat_id = emitr.category_id
-            # for each particle emitter, get cat_id and rendered object name
 
+        if scene.blv_settings.particle_source == 'INSTANCES':
+            # One depsgraph instance traversal for all emitters
+            part_cat_names = loop_over_particle_instances(emitter_list, views, scene,
+                                                          filters=filters,
+                                                          use_raycast=use_raycast,
+                                                          raycast_method=raycast_method,
+                                                          visibility_threshold=visibility_threshold,
+                                                          ray_samples=ray_samples,
+                                                          block_size=block_size)
+            category_mapping.update(part_cat_names)
+            num_blocked += sum(1 for emitr in emitter_list if emitr.category_id not in part_cat_names)
+        else:
+            for emitr in emitter_list:
+                # for each particle emitter, get cat_id and rendered object name
+                part_cat_names = loop_over_particles(emitr, views, scene,
+                                                     filters=filters,
+                                                     use_raycast=use_raycast,
+                                                     raycast_method=raycast_method,
+                                                     visibility_threshold=visibility_threshold,
+                                                     ray_samples=ray_samples,
+                                                     messages=messages,
+                                                     block_size=block_size)
+                if part_cat_names:
+                    category_mapping.update(part_cat_names)
+                else:
+                    num_blocked += 1
 
-            part_bboxes, part_cat_ids, part_names = loop_over_particles(emitr, cam, scene,
-                                                        use_raycast=use_raycast,
-                                                        raycast_method=raycast_method)
-            if part_bboxes:
-                bboxes.extend(part_bboxes)
-                cat_ids.extend(part_cat_ids)
-                for cid, name in zip(part_cat_ids, part_names):
-                    category_mapping[cid] = name
-
-            else:
-                num_blocked += 1
+    if use_prepass:
+        num_blocked += apply_fast_occlusion(views, scene, block_size=block_size)
 
     # Save if needed
     if save_bool:
+        fsync = should_fsync(scene.blv_save.fsync_enum, scene.blv_save.fsync_interval)
+        split = get_frame_split(scene.blv_save, scene.frame_current)
+        overwrite = not keep_existing_labels(scene)
         if formatting == "YOLO":
-            generate_yolo_category_files(label_dir, category_mapping)
-            save_bboxes_yolo_format(bboxes, cat_ids, scene.frame_current,
-                                    render_res[0], render_res[1], label_dir, category_mapping,prefix=scene.blv_save.file_prefix)
-        elif formatting == "COCO":
-            save_bboxes_coco_format(bboxes, cat_ids, scene.frame_current,
-                                    render_res[0], render_res[1], label_dir, prefix=scene.blv_save.file_prefix)
-
-    return bboxes, cat_ids, num_blocked, category_mapping, messages
+            kpt_shape = [num_keypoints, 3] if num_keypoints else None
+            test_dir = "images/test" if scene.blv_save.use_split and scene.blv_save.split_test > 0 else None
+            generate_yolo_category_files(label_dir, category_mapping, kpt_shape=kpt_shape, test_dir=test_dir)
+        if scene.render.use_multiview and scene.render.image_settings.views_format != 'INDIVIDUAL':
+            messages.append(('WARNING', "Views are saved into one combined image, but labels are written per view"))
+        manifest_root = Path(scene.blv_save.root_path)
+        scene_hash = get_scene_state_hash(scene, label_views)
+        manifest_entries = []
+        part_keys = []
+        for view, view_label_dir, suffix, view_index, num_views, cam in label_views:
+            result = results[view.name]
+            label_file = None
+            if formatting == "YOLO":
+                label_file = save_bboxes_yolo_format(result, scene.frame_current,
+                                        render_res[0], render_res[1], view_label_dir, category_mapping,prefix=scene.blv_save.file_prefix,
+                                        fsync=fsync, suffix=suffix, overwrite=overwrite)
+            elif formatting == "COCO":
+                label_file = save_bboxes_coco_format(result, scene.frame_current,
+                                        render_res[0], render_res[1], view_label_dir, prefix=scene.blv_save.file_prefix,
+                                        keypoint_names=BBOX_KEYPOINT_NAMES,
+                                        keypoint_skeleton=BBOX_KEYPOINT_SKELETON,
+                                        fsync=fsync, suffix=suffix, view_index=view_index, num_views=num_views,
+                                        split=split, overwrite=overwrite)
+            elif formatting == "COLUMNAR":
+                label_file = save_bboxes_columnar_format(result, scene.frame_current, view_label_dir, prefix=scene.blv_save.file_prefix,
+                                                         frames_per_part=scene.blv_save.columnar_frames_per_part,
+                                                         fsync=fsync, suffix=suffix)
+            # Columnar boxes are only on disk once their part file is flushed
+            part_keys.append(columnar_part_key(view_label_dir, suffix, scene.frame_current)
+                             if formatting == "COLUMNAR" else None)
+
+            # Saved labels are always those of the rendered scene camera
+            image_path = get_render_image_path(scene, suffix)
+            manifest_entries.append(new_manifest_entry(
+                scene.frame_current, view.name, result, manifest_root,
+                image_path=image_path, label_path=label_file, label_format=formatting, split=split,
+                scene_hash=scene_hash,
+                # COCO and columnar files are shared by many frames, only per-frame files get a checksum
+                label_checksum=file_checksum(label_file) if formatting == "YOLO" else None,
+            ))
+
+        # The entries are written once the image is on disk (see commit_manifest_entries)
+        manifest_path = get_manifest_path(scene.blv_save)
+        stage_manifest_entries(manifest_path, scene.frame_current, manifest_entries, part_keys)
+        if not bpy.app.is_job_running('RENDER'):
+            commit_manifest_entries(manifest_path, scene.frame_current, with_images=False)
+
+    # The peak covers the whole Blender session, the current RSS is what this frame left in use
+    memory = []
+    current_rss = get_current_rss_mb()
+    if current_rss is not None:
+        memory.append(f"memory {current_rss:.0f} MB")
+    peak_rss = get_peak_rss_mb()
+    if peak_rss is not None:
+        memory.append(f"process peak RSS {peak_rss:.0f} MB")
+    if memory:
+        messages.append(('INFO', f"Frame {scene.frame_current}: {', '.join(memory)}"))
+
+    return results, num_blocked, category_mapping, messages
 
 
 classes = [
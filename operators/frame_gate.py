@@ -0,0 +1,161 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import bpy
+from ..utils.frame_gate import evaluate_label_gate, new_frame_plan, save_frame_plan, load_frame_plan
+from .bbox_tracker import compute_bounding_boxes
+from .randomization import get_randomization_table, rerandomize_frame, get_frame_variant, save_randomization
+from .resume import prepare_resume, render_frames
+
+
+class PlanFramesOperator(bpy.types.Operator):
+    """Compute the labels of every frame without rendering and mark the frames that pass the frame gate"""
+    bl_idname = "blv.plan_frames"
+    bl_label = "Plan Frames"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        scene = context.scene
+        plan = plan_frames(scene)
+        num_accepted = int(plan["accepted"].sum())
+        num_rejected = len(plan["frame"]) - num_accepted
+        num_resampled = int((plan["variant"] > 0).sum())
+        self.report({'INFO'}, f"🚦 Frame plan: {num_accepted} frames to render, {num_rejected} skipped, "
+                              f"{num_resampled} re-randomized")
+        return {'FINISHED'}
+
+
+class RenderAcceptedFramesOperator(bpy.types.Operator):
+    """Render (and label) only the frames accepted by the frame plan"""
+    bl_idname = "blv.render_accepted_frames"
+    bl_label = "Render Accepted Frames"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        scene = context.scene
+        plan = get_frame_plan(scene)
+        if plan is None:
+            self.report({'ERROR'}, "No frame plan found. Run Plan Frames first.")
+            return {'CANCELLED'}
+
+        num_rendered = render_accepted_frames(scene, plan)
+        self.report({'INFO'}, f"✅ Rendered {num_rendered} accepted frames")
+        return {'FINISHED'}
+
+
+def get_frame_gate(props):
+    """Gate thresholds (see DEFAULT_FRAME_GATE) from the scene frame gate settings."""
+    return {
+        "min_boxes": props.min_boxes,
+        "min_classes": props.min_classes,
+        "min_visibility": props.min_visibility,
+    }
+
+
+# Scene name -> frame plan of the last Plan Frames run
+_plans = {}
+
+
+def get_frame_plan(scene):
+    """The frame plan of the scene: from the last Plan Frames run, otherwise from the plan file."""
+    plan = _plans.get(scene.name)
+    if plan is None and scene.blv_gate.plan_path:
+        plan = load_frame_plan(bpy.path.abspath(scene.blv_gate.plan_path))
+        if plan is not None:
+            _plans[scene.name] = plan
+    return plan
+
+
+def plan_frames(scene):
+    """
+    Evaluate the labels of every frame in the scene frame range before rendering.
+    Frames that fail the gate are re-randomized (new randomization variant) up to max_retries times
+    when enabled, otherwise marked as skipped. The plan is cached and written to the plan file.
+    """
+    props = scene.blv_gate
+    gate = get_frame_gate(props)
+    rerandomize = props.on_reject == 'RERANDOMIZE' and scene.blv_random.use_randomization
+    plan = new_frame_plan(range(scene.frame_start, scene.frame_end + 1))
+    if scene.blv_random.use_randomization:
+        # Frame changes only look up the current table, bring it up to date with the settings once
+        get_randomization_table(scene)
+
+    original_frame = scene.frame_current
+    window_manager = bpy.context.window_manager
+    window_manager.progress_begin(0, len(plan["frame"]))
+    try:
+        for row, frame in enumerate(plan["frame"].tolist()):
+            # The frame change applies the randomization of the frame
+            scene.frame_set(frame)
+            first_variant = variant = get_frame_variant(scene, frame) if rerandomize else 0
+
+            while True:
+                results, *_ = compute_bounding_boxes(scene, include_save=False)
+                passed, num_boxes, num_classes = evaluate_label_gate(results.values(), gate)
+                if passed or not rerandomize or variant - first_variant >= props.max_retries:
+                    break
+                variant += 1
+                rerandomize_frame(scene, frame, variant)
+                bpy.context.view_layer.update()
+
+            plan["accepted"][row] = passed
+            plan["num_boxes"][row] = num_boxes
+            plan["num_classes"][row] = num_classes
+            plan["variant"][row] = variant
+            window_manager.progress_update(row)
+    finally:
+        window_manager.progress_end()
+        scene.frame_set(original_frame)
+
+    if rerandomize:
+        save_randomization(scene)
+    if props.plan_path:
+        path = bpy.path.abspath(props.plan_path)
+        save_frame_plan(path, plan)
+        print(f"🚦 Saved frame plan: {path}")
+    _plans[scene.name] = plan
+    return plan
+
+
+def render_accepted_frames(scene, plan):
+    """
+    Render (and label) the accepted frames of `plan`. Unless Overwrite is enabled, frames that are
+    already complete are skipped (see prepare_resume). Returns the number of rendered frames.
+    """
+    frames = plan["frame"][plan["accepted"]].tolist()
+    if scene.blv_save.bbox_bool and not scene.blv_save.overwrite_bool:
+        frames = prepare_resume(scene, frames)
+    return render_frames(scene, frames)
+
+
+classes = [
+    PlanFramesOperator,
+    RenderAcceptedFramesOperator,
+]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    _plans.clear()
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
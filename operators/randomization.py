@@ -0,0 +1,455 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+from mathutils import Matrix
+from ..utils.bbox_core import compose_matrices, transform_corners
+from ..utils.bbox_utils import get_camera_model
+from ..utils.camera_planner import plan_camera_schedule
+from ..utils.randomization import (build_randomization_table, randomization_key, table_row, replace_table_row,
+                                   save_randomization_table, load_randomization_table)
+from .bbox_tracker import get_bbox_filters
+
+PLANNER_FRAME_BLOCK = 4096  # Frames planned at once, bounds the size of the per-frame target corners
+
+
+class BuildRandomizationOperator(bpy.types.Operator):
+    """Precompute the randomization parameters of every frame in the scene frame range"""
+    bl_idname = "blv.build_randomization"
+    bl_label = "Build Randomization Table"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        scene = context.scene
+        table = get_randomization_table(scene, rebuild=True)
+        num_frames = len(table["frame"])
+        self.report({'INFO'}, f"🎲 Randomization table: {num_frames} frames, {len(table['object_names'])} objects, "
+                              f"{len(table['light_names'])} lights")
+        if "camera_accepted" in table:
+            num_rejected = num_frames - int(table["camera_accepted"].sum())
+            level = 'WARNING' if num_rejected else 'INFO'
+            self.report({level}, f"📷 Planned views: {num_frames - num_rejected} accepted, {num_rejected} frames "
+                                 f"without a view framing {scene.blv_random.min_visible_targets} objects")
+
+        if scene.blv_random.use_randomization:
+            apply_randomization_frame(scene, scene.frame_current)
+        return {'FINISHED'}
+
+
+def get_randomization_params(scene):
+    """
+    Parameter ranges (see DEFAULT_RANDOMIZATION_PARAMS) from the scene randomization settings,
+    plus the planner settings, box filters and camera projection when camera views are planned.
+    """
+    props = scene.blv_random
+    params = {
+        "target": tuple(props.target),
+        "camera_distance": (props.camera_distance_min, props.camera_distance_max),
+        "camera_elevation": (props.camera_elevation_min, props.camera_elevation_max),
+        "camera_roll": props.camera_roll,
+        "light_distance": (props.light_distance_min, props.light_distance_max),
+        "light_elevation": (props.light_elevation_min, props.light_elevation_max),
+        "light_energy": (props.light_energy_min, props.light_energy_max),
+        "light_temperature": (props.light_temperature_min, props.light_temperature_max),
+        "placement_extent": tuple(props.placement_extent),
+        "rotation_mode": props.rotation_mode,
+        "scale": (props.scale_min, props.scale_max),
+        "saturation": (props.saturation_min, props.saturation_max),
+        "value": (props.value_min, props.value_max),
+    }
+    if props.randomize_camera and props.camera_mode == 'PLANNED' and scene.camera is not None:
+        camera_model = get_camera_model(scene.camera, scene)
+        params["planner"] = {
+            "shell": props.shell,
+            "attempts": props.planner_attempts,
+            "min_targets": props.min_visible_targets,
+            "filters": get_bbox_filters(scene.blv_settings),
+            "frame": camera_model.frame.tolist(),
+            "is_ortho": camera_model.is_ortho,
+            "resolution": list(camera_model.resolution),
+        }
+    return params
+
+
+def get_randomized_objects(scene):
+    """The tracked objects (or particle emitters) of the current detection mode, in list order."""
+    settings = scene.blv_settings
+    objects = []
+    if settings.mode == 'OBJECT':
+        objects = [item.object for item in settings.selected_objects if item.object is not None]
+    elif settings.mode == 'COLLECTION':
+        for item in settings.selected_collections:
+            if item.collection is not None:
+                objects.extend(obj for obj in item.collection.objects if obj.type == 'MESH')
+    elif settings.mode == 'PARTICLE':
+        objects = [item.emitter_obj for item in settings.selected_emitter if item.emitter_obj is not None]
+    return list(dict.fromkeys(objects))
+
+
+def get_randomized_lights(scene):
+    collection = scene.blv_random.light_collection
+    source = collection.all_objects if collection is not None else scene.objects
+    return [obj for obj in source if obj.type == 'LIGHT']
+
+
+# Scene name -> randomization table. The table file is only read or rebuilt when its key changes.
+_tables = {}
+
+
+def get_randomization_table(scene, rebuild=False, build=True):
+    """
+    Randomization table of the scene frame range for the current settings, tracked objects and lights.
+    Reuses the cached table, then the table file, and only builds (and saves) a new one when neither matches.
+    With `build` False, returns None instead of building.
+    """
+    props = scene.blv_random
+    params = get_randomization_params(scene)
+    frames = range(scene.frame_start, scene.frame_end + 1)
+    object_names = [obj.name for obj in get_randomized_objects(scene)]
+    light_names = [obj.name for obj in get_randomized_lights(scene)]
+    key = randomization_key(props.seed, frames, params, object_names, light_names)
+    path = bpy.path.abspath(props.table_path) if props.table_path else ""
+
+    if not rebuild:
+        table = _tables.get(scene.name)
+        if table is not None and str(table["key"]) == key:
+            return table
+        table = load_randomization_table(path) if path else None
+        if table is not None and str(table["key"]) == key:
+            _tables[scene.name] = table
+            return table
+        if not build:
+            return None
+
+    table = build_randomization_table(props.seed, frames, object_names, light_names, params)
+    if "planner" in params:
+        plan_table_cameras(scene, table, params)
+    if path:
+        save_randomization_table(path, table)
+        print(f"🎲 Saved randomization table: {path}")
+    _tables[scene.name] = table
+    return table
+
+
+def get_target_corners(scene, table, rows):
+    """(len(rows), T, 8, 3) world corners of the tracked objects in the given table rows."""
+    objects = [scene.objects.get(name) for name in table["object_names"].tolist()]
+    local_corners = np.array([
+        [corner[:] for corner in obj.bound_box] if obj is not None else np.zeros((8, 3))
+        for obj in objects
+    ], dtype=np.float64).reshape(len(objects), 8, 3)
+
+    if scene.blv_random.randomize_objects:
+        matrices = compose_matrices(
+            table["object_location"][rows].reshape(-1, 3).astype(np.float64),
+            table["object_rotation"][rows].reshape(-1, 4).astype(np.float64),
+            table["object_scale"][rows].reshape(-1).astype(np.float64),
+        )
+    else:
+        static = np.array([
+            np.array(obj.matrix_world) if obj is not None else np.eye(4) for obj in objects
+        ], dtype=np.float64).reshape(len(objects), 4, 4)
+        matrices = np.tile(static, (len(rows), 1, 1))
+
+    corners = transform_corners(matrices, np.tile(local_corners, (len(rows), 1, 1)))
+    return corners.reshape(len(rows), len(objects), 8, 3)
+
+
+def plan_table_cameras(scene, table, params, first_index=0, total_frames=None):
+    """
+    Replace the camera poses of a randomization table with planned viewpoints (see plan_camera_schedule)
+    around the tracked objects of each frame. Adds camera_framed_targets and camera_accepted to the table.
+    `first_index` and `total_frames` place the table inside a longer schedule.
+    """
+    props = scene.blv_random
+    planner = params["planner"]
+    num_frames = len(table["frame"])
+    total_frames = num_frames if total_frames is None else total_frames
+    framed = np.zeros(num_frames, dtype=np.int64)
+    accepted = np.zeros(num_frames, dtype=bool)
+
+    for start in range(0, num_frames, PLANNER_FRAME_BLOCK):
+        rows = np.arange(start, min(start + PLANNER_FRAME_BLOCK, num_frames))
+        matrices, framed[rows], accepted[rows] = plan_camera_schedule(
+            props.seed, get_target_corners(scene, table, rows),
+            np.array(planner["frame"]), planner["is_ortho"], planner["resolution"],
+            shell=planner["shell"],
+            elevation_range=params["camera_elevation"],
+            distance_range=params["camera_distance"],
+            max_attempts=planner["attempts"],
+            min_targets=planner["min_targets"],
+            filters=planner["filters"],
+            first_index=first_index + start,
+            total_frames=total_frames,
+        )
+        table["camera_matrix"][rows] = matrices
+
+    table["camera_framed_targets"] = framed
+    table["camera_accepted"] = accepted
+    print(f"📷 Planned {num_frames} camera views, {int(accepted.sum())} accepted")
+
+
+def get_current_randomization_table(scene):
+    """
+    The table of the last get_randomization_table call for the scene, or None. Its key is not checked, which keeps
+    per-frame lookups cheap: call get_randomization_table first (Build operator, render start, Plan Frames).
+    """
+    return _tables.get(scene.name)
+
+
+def rerandomize_frame(scene, frame, variant):
+    """
+    Draw new parameters for `frame` from (seed, frame, variant), store them in the current table and apply them.
+    Returns False if the table does not cover the frame. Call save_randomization(scene) to keep the changes.
+    """
+    props = scene.blv_random
+    table = get_current_randomization_table(scene)
+    row = None if table is None else table_row(table, frame)
+    if row is None:
+        return False
+
+    params = get_randomization_params(scene)
+    frame_table = build_randomization_table(props.seed, [frame], table["object_names"].tolist(),
+                                            table["light_names"].tolist(), params, variants=[variant])
+    if "planner" in params:
+        # Continue the viewpoint sequence past the candidates every frame already had
+        num_frames = len(table["frame"])
+        plan_table_cameras(scene, frame_table, params,
+                           first_index=row + variant * num_frames * params["planner"]["attempts"],
+                           total_frames=num_frames)
+    replace_table_row(table, row, frame_table)
+    return apply_randomization_frame(scene, frame)
+
+
+def get_frame_variant(scene, frame):
+    """Randomization variant currently used for `frame` (0 when the frame was never re-randomized)."""
+    table = get_current_randomization_table(scene)
+    row = None if table is None else table_row(table, frame)
+    return 0 if row is None else int(table["variant"][row])
+
+
+def save_randomization(scene):
+    """Write the cached randomization table of the scene (e.g. after rerandomize_frame) to its table file."""
+    props = scene.blv_random
+    table = _tables.get(scene.name)
+    if table is not None and props.table_path:
+        save_randomization_table(bpy.path.abspath(props.table_path), table)
+
+
+# Scene name -> {(kind, name): {attribute: value}} of the objects ("OBJECT") and light data ("LIGHT") the
+# randomization changed, as they were before it first changed them. Light data is kept apart, lights may share it.
+_originals = {}
+
+
+def _read_attribute(id_block, attribute):
+    if attribute == "matrix_world":
+        return id_block.matrix_world.copy()
+    if attribute == "blv_variation":
+        return id_block.get("blv_variation")
+    if attribute == "color":
+        return tuple(id_block.color)
+    return getattr(id_block, attribute)
+
+
+def _snapshot(originals, kind, id_block, attributes):
+    """Keep the values of `attributes` of `id_block` from before the randomization first changes them."""
+    saved = originals.setdefault((kind, id_block.name), {})
+    for attribute in attributes:
+        if attribute not in saved:
+            saved[attribute] = _read_attribute(id_block, attribute)
+
+
+def restore_randomized_state(scene):
+    """
+    Put back the camera, lights and tracked objects of the scene as they were before the randomization was
+    applied, e.g. when it is turned off. Returns the number of restored objects and light data blocks.
+    """
+    originals = _originals.pop(scene.name, None)
+    if not originals:
+        return 0
+
+    num_restored = 0
+    for (kind, name), saved in originals.items():
+        id_block = (bpy.data.lights if kind == "LIGHT" else scene.objects).get(name)
+        if id_block is None:
+            continue
+        for attribute, value in saved.items():
+            if attribute == "blv_variation" and value is None:
+                if "blv_variation" in id_block:
+                    del id_block["blv_variation"]
+            elif attribute == "blv_variation":
+                id_block["blv_variation"] = value
+            else:
+                setattr(id_block, attribute, value)
+        num_restored += 1
+    print(f"🎲 Restored {num_restored} randomized objects and lights of scene '{scene.name}'")
+    return num_restored
+
+
+def apply_randomization_frame(scene, frame):
+    """
+    Apply the row of `frame` in the current randomization table to the camera, lights and tracked objects.
+    The values they had before the first change are kept, see restore_randomized_state.
+    Returns False if there is no table yet or it does not cover the frame.
+    """
+    props = scene.blv_random
+    table = get_current_randomization_table(scene)
+    row = None if table is None else table_row(table, frame)
+    if row is None:
+        return False
+
+    originals = _originals.setdefault(scene.name, {})
+    if props.randomize_camera and scene.camera is not None:
+        _snapshot(originals, "OBJECT", scene.camera, ["matrix_world"])
+        scene.camera.matrix_world = Matrix(table["camera_matrix"][row].tolist())
+
+    if props.randomize_lights:
+        objects = scene.objects
+        for i, name in enumerate(table["light_names"].tolist()):
+            light = objects.get(name)
+            if light is None:
+                continue
+            _snapshot(originals, "OBJECT", light, ["matrix_world"])
+            _snapshot(originals, "LIGHT", light.data, ["energy", "color"])
+            light.matrix_world = Matrix(table["light_matrix"][row, i].tolist())
+            light.data.energy = float(table["light_energy"][row, i])
+            light.data.color = table["light_color"][row, i].tolist()
+
+    object_names = table["object_names"].tolist()
+    if object_names and (props.randomize_objects or props.randomize_materials):
+        objects = scene.objects
+        # Compose every object transform of the frame at once
+        matrices = compose_matrices(
+            table["object_location"][row].astype(np.float64),
+            table["object_rotation"][row].astype(np.float64),
+            table["object_scale"][row].astype(np.float64),
+        ).tolist()
+        colors = table["object_color"][row].tolist()
+        variations = table["object_variation"][row].tolist()
+        attributes = (["matrix_world"] if props.randomize_objects else []) + \
+                     (["color", "blv_variation"] if props.randomize_materials else [])
+
+        for i, name in enumerate(object_names):
+            obj = objects.get(name)
+            if obj is None:
+                continue
+            _snapshot(originals, "OBJECT", obj, attributes)
+            if props.randomize_objects:
+                obj.matrix_world = Matrix(matrices[i])
+            if props.randomize_materials:
+                obj.color = colors[i] + [1.0]
+                obj["blv_variation"] = variations[i]
+
+    return True
+
+
+# Applies the randomization before the frame is evaluated, so annotations and the render see it.
+# Keyframed channels of the same properties are evaluated afterwards and take precedence.
+# Only the row of the frame is looked up: the table is built (or checked against the settings) by the
+# Build operator and at render start, never per frame.
+@persistent
+def randomization_handler(scene, *args):
+    if scene.blv_random.use_randomization:
+        apply_randomization_frame(scene, scene.frame_current)
+
+
+# Bring the table up to date with the settings before rendering. A still render has no frame change,
+# so the current frame is applied again when the table was replaced.
+@persistent
+def randomization_render_init_handler(scene, *args):
+    if scene.blv_random.use_randomization:
+        previous = get_current_randomization_table(scene)
+        if get_randomization_table(scene) is not previous:
+            apply_randomization_frame(scene, scene.frame_current)
+
+
+def toggle_randomization(props, context):
+    """Update of use_randomization: apply the current frame when turned on, restore the scene when turned off."""
+    scene = context.scene
+    if props.use_randomization:
+        apply_randomization_frame(scene, scene.frame_current)
+    else:
+        restore_randomized_state(scene)
+
+
+# Save the scene as it was before the randomization, and apply the current frame again once saved.
+@persistent
+def randomization_save_pre_handler(*args):
+    for scene in bpy.data.scenes:
+        restore_randomized_state(scene)
+
+
+@persistent
+def randomization_save_post_handler(*args):
+    for scene in bpy.data.scenes:
+        if scene.blv_random.use_randomization:
+            apply_randomization_frame(scene, scene.frame_current)
+
+
+# Tables cached for another file must not be applied to scenes of the same name; pick up the table files
+# that match the loaded scenes instead (nothing is built here). The kept originals belong to the old file.
+@persistent
+def randomization_load_handler(*args):
+    _tables.clear()
+    _originals.clear()
+    for scene in bpy.data.scenes:
+        if scene.blv_random.use_randomization:
+            get_randomization_table(scene, build=False)
+
+
+classes = [
+    BuildRandomizationOperator,
+]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    if randomization_handler not in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.append(randomization_handler)
+    if randomization_render_init_handler not in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.append(randomization_render_init_handler)
+    if randomization_load_handler not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(randomization_load_handler)
+    if randomization_save_pre_handler not in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.append(randomization_save_pre_handler)
+    if randomization_save_post_handler not in bpy.app.handlers.save_post:
+        bpy.app.handlers.save_post.append(randomization_save_post_handler)
+
+
+def unregister():
+    if randomization_handler in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.remove(randomization_handler)
+    if randomization_render_init_handler in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.remove(randomization_render_init_handler)
+    if randomization_load_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(randomization_load_handler)
+    if randomization_save_pre_handler in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(randomization_save_pre_handler)
+    if randomization_save_post_handler in bpy.app.handlers.save_post:
+        bpy.app.handlers.save_post.remove(randomization_save_post_handler)
+    # Without the handler nothing applies the randomization any more, leave the scenes as they were
+    for scene in bpy.data.scenes:
+        restore_randomized_state(scene)
+    _originals.clear()
+    _tables.clear()
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
@@ -0,0 +1,239 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import bpy
+from pathlib import Path
+from ..ui.save_panel import get_dataset_paths
+from ..utils.bbox_utils import get_render_views
+from ..utils.coco_bbox import coco_image_exists, repair_coco_file
+from ..utils.columnar_bbox import load_columnar_frames, is_columnar_entry_written, remove_columnar_frames
+from ..utils.dataset_split import get_frame_split
+from ..utils.file_utils import file_exists, forget_file, clear_directory_listings
+from ..utils.manifest import get_manifest, get_manifest_path, commit_manifest_entries, file_checksum, relative_path
+from .bbox_tracker import get_rig_cameras, get_camera_label_dir
+
+
+class ResumeRenderOperator(bpy.types.Operator):
+    """Render and label only the frames of the frame range that are not complete yet"""
+    bl_idname = "blv.resume_render"
+    bl_label = "Resume Render"
+    bl_options = {'REGISTER'}
+
+    verify_checksums: bpy.props.BoolProperty(
+        name="Verify Checksums",
+        description="Also compare every image with its checksum in the manifest (reads all images)",
+        default=False,
+    )
+
+    def execute(self, context):
+        scene = context.scene
+        if not scene.blv_save.bbox_bool:
+            self.report({'ERROR'}, "Enable Bounding Box output to resume a dataset render.")
+            return {'CANCELLED'}
+        if scene.camera is None:
+            self.report({'ERROR'}, "Camera not found!")
+            return {'CANCELLED'}
+
+        frames = list(range(scene.frame_start, scene.frame_end + 1))
+        pending = prepare_resume(scene, frames, verify=self.verify_checksums)
+        self.report({'INFO'}, f"⏯️ {len(frames) - len(pending)} frames complete, rendering {len(pending)} frames")
+
+        render_frames(scene, pending)
+        self.report({'INFO'}, f"✅ Rendered {len(pending)} missing frames")
+        return {'FINISHED'}
+
+
+def get_output_views(scene):
+    """Every labeled view as (view name, file suffix, camera, view index, number of views)."""
+    output_views = []
+    for cam in get_rig_cameras(scene):
+        render_views = get_render_views(cam, scene)
+        for view_index, (view, suffix) in enumerate(render_views):
+            output_views.append((view.name, suffix, cam, view_index, len(render_views)))
+    return output_views
+
+
+def get_frame_outputs(scene, frame, output_views):
+    """
+    Files expected for `frame`: (view name, image path or None, label path or None, label directory,
+    file suffix, view index, number of views) per view. COCO label paths are the shared {split}.json,
+    columnar ones are None (the part file is only known from the manifest).
+    """
+    props = scene.blv_save
+    image_dir, label_dir = get_dataset_paths(props, get_frame_split(props, frame))
+    frame_image = Path(bpy.path.abspath(scene.render.frame_path(frame=frame)))
+    use_camera_rig = scene.blv_settings.use_camera_rig
+
+    outputs = []
+    for view_name, suffix, cam, view_index, num_views in output_views:
+        # The render handler points the output path at the split folder of the frame and the rig camera folder
+        if use_camera_rig:
+            image_path = Path(bpy.path.abspath(str(Path(image_dir) / cam.name / frame_image.name)))
+        elif props.use_split:
+            image_path = Path(bpy.path.abspath(str(Path(image_dir) / frame_image.name)))
+        else:
+            image_path = frame_image
+        image_path = image_path.with_name(f"{image_path.stem}{suffix}{image_path.suffix}")
+        view_label_dir = Path(get_camera_label_dir(scene, str(label_dir), cam))
+        if props.format_enum == "YOLO":
+            label_path = view_label_dir / f"{props.file_prefix}{frame:04d}{suffix}.txt"
+        elif props.format_enum == "COCO":
+            label_path = view_label_dir / f"{get_frame_split(props, frame)}.json"
+        else:
+            label_path = None
+        outputs.append((view_name, image_path, label_path, view_label_dir, suffix, view_index, num_views))
+    return outputs
+
+
+def is_frame_complete(scene, frame, outputs, manifest, part_frames, verify=False):
+    """
+    True if every view of `frame` has its image and labels. The manifest entry of a view is used when
+    there is one; otherwise the label files are checked. Columnar frames must be in a written part file;
+    `part_frames` caches the frames read per part file (or per label directory and suffix).
+    Without a manifest entry, columnar frames are looked up in the frame lists of the part files.
+    """
+    props = scene.blv_save
+    root = Path(props.root_path)
+
+    for view_name, image_path, label_path, view_label_dir, suffix, view_index, num_views in outputs:
+        entry = manifest.get(frame, view_name)
+        if entry is not None:
+            if entry["format"] != props.format_enum or entry["image"] != relative_path(image_path, root):
+                return False
+            if image_path is not None:
+                if entry["image_checksum"] is None or not file_exists(image_path):
+                    return False
+                if verify and file_checksum(image_path) != entry["image_checksum"]:
+                    return False
+            if props.format_enum == "YOLO" and not file_exists(label_path):
+                return False
+            if props.format_enum == "COLUMNAR" and not is_columnar_entry_written(entry, frame, root, part_frames):
+                return False
+            continue
+
+        # No manifest entry: fall back to the files on disk
+        if image_path is not None and not file_exists(image_path):
+            return False
+        if props.format_enum == "YOLO":
+            if not file_exists(label_path):
+                return False
+        elif props.format_enum == "COCO":
+            if not coco_image_exists(label_path, frame * num_views + view_index):
+                return False
+        else:
+            key = (str(view_label_dir), suffix)
+            if key not in part_frames:
+                part_frames[key] = load_columnar_frames(view_label_dir, suffix)
+            if frame not in part_frames[key]:
+                return False
+    return True
+
+
+def prepare_resume(scene, frames, verify=False):
+    """
+    Find the frames of `frames` that still have to be rendered and clean up what an interrupted
+    render left behind for them: partially written images and their YOLO label files are deleted,
+    and their COCO images and annotations and columnar rows removed. Returns the pending frames in order.
+    """
+    props = scene.blv_save
+    # Another process (or a previous session) may have written files since the listings were read
+    clear_directory_listings()
+    manifest = get_manifest(get_manifest_path(props))
+    output_views = get_output_views(scene)
+    coco_repairs = {}
+    columnar_repairs = {}
+    part_frames = {}
+    pending = []
+    num_deleted = 0
+
+    for frame in frames:
+        outputs = get_frame_outputs(scene, frame, output_views)
+        if is_frame_complete(scene, frame, outputs, manifest, part_frames, verify=verify):
+            continue
+        pending.append(frame)
+
+        for view_name, image_path, label_path, view_label_dir, suffix, view_index, num_views in outputs:
+            if image_path is not None and file_exists(image_path):
+                os.remove(image_path)
+                forget_file(image_path)
+                num_deleted += 1
+            # Labels of an unfinished frame are written again with its image, even with Overwrite off
+            if props.format_enum == "YOLO" and file_exists(label_path):
+                os.remove(label_path)
+                forget_file(label_path)
+            elif props.format_enum == "COCO":
+                coco_repairs.setdefault((label_path, num_views), set()).add(frame)
+            elif props.format_enum == "COLUMNAR":
+                columnar_repairs.setdefault((str(view_label_dir), suffix), set()).add(frame)
+
+    num_repaired = 0
+    for (json_path, num_views), repair_frames in coco_repairs.items():
+        num_repaired += repair_coco_file(json_path, repair_frames, num_views=num_views)
+    for (view_label_dir, suffix), repair_frames in columnar_repairs.items():
+        remove_columnar_frames(view_label_dir, suffix, repair_frames)
+
+    if num_deleted or num_repaired:
+        print(f"🩹 Removed {num_deleted} partial images and {num_repaired} COCO images of unfinished frames")
+    return pending
+
+
+def render_frames(scene, frames):
+    """
+    Render (and label) the given frames one by one as stills, named like animation frames.
+    With the camera rig enabled, every rig camera is rendered in turn as the scene camera.
+    Labels are written by the render handler as for any render. Returns the number of rendered frames.
+    """
+    original_frame = scene.frame_current
+    original_path = scene.render.filepath
+    original_camera = scene.camera
+    cameras = get_rig_cameras(scene) if scene.blv_settings.use_camera_rig else [scene.camera]
+
+    try:
+        for frame in frames:
+            scene.frame_set(frame)
+            for cam in cameras:
+                scene.camera = cam
+                bpy.ops.render.render()
+                # The output path is resolved after the render, the render handler may route it
+                # (dataset splits, rig camera folders)
+                bpy.data.images["Render Result"].save_render(scene.render.frame_path(frame=frame))
+                # save_render does not trigger render_write, record the frame in the manifest here
+                if scene.blv_save.bbox_bool:
+                    commit_manifest_entries(get_manifest_path(scene.blv_save), frame)
+    finally:
+        scene.camera = original_camera
+        scene.render.filepath = original_path
+        scene.frame_set(original_frame)
+    return len(frames)
+
+
+classes = [
+    ResumeRenderOperator,
+]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
@@ -0,0 +1,56 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+"""
+Lets plain `pytest` run the bpy-free tests from the repository root.
+
+The repository root is the add-on package, and its __init__.py imports bpy. Pytest would import it to
+set up the root package, so the root is collected as a plain directory instead. The modules of utils/
+are made importable as the stand-in package `blv_utils`, so their relative imports still resolve.
+"""
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+if "blv_utils" not in sys.modules:
+    blv_utils = types.ModuleType("blv_utils")
+    blv_utils.__path__ = [str(REPO_ROOT / "utils")]
+    sys.modules["blv_utils"] = blv_utils
+
+
+class AddonRootCollector:
+    """Collect the add-on root as a directory, without importing its __init__.py."""
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collect_directory(self, path, parent):
+        if path == REPO_ROOT:
+            return pytest.Dir.from_parent(parent, path=path)
+        return None
+
+
+def pytest_configure(config):
+    # Hooks of a conftest only apply below its own directory, the root directory needs a global plugin
+    if not config.pluginmanager.has_plugin("blv-addon-root"):
+        config.pluginmanager.register(AddonRootCollector(), "blv-addon-root")
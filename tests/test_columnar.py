@@ -0,0 +1,118 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+"""Tests of the columnar part files and their manifest entries when a render is resumed (utils/columnar_bbox.py)."""
+
+import os
+
+import numpy as np
+import pytest
+
+from blv_utils import columnar_bbox, file_utils, manifest
+from blv_utils.bbox_result import BBoxResult
+
+
+@pytest.fixture(autouse=True)
+def reset_manifest_state():
+    manifest.clear_manifests()
+    file_utils.clear_directory_listings()
+    yield
+    manifest.clear_manifests()
+    file_utils.clear_directory_listings()
+
+
+def frame_result(num_boxes, offset=0.0):
+    result = BBoxResult()
+    object_id = result.register_object("Cube")
+    for i in range(num_boxes):
+        result.append(offset + i, 0.0, offset + i + 10.0, 10.0, 0, object_id=object_id, instance_id=i)
+    return result
+
+
+def label_frames(root, label_dir, frames, frames_per_part):
+    """Label `frames` ({frame: number of boxes}) the way a render does: stage, buffer the rows, commit."""
+    manifest_path = root / manifest.MANIFEST_NAME
+    writer = columnar_bbox.ColumnarWriter(label_dir, frames_per_part=frames_per_part)
+    for frame, num_boxes in frames.items():
+        result = frame_result(num_boxes, offset=frame)
+        entry = manifest.new_manifest_entry(frame, "", result, root, label_format="COLUMNAR")
+        manifest.stage_manifest_entries(manifest_path, frame, [entry],
+                                        [manifest.columnar_part_key(label_dir, "", frame)])
+        writer.add_frame(result, frame)
+        manifest.commit_manifest_entries(manifest_path, frame, with_images=False)
+    writer.flush()
+    return manifest.get_manifest(manifest_path)
+
+
+def is_written(dataset_manifest, root, frame):
+    entry = dataset_manifest.get(frame)
+    return entry is not None and columnar_bbox.is_columnar_entry_written(entry, frame, root, {})
+
+
+def test_frame_without_boxes_is_complete(tmp_path):
+    label_dir = tmp_path / "labels"
+    dataset_manifest = label_frames(tmp_path, label_dir, {1: 2, 2: 0, 3: 1}, frames_per_part=3)
+
+    empty = dataset_manifest.get(2)
+    assert empty["num_boxes"] == 0
+    assert empty["labels"] == "labels/part-000001-000003.npz"
+    assert all(is_written(dataset_manifest, tmp_path, frame) for frame in (1, 2, 3))
+    # Also without a manifest entry
+    assert columnar_bbox.load_columnar_frames(label_dir) == {1, 2, 3}
+
+
+def test_resume_replaces_rows_of_flushed_frames(tmp_path):
+    label_dir = tmp_path / "labels"
+    label_frames(tmp_path, label_dir, {1: 2, 2: 0, 3: 1}, frames_per_part=3)
+
+    # Frame 3 was flushed but its image is missing: resume removes its rows, then renders it again
+    assert columnar_bbox.remove_columnar_frames(label_dir, "", {3}) == 1
+    assert columnar_bbox.load_columnar_frames(label_dir) == {1, 2}
+    dataset_manifest = label_frames(tmp_path, label_dir, {3: 4}, frames_per_part=1)
+
+    assert dataset_manifest.get(3)["labels"] == "labels/part-000003-000003.npz"
+    assert is_written(dataset_manifest, tmp_path, 3)
+    columns = columnar_bbox.load_columnar_annotations(label_dir)
+    np.testing.assert_array_equal(np.bincount(columns["frame"]), [0, 2, 0, 4])
+    np.testing.assert_array_equal(columns["object_name"], ["Cube"] * 6)
+
+
+def test_loader_keeps_the_last_written_copy_of_a_frame(tmp_path):
+    label_dir = tmp_path / "labels"
+    label_frames(tmp_path, label_dir, {1: 2, 2: 0, 3: 1}, frames_per_part=3)
+    first_part = label_dir / "part-000001-000003.npz"
+    os.utime(first_part, ns=(1_000_000_000, 1_000_000_000))
+
+    # Rendered again without removing the earlier rows, into a part that sorts before the first one
+    label_frames(tmp_path, label_dir, {0: 1, 3: 5}, frames_per_part=2)
+
+    columns = columnar_bbox.load_columnar_annotations(label_dir)
+    np.testing.assert_array_equal(np.bincount(columns["frame"]), [1, 2, 0, 5])
+
+
+def test_removing_every_frame_of_a_part_deletes_it(tmp_path):
+    label_dir = tmp_path / "labels"
+    label_frames(tmp_path, label_dir, {1: 1, 2: 0}, frames_per_part=2)
+
+    assert columnar_bbox.remove_columnar_frames(label_dir, "", {1, 2}) == 2
+    assert not list(label_dir.iterdir())
+    assert columnar_bbox.load_columnar_annotations(label_dir) == {}
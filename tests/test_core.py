@@ -0,0 +1,372 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+"""
+Tests of the bpy-free annotation core. Runs with plain CPython, NumPy and pytest, no Blender needed:
+
+    python -m pytest
+
+The utils/ modules are imported through the stand-in package `blv_utils` (see conftest.py).
+"""
+
+import numpy as np
+import pytest
+
+from blv_utils import bbox_core as core
+from blv_utils import bbox_result, dataset_split, occlusion, yolo_bbox
+
+RENDER_SIZE = (1920, 1080)
+
+
+def make_frame(resolution=RENDER_SIZE, lens=50.0, sensor_width=36.0):
+    """View frame (see project_points_to_ndc) of a perspective camera with a horizontal sensor fit."""
+    res_x, res_y = resolution
+    half_x = sensor_width / 2 / lens
+    half_y = half_x * res_y / res_x
+    return np.array([[half_x, half_y, -1.0], [half_x, -half_y, -1.0], [-half_x, -half_y, -1.0]])
+
+
+def unit_cube_corners(center, size=1.0):
+    """(8, 3) corners of an axis-aligned cube."""
+    offsets = np.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)])
+    return np.asarray(center, dtype=np.float64) + offsets * size
+
+
+###
+# Projection
+###
+
+def test_projection_perspective_frame_edges():
+    frame = make_frame()
+    half_x, half_y = frame[0, 0], frame[0, 1]
+    points = np.array([
+        [0.0, 0.0, -5.0],                   # Straight ahead
+        [half_x * 5, half_y * 5, -5.0],     # Top right corner of the frame
+        [-half_x * 2, -half_y * 2, -2.0],   # Bottom left corner of the frame
+    ])
+    ndc = core.project_points_to_ndc(points, np.eye(4), frame, False)
+    np.testing.assert_allclose(ndc, [[0.5, 0.5, 5.0], [1.0, 1.0, 5.0], [0.0, 0.0, 2.0]], atol=1e-12)
+
+
+def test_projection_applies_world_to_camera():
+    # Camera moved to z = 10: a point at the origin is 10 units in front of it
+    world_to_camera = np.eye(4)
+    world_to_camera[2, 3] = -10.0
+    ndc = core.project_points_to_ndc(np.zeros((1, 3)), world_to_camera, make_frame(), False)
+    np.testing.assert_allclose(ndc, [[0.5, 0.5, 10.0]], atol=1e-12)
+
+
+def test_projection_orthographic_ignores_depth():
+    frame = np.array([[2.0, 1.0, -1.0], [2.0, -1.0, -1.0], [-2.0, -1.0, -1.0]])
+    points = np.array([[1.0, 0.5, -1.0], [1.0, 0.5, -100.0]])
+    ndc = core.project_points_to_ndc(points, np.eye(4), frame, True)
+    np.testing.assert_allclose(ndc[:, :2], [[0.75, 0.75], [0.75, 0.75]])
+    np.testing.assert_allclose(ndc[:, 2], [1.0, 100.0])
+
+
+def test_camera_model_matches_projection():
+    camera = core.CameraModel(np.eye(4), make_frame(), False, resolution=RENDER_SIZE)
+    points = np.array([[0.3, -0.2, -4.0], [1.0, 0.5, -8.0]])
+    np.testing.assert_allclose(camera.project(points), core.project_points_to_ndc(points, *camera.projection))
+    np.testing.assert_allclose(camera.to_pixels(np.array([[0.5, 0.5, 1.0]])), [[960.0, 540.0]])
+
+
+###
+# Boxes and filters
+###
+
+def project_cubes(centers, size=1.0):
+    corners = np.stack([unit_cube_corners(center, size) for center in centers])
+    return core.project_points_to_ndc(corners, np.eye(4), make_frame(), False)
+
+
+def test_bbox_batch_matches_single_box():
+    corners_ndc = project_cubes([[0.0, 0.0, -5.0], [1.0, 0.5, -8.0]])
+    accepted, boxes, visible_fraction = core.calculate_bboxes_from_ndc_batch(corners_ndc, RENDER_SIZE)
+    assert accepted.all()
+    np.testing.assert_allclose(visible_fraction, 1.0)
+
+    for i in range(len(corners_ndc)):
+        (min_x, min_y), (max_x, max_y), fraction = core.calculate_bbox_from_ndc(corners_ndc[i], RENDER_SIZE)
+        np.testing.assert_allclose([min_x, min_y, max_x, max_y], boxes[i])
+        assert fraction == pytest.approx(visible_fraction[i])
+
+
+def test_bbox_centered_cube_is_symmetric():
+    corners_ndc = project_cubes([[0.0, 0.0, -5.0]])
+    accepted, boxes, _ = core.calculate_bboxes_from_ndc_batch(corners_ndc, RENDER_SIZE)
+    x0, y0, x1, y1 = boxes[0]
+    assert accepted[0]
+    assert (x0 + x1) / 2 == pytest.approx(960.0)
+    assert (y0 + y1) / 2 == pytest.approx(540.0)
+
+
+def test_bbox_behind_camera_is_rejected():
+    corners_ndc = project_cubes([[0.0, 0.0, 5.0]])
+    accepted, _, _ = core.calculate_bboxes_from_ndc_batch(corners_ndc, RENDER_SIZE)
+    assert not accepted[0]
+    assert core.calculate_bbox_from_ndc(corners_ndc[0], RENDER_SIZE) is None
+
+
+def test_bbox_truncated_box_is_clamped():
+    # Cube centered on the right edge of the frame: about half of it is outside
+    edge_x = make_frame()[0, 0] * 5
+    corners_ndc = project_cubes([[edge_x, 0.0, -5.0]])
+    accepted, boxes, visible_fraction = core.calculate_bboxes_from_ndc_batch(corners_ndc, RENDER_SIZE)
+    assert accepted[0]
+    assert boxes[0, 2] == RENDER_SIZE[0]
+    assert 0.4 < visible_fraction[0] < 0.6
+
+    accepted, _, _ = core.calculate_bboxes_from_ndc_batch(corners_ndc, RENDER_SIZE, {"max_truncation": 0.3})
+    assert not accepted[0]
+
+
+def test_bbox_filter_mask():
+    boxes = np.array([
+        [0.0, 0.0, 100.0, 100.0],     # Kept by every filter
+        [0.0, 0.0, 3.0, 100.0],       # Narrower than MIN_BBOX_SIZE
+        [0.0, 0.0, 400.0, 20.0],      # Aspect ratio 20
+        [0.0, 0.0, 100.0, 100.0],     # Too far away
+        [0.0, 0.0, 100.0, 100.0],     # Not visible
+    ])
+    visible_fraction = np.array([1.0, 1.0, 1.0, 1.0, 0.0])
+    depth = np.array([5.0, 5.0, 5.0, 50.0, 5.0])
+
+    keep = core.bbox_filter_mask(boxes, visible_fraction, depth, RENDER_SIZE)
+    np.testing.assert_array_equal(keep, [True, False, True, True, False])
+
+    filters = {"max_aspect_ratio": 10.0, "max_depth": 20.0}
+    keep = core.bbox_filter_mask(boxes, visible_fraction, depth, RENDER_SIZE, filters)
+    np.testing.assert_array_equal(keep, [True, False, False, False, False])
+
+    # Defaults are filled in for filters that are not given
+    keep = core.bbox_filter_mask(boxes, visible_fraction, depth, RENDER_SIZE, {"min_area": 200 ** 2})
+    np.testing.assert_array_equal(keep, [False, False, False, False, False])
+
+
+###
+# Hierarchical Z-buffer
+###
+
+def brute_force_occluder_depth(boxes, depths, ids, points, exclude_ids):
+    """Nearest depth of the boxes (other than the excluded one) that contain each point."""
+    inside = (
+        (points[:, None, 0] >= boxes[None, :, 0]) & (points[:, None, 0] <= boxes[None, :, 2])
+        & (points[:, None, 1] >= boxes[None, :, 1]) & (points[:, None, 1] <= boxes[None, :, 3])
+        & (ids[None, :] != exclude_ids[:, None])
+    )
+    return np.where(inside, depths[None, :], np.inf).min(axis=1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_hzb_is_conservative(seed):
+    rng = np.random.default_rng(seed)
+    width, height = 640, 480
+    num_boxes = 200
+
+    # Boxes of every scale, so they land on several levels
+    sizes = rng.uniform(1.0, 400.0, (num_boxes, 2))
+    x0 = rng.uniform(-50.0, width, num_boxes)
+    y0 = rng.uniform(-50.0, height, num_boxes)
+    boxes = np.clip(np.column_stack([x0, y0, x0 + sizes[:, 0], y0 + sizes[:, 1]]), 0, [width, height, width, height])
+    depths = rng.uniform(1.0, 100.0, num_boxes)
+    ids = np.arange(num_boxes)
+
+    hzb = occlusion.HierarchicalZBuffer(width, height)
+    # Two inserts, so merging with the entries already kept per cell is covered
+    hzb.insert(boxes[:100], depths[:100], ids[:100])
+    hzb.insert(boxes[100:], depths[100:], ids[100:])
+
+    points = rng.uniform(0.0, [width, height], (2000, 2))
+    exclude_ids = rng.integers(-1, num_boxes, len(points))
+    expected = brute_force_occluder_depth(boxes, depths, ids, points, exclude_ids)
+    nearest = hzb.occluder_depth(points, exclude_ids)
+
+    # Never farther than the true nearest occluder, so "nothing in front" answers can be trusted
+    assert np.all(nearest <= expected)
+
+
+def test_hzb_excludes_own_box():
+    hzb = occlusion.HierarchicalZBuffer(640, 480)
+    hzb.insert([[100.0, 100.0, 200.0, 200.0], [150.0, 150.0, 300.0, 300.0]], [5.0, 10.0], [0, 1])
+    points = np.array([[120.0, 120.0], [120.0, 120.0], [175.0, 175.0], [500.0, 400.0]])
+
+    nearest = hzb.occluder_depth(points, [-1, 0, 0, -1])
+    assert nearest[0] == 5.0
+    assert nearest[2] == 10.0
+    assert nearest[3] == np.inf
+    # Only the own box covers the point (or the coarse cells of the other box): never nearer than it
+    assert nearest[1] in (10.0, np.inf)
+
+
+def test_hzb_empty_insert():
+    hzb = occlusion.HierarchicalZBuffer(64, 64)
+    hzb.insert(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64))
+    assert np.all(hzb.occluder_depth([[10.0, 10.0]], [-1]) == np.inf)
+
+
+def unused_persistent_ids(first_levels):
+    persistent_ids = np.full((len(first_levels), core.PERSISTENT_ID_LEVELS), core.PERSISTENT_ID_UNUSED)
+    persistent_ids[:, :len(first_levels[0])] = first_levels
+    return persistent_ids
+
+
+def test_instance_keys_tell_instancers_apart():
+    # Two instancers placing the same object with the same persistent_id
+    rock = core.name_code("Rock")
+    keys = core.instance_keys([rock, rock], unused_persistent_ids([[0], [0]]),
+                              [core.name_code("ScatterA"), core.name_code("ScatterB")])
+    assert keys[0] != keys[1]
+
+    # Deeper persistent_id levels (e.g. particle system index) count too, and real objects differ from instances
+    systems = core.instance_keys([rock, rock], unused_persistent_ids([[3, 0], [3, 1]]), [rock, rock])
+    assert systems[0] != systems[1]
+    assert core.object_keys([rock])[0] not in keys
+
+    # Stable across calls
+    np.testing.assert_array_equal(keys, core.instance_keys([rock, rock], unused_persistent_ids([[0], [0]]),
+                                                           [core.name_code("ScatterA"), core.name_code("ScatterB")]))
+
+
+def test_hzb_shared_object_instances_occlude_each_other():
+    # Instancer A puts the rock in front of the rock of instancer B; both boxes are candidates
+    rock = core.name_code("Rock")
+    instancers = [core.name_code("ScatterA"), core.name_code("ScatterB")]
+    candidate_keys = core.instance_keys([rock, rock], unused_persistent_ids([[0], [0]]), instancers)
+    lookup = occlusion.candidate_lookup(candidate_keys)
+
+    # Occluders stream in a different order, with an unlabeled object in between
+    occluder_keys = np.concatenate([candidate_keys[::-1], core.object_keys([core.name_code("Ground")])])
+    rows = occlusion.match_candidate_rows(lookup, occluder_keys)
+    np.testing.assert_array_equal(rows, [1, 0, -1])
+
+    hzb = occlusion.HierarchicalZBuffer(640, 480)
+    hzb.insert([[150.0, 150.0, 250.0, 250.0], [100.0, 100.0, 200.0, 200.0], [0.0, 400.0, 640.0, 480.0]],
+               [10.0, 5.0, 20.0], rows)
+    nearest = hzb.occluder_depth([[175.0, 175.0], [175.0, 175.0]], np.arange(2))
+    # B sees A in front of it; A only ever sees B behind it (or nothing)
+    assert nearest[1] == 5.0
+    assert nearest[0] in (10.0, np.inf)
+
+
+def test_match_candidate_rows_without_candidates():
+    lookup = occlusion.candidate_lookup(np.zeros(0, dtype=np.int64))
+    np.testing.assert_array_equal(occlusion.match_candidate_rows(lookup, [1, 2]), [-1, -1])
+
+
+###
+# Dataset splits
+###
+
+def test_split_ratios_are_respected():
+    frames = np.arange(100000)
+    indices = dataset_split.assign_splits(7, frames, (0.7, 0.2, 0.1))
+    fractions = np.bincount(indices, minlength=3) / len(frames)
+    np.testing.assert_allclose(fractions, [0.7, 0.2, 0.1], atol=0.01)
+
+
+def test_split_ratios_are_normalized():
+    frames = np.arange(20000)
+    np.testing.assert_array_equal(
+        dataset_split.assign_splits(3, frames, (8, 1, 1)),
+        dataset_split.assign_splits(3, frames, (0.8, 0.1, 0.1)),
+    )
+
+
+def test_split_zero_ratio_is_never_used():
+    indices = dataset_split.assign_splits(1, np.arange(20000), (0.9, 0.0, 0.1))
+    assert not np.any(indices == 1)
+    assert np.all(dataset_split.assign_splits(1, np.arange(100), (0, 0, 0)) == 0)
+
+
+def test_split_is_deterministic_and_order_independent():
+    frames = np.arange(1000)
+    indices = dataset_split.assign_splits(42, frames)
+    np.testing.assert_array_equal(dataset_split.assign_splits(42, frames[::-1]), indices[::-1])
+    assert dataset_split.frame_split(42, 123) == dataset_split.SPLITS[indices[123]]
+    assert not np.array_equal(dataset_split.assign_splits(43, frames), indices)
+
+
+###
+# YOLO labels
+###
+
+def make_result(num_keypoints=0):
+    result = bbox_result.BBoxResult(num_keypoints=num_keypoints)
+    rng = np.random.default_rng(0)
+    for category in (0, 3, 1):
+        x0, y0 = rng.uniform(0, 1000, 2)
+        keypoints = None
+        if num_keypoints:
+            keypoints = np.column_stack([rng.uniform(0, 1920, num_keypoints), rng.uniform(0, 1080, num_keypoints),
+                                         rng.choice([0, 2], num_keypoints)])
+        result.append(x0, y0, x0 + rng.uniform(5, 500), y0 + rng.uniform(5, 500), category, keypoints=keypoints)
+    return result
+
+
+def test_format_yolo_labels_matches_per_line_formatting():
+    result = make_result()
+    width, height = RENDER_SIZE
+    expected = "".join(
+        f"{int(cat)} {((x0 + x1) / 2) / width:.6f} {((y0 + y1) / 2) / height:.6f} "
+        f"{(x1 - x0) / width:.6f} {(y1 - y0) / height:.6f}\n"
+        for cat, x0, y0, x1, y1 in zip(result.category, result.x0, result.y0, result.x1, result.y1)
+    )
+    assert yolo_bbox.format_yolo_labels(result, width, height) == expected
+
+
+def test_format_yolo_labels_with_keypoints():
+    result = make_result(num_keypoints=len(core.BBOX_KEYPOINT_NAMES))
+    width, height = RENDER_SIZE
+    lines = yolo_bbox.format_yolo_labels(result, width, height).splitlines()
+    assert len(lines) == len(result)
+
+    for line, keypoints in zip(lines, result.keypoints):
+        values = line.split()
+        assert len(values) == 5 + 3 * len(core.BBOX_KEYPOINT_NAMES)
+        kpt_x, kpt_y, kpt_v = keypoints[0]
+        assert values[5:8] == [f"{kpt_x / width:.6f}", f"{kpt_y / height:.6f}", f"{int(kpt_v)}"]
+
+
+def test_format_yolo_labels_empty():
+    assert yolo_bbox.format_yolo_labels(bbox_result.BBoxResult(), *RENDER_SIZE) == ""
+
+
+###
+# Raycast hit bounds
+###
+
+def test_points_in_bounds_tolerates_float32_face_hits():
+    lower, upper = np.array([1000.0, -2.0, 0.5]), np.array([1000.25, 2.0, 0.75])
+    # Hits on the faces, as scene.ray_cast returns them (float32)
+    faces = np.array([[1000.25, 0.0, 0.6], [1000.1, -2.0, 0.6], [1000.1, 0.0, 0.75]])
+    rounded = np.nextafter(faces.astype(np.float32), np.float32(np.inf)).astype(np.float64)
+    rounded[1, 1] = np.nextafter(np.float32(-2.0), np.float32(-np.inf))
+    assert core.points_in_bounds(rounded, lower, upper).all()
+
+
+def test_points_in_bounds_rejects_points_outside():
+    lower, upper = np.zeros(3), np.ones(3)
+    points = np.array([[0.5, 0.5, 0.5], [1.01, 0.5, 0.5], [0.5, -0.01, 0.5]])
+    np.testing.assert_array_equal(core.points_in_bounds(points, lower, upper), [True, False, False])
+    # Per-box bounds broadcast against one point per box
+    bounds = np.array([[[0.0] * 3, [1.0] * 3], [[2.0] * 3, [3.0] * 3]])
+    np.testing.assert_array_equal(core.points_in_bounds(np.full((2, 3), 0.5), bounds[:, 0], bounds[:, 1]),
+                                  [True, False])
@@ -0,0 +1,98 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+"""Tests of the atomic writes and the fsync policy (utils/file_utils.py)."""
+
+import os
+import stat
+
+import pytest
+
+from blv_utils import file_utils
+
+
+@pytest.fixture(autouse=True)
+def reset_fsync_state():
+    file_utils.should_fsync("NONE")
+    file_utils.reset_fsync_interval()
+    yield
+    file_utils.should_fsync("NONE")
+    file_utils.reset_fsync_interval()
+
+
+def file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX file modes")
+def test_atomic_write_uses_umask_mode(tmp_path):
+    path = tmp_path / "labels.txt"
+    file_utils.atomic_write_text(path, "0 0.5 0.5 0.1 0.1\n")
+    assert path.read_text() == "0 0.5 0.5 0.1 0.1\n"
+    assert file_mode(path) == file_utils.DEFAULT_FILE_MODE
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX file modes")
+def test_atomic_write_keeps_existing_mode(tmp_path):
+    path = tmp_path / "data.yaml"
+    path.write_text("old")
+    os.chmod(path, 0o640)
+    file_utils.atomic_write_text(path, "new")
+    assert path.read_text() == "new"
+    assert file_mode(path) == 0o640
+
+
+def test_interval_syncs_files_of_skipped_frames(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+
+    interval = 3
+    for frame in range(interval):
+        fsync = file_utils.should_fsync("INTERVAL", interval)
+        file_utils.atomic_write_text(tmp_path / f"{frame}.txt", str(frame), fsync=fsync)
+        # The first frames are written without a flush and only remembered
+        assert fsync == (frame == interval - 1)
+        if not fsync:
+            assert not synced
+
+    # The interval frame flushes the files of the frames before it as well as its own
+    assert len(synced) >= interval
+    assert not file_utils._unsynced
+
+
+def test_render_start_restarts_interval(tmp_path):
+    assert not file_utils.should_fsync("INTERVAL", 2)
+    file_utils.atomic_write_text(tmp_path / "a.txt", "a")
+    assert file_utils._unsynced
+
+    file_utils.reset_fsync_interval()
+    assert not file_utils._unsynced
+    # The count starts over: the first frame of the new render is not an interval frame
+    assert not file_utils.should_fsync("INTERVAL", 2)
+    assert file_utils.should_fsync("INTERVAL", 2)
+
+
+def test_files_are_not_tracked_without_interval(tmp_path):
+    assert not file_utils.should_fsync("NONE")
+    file_utils.atomic_write_text(tmp_path / "a.txt", "a")
+    assert not file_utils._unsynced
@@ -0,0 +1,54 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+
+"""Tests of the memory helpers (utils/profiling.py)."""
+
+import sys
+
+import numpy as np
+import pytest
+
+from blv_utils import profiling
+
+
+def test_block_size_follows_the_memory_limit():
+    assert profiling.block_size_for_memory(1) == profiling.MIN_BLOCK_SIZE
+    assert profiling.block_size_for_memory(256) == 256 * 1024 * 1024 // profiling.BYTES_PER_INSTANCE
+
+
+def test_bulk_particle_reads_stay_within_the_block_budget():
+    block_size = profiling.block_size_for_memory(256)
+    limit = profiling.bulk_particle_limit(block_size)
+    assert limit * profiling.BYTES_PER_PARTICLE_READ <= block_size * profiling.BYTES_PER_INSTANCE
+    assert limit >= block_size
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/self/statm")
+def test_current_rss_follows_allocations_and_stays_under_the_peak():
+    before = profiling.get_current_rss_mb()
+    block = np.ones(64 * 1024 * 1024 // 8)  # 64 MB, touched so it is resident
+    during = profiling.get_current_rss_mb()
+    peak = profiling.get_peak_rss_mb()
+    del block
+
+    assert 0 < before < during
+    assert during <= peak + 1
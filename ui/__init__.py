@@ -20,12 +20,16 @@ Created by Ryan Revilla
 
 from .save_panel import register as register_save, unregister as unregister_save
 from .panel_bbox import register as register_bbox, unregister as unregister_bbox
+from .panel_randomization import register as register_randomization, unregister as unregister_randomization
+from .panel_gate import register as register_gate, unregister as unregister_gate
 
 def register():
 
 
     register_save()
     register_bbox()
+    register_randomization()
+    register_gate()
     
 
 
@@ -33,4 +37,6 @@ def unregister():
 
 
     unregister_save()
-    unregister_bbox()
\ No newline at end of file
+    unregister_bbox()
+    unregister_randomization()
+    unregister_gate()
\ No newline at end of file
@@ -58,6 +58,73 @@ class BBoxTrackingProperties(bpy.types.PropertyGroup):
     selected_emitter: bpy.props.CollectionProperty(type=BBoxSelectionItem)
     active_emitter_index: bpy.props.IntProperty()
 
+    particle_source: bpy.props.EnumProperty(
+        name="Particle Transforms",
+        description="Where particle transforms are read from",
+        items=[
+            ('PARTICLES', "Particle Data", "Rebuild transforms from particle location, rotation and size (fastest)"),
+            ('INSTANCES', "Render Instances", "Use the evaluated render instances. Transforms match the render exactly, including hair and child particles"),
+        ],
+        default='PARTICLES'
+    )
+
+    use_camera_rig: bpy.props.BoolProperty(
+        name="Camera Rig",
+        description="Label every camera in the rig list in one pass instead of only the scene camera. Labels are written to one subfolder per camera",
+        default=False,
+    )
+    rig_cameras: bpy.props.CollectionProperty(type=BBoxSelectionItem)
+    active_rig_camera_index: bpy.props.IntProperty()
+
+    memory_limit_mb: bpy.props.IntProperty(
+        name="Memory Ceiling (MB)",
+        description="Approximate memory used to read and project one block of instances/particles. Lower values use smaller blocks. The boxes kept for the frame (a few hundred bytes each) come on top",
+        default=256,
+        min=16,
+    )
+
+    min_bbox_size: bpy.props.IntProperty(
+        name="Min Size (px)",
+        description="Minimum width and height of a bounding box in pixels",
+        default=5,
+        min=0,
+    )
+    min_bbox_area: bpy.props.FloatProperty(
+        name="Min Area (px²)",
+        description="Minimum bounding box area in pixels",
+        default=0.0,
+        min=0.0,
+    )
+    max_truncation: bpy.props.FloatProperty(
+        name="Max Truncation",
+        description="Maximum fraction of the projected bounding box that may lie outside the image",
+        default=1.0,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR',
+    )
+    max_aspect_ratio: bpy.props.FloatProperty(
+        name="Max Aspect Ratio",
+        description="Maximum ratio of the long to the short bounding box side (0 = off)",
+        default=0.0,
+        min=0.0,
+    )
+    min_screen_fraction: bpy.props.FloatProperty(
+        name="Min Screen Fraction",
+        description="Minimum bounding box area as a fraction of the image area",
+        default=0.0,
+        min=0.0,
+        max=1.0,
+        precision=4,
+    )
+    max_depth: bpy.props.FloatProperty(
+        name="Max Depth",
+        description="Maximum distance of the bounding box center in front of the camera (0 = off)",
+        default=0.0,
+        min=0.0,
+        subtype='DISTANCE',
+    )
+
     raycast_bool: bpy.props.BoolProperty(
         name="Use Raycast",
         description="Check if objects are blocked (occluded) by other objects. Uses raycast methods.",
@@ -68,12 +135,27 @@ class BBoxTrackingProperties(bpy.types.PropertyGroup):
         description="Choose between different raycast methods to check for blocked (occluded) objects.",
         items=[
             ("fast", "BBox Origin (Fast)", "Casts a single ray to the object's 3D bounding box center."),
+            ("multi", "Multi-Ray (Balanced)", "Casts rays to the bounding box center and a few stratified points inside it, stopping as soon as the visibility threshold is decided."),
             ("accurate", "Projected Mesh (Accurate)", "Casts rays to all object mesh that is facing the camera."),
         ]
     )
+    ray_samples: bpy.props.IntProperty(
+        name="Ray Samples",
+        description="Stratified points cast in addition to the bounding box center (Multi-Ray method)",
+        default=8,
+        min=1,
+        max=64,
+    )
+    occlusion_prepass: bpy.props.BoolProperty(
+        name="Occlusion Prepass",
+        description="Test all objects against a low resolution depth buffer of projected boxes first. Only objects that may be hidden "
+                    "by another object are raycast. Unlike Fast raycasting alone, objects whose center ray misses their own "
+                    "surface (rings, hollow or concave shapes) are kept when nothing else is in front of them",
+        default=False,
+    )
     visibility_threshold: bpy.props.FloatProperty(
         name="Visibility Threshold",
-        description="Minimum percentage of visible vertices hit for object to be counted as visible",
+        description="Minimum fraction of rays (camera facing vertices, or Multi-Ray samples) that must reach the object for it to be counted as visible",
         default=0.5,
         min=0.0,
         max=1.0,
@@ -107,6 +189,12 @@ class BBOX_UL_EmitterList(bpy.types.UIList):
         row.prop(item, "category_id", text="", emboss=True)
 
 
+class BBOX_UL_CameraList(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, "object", text="", icon='CAMERA_DATA', emboss=True)
+
+
 # --------------------------
 # UI Panel
 # --------------------------
@@ -163,14 +251,40 @@ class BBOX_PT_TrackingPanel(bpy.types.Panel):
             row = col.row(align=True)
             row.operator("bbox.add_partsys", text="Add")
             row.operator("bbox.remove_partsys", text="Remove")
+            col.prop(settings, "particle_source")
         
         layout.operator("bbox.auto_assign_categories", text="Auto Assign Categories")
+        layout.label(text="Filters")
+        col = layout.column(align=True)
+        col.prop(settings, "min_bbox_size")
+        col.prop(settings, "min_bbox_area")
+        col.prop(settings, "min_screen_fraction")
+        col.prop(settings, "max_truncation")
+        col.prop(settings, "max_aspect_ratio")
+        col.prop(settings, "max_depth")
+
         layout.label(text="Raycast (Occlusion)")
         layout.prop(settings, "raycast_bool")
         if settings.raycast_bool:
             layout.prop(settings, "raycast_enum")
             if settings.raycast_enum == "accurate":
                 layout.prop(settings,"visibility_threshold")
+            elif settings.raycast_enum == "multi":
+                layout.prop(settings, "ray_samples")
+                layout.prop(settings, "visibility_threshold")
+            elif settings.raycast_enum == "fast":
+                layout.prop(settings, "occlusion_prepass")
+
+        layout.label(text="Cameras")
+        layout.prop(settings, "use_camera_rig")
+        if settings.use_camera_rig:
+            col = layout.column()
+            col.template_list("BBOX_UL_CameraList", "", settings, "rig_cameras", settings, "active_rig_camera_index")
+            row = col.row(align=True)
+            row.operator("bbox.add_rig_camera", text="Add")
+            row.operator("bbox.remove_rig_camera", text="Remove")
+
+        layout.prop(settings, "memory_limit_mb")
 
         layout.label(text="Testing")
         layout.operator("blv.run_test_mesh_bbox", text="Test Bounding Boxes")
@@ -285,6 +399,34 @@ class BBOX_OT_RemovePartSys(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class BBOX_OT_AddRigCamera(bpy.types.Operator):
+    bl_idname = "bbox.add_rig_camera"
+    bl_label = "Add Rig Camera"
+    bl_description = "Add the selected cameras to the camera rig"
+
+    def execute(self, context):
+        settings = context.scene.blv_settings
+        in_rig = {item.object for item in settings.rig_cameras}
+        for obj in context.selected_objects:
+            if obj.type == 'CAMERA' and obj not in in_rig:
+                new_item = settings.rig_cameras.add()
+                new_item.object = obj
+        return {'FINISHED'}
+
+
+class BBOX_OT_RemoveRigCamera(bpy.types.Operator):
+    bl_idname = "bbox.remove_rig_camera"
+    bl_label = "Remove Rig Camera"
+
+    def execute(self, context):
+        settings = context.scene.blv_settings
+        index = settings.active_rig_camera_index
+        if 0 <= index < len(settings.rig_cameras):
+            settings.rig_cameras.remove(index)
+            settings.active_rig_camera_index = max(0, index - 1)
+        return {'FINISHED'}
+
+
 # --------------------------
 # Registration
 # --------------------------
@@ -295,6 +437,7 @@ classes = [
     BBOX_UL_ObjectList,
     BBOX_UL_CollectionList,
     BBOX_UL_EmitterList,
+    BBOX_UL_CameraList,
     BBOX_PT_TrackingPanel,
     BBOX_OT_AddObject,
     BBOX_OT_RemoveObject,
@@ -302,6 +445,8 @@ classes = [
     BBOX_OT_RemoveCollection,
     BBOX_OT_AddPartSys,
     BBOX_OT_RemovePartSys,
+    BBOX_OT_AddRigCamera,
+    BBOX_OT_RemoveRigCamera,
     BBOX_OT_AutoAssignCategories
 ]
 
@@ -0,0 +1,119 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import bpy
+
+# --------------------------
+# Property Groups
+# --------------------------
+
+class BBoxFrameGateProperties(bpy.types.PropertyGroup):
+    min_boxes: bpy.props.IntProperty(
+        name="Min Boxes",
+        description="Minimum number of labeled boxes for a frame to be rendered",
+        default=1,
+        min=0,
+    )
+    min_classes: bpy.props.IntProperty(
+        name="Min Classes",
+        description="Minimum number of distinct categories among the labeled boxes",
+        default=0,
+        min=0,
+    )
+    min_visibility: bpy.props.FloatProperty(
+        name="Min Visibility",
+        description="Only boxes with at least this visibility count towards Min Boxes and Min Classes",
+        default=0.0,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR',
+    )
+    on_reject: bpy.props.EnumProperty(
+        name="Rejected Frames",
+        items=[
+            ('SKIP', "Skip", "Do not render frames that fail the gate"),
+            ('RERANDOMIZE', "Re-randomize", "Draw new randomization parameters for the frame until it passes "
+                                            "(needs Domain Randomization enabled)"),
+        ],
+        default='SKIP',
+    )
+    max_retries: bpy.props.IntProperty(
+        name="Max Retries",
+        description="New randomization draws tried per rejected frame before it is skipped",
+        default=4,
+        min=1,
+        max=100,
+    )
+    plan_path: bpy.props.StringProperty(
+        name="Plan File",
+        description="Where the frame plan (.npz) is stored",
+        default="//frame_plan.npz",
+        subtype='FILE_PATH',
+    )
+
+
+# --------------------------
+# UI Panel
+# --------------------------
+
+class BBOX_PT_FrameGatePanel(bpy.types.Panel):
+    bl_label = "Frame Gate"
+    bl_idname = "BBOX_PT_FrameGatePanel"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "BL Vision"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.blv_gate
+
+        col = layout.column(align=True)
+        col.prop(props, "min_boxes")
+        col.prop(props, "min_classes")
+        col.prop(props, "min_visibility")
+
+        layout.prop(props, "on_reject")
+        if props.on_reject == 'RERANDOMIZE':
+            layout.prop(props, "max_retries")
+        layout.prop(props, "plan_path")
+
+        layout.operator("blv.plan_frames", text="Plan Frames")
+        layout.operator("blv.render_accepted_frames", text="Render Accepted Frames")
+
+
+# --------------------------
+# Registration
+# --------------------------
+
+classes = [
+    BBoxFrameGateProperties,
+    BBOX_PT_FrameGatePanel,
+]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    bpy.types.Scene.blv_gate = bpy.props.PointerProperty(type=BBoxFrameGateProperties)
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+    del bpy.types.Scene.blv_gate
@@ -0,0 +1,239 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import bpy
+from ..operators.randomization import toggle_randomization
+
+# --------------------------
+# Property Groups
+# --------------------------
+
+class BBoxRandomizationProperties(bpy.types.PropertyGroup):
+    use_randomization: bpy.props.BoolProperty(
+        name="Randomize Frames",
+        description="Apply the randomization table to the scene on every frame change (including animation renders). "
+                    "Turning it off puts the camera, lights and objects back as they were",
+        default=False,
+        update=lambda self, context: toggle_randomization(self, context),
+    )
+    seed: bpy.props.IntProperty(
+        name="Seed",
+        description="Seed of the randomization. Every frame uses its own generator seeded with (seed, frame)",
+        default=0,
+        min=0,
+    )
+    table_path: bpy.props.StringProperty(
+        name="Table File",
+        description="Where the precomputed parameter table (.npz) is stored",
+        default="//randomization.npz",
+        subtype='FILE_PATH',
+    )
+    target: bpy.props.FloatVectorProperty(
+        name="Target",
+        description="Center the camera and lights orbit around and objects are placed around",
+        default=(0.0, 0.0, 0.0),
+        subtype='XYZ',
+    )
+
+    randomize_camera: bpy.props.BoolProperty(name="Camera", default=True)
+    camera_mode: bpy.props.EnumProperty(
+        name="Camera Poses",
+        items=[
+            ('ORBIT', "Random Orbit", "Independent random viewpoint on the orbit every frame"),
+            ('PLANNED', "Planned Views", "Viewpoints spread evenly over a shell around the tracked objects. "
+                                         "Views where too few objects pass the box filters are rejected"),
+        ],
+        default='ORBIT',
+    )
+    shell: bpy.props.EnumProperty(
+        name="Shell",
+        items=[
+            ('SPHERE', "Sphere", "Viewpoints all around the objects"),
+            ('HEMISPHERE', "Hemisphere", "Viewpoints above the objects"),
+            ('SHELL', "Custom Shell", "Viewpoints between the elevation limits"),
+        ],
+        default='HEMISPHERE',
+    )
+    planner_attempts: bpy.props.IntProperty(
+        name="Attempts per Frame",
+        description="Candidate viewpoints tried per frame before keeping the one framing the most objects",
+        default=16,
+        min=1,
+        max=256,
+    )
+    min_visible_targets: bpy.props.IntProperty(
+        name="Min Framed Objects",
+        description="Objects whose projected box must pass the box filters for a viewpoint to be accepted",
+        default=1,
+        min=0,
+    )
+    camera_distance_min: bpy.props.FloatProperty(name="Distance Min", default=5.0, min=0.0, subtype='DISTANCE')
+    camera_distance_max: bpy.props.FloatProperty(name="Distance Max", default=10.0, min=0.0, subtype='DISTANCE')
+    camera_elevation_min: bpy.props.FloatProperty(name="Elevation Min", default=0.2, min=-1.5708, max=1.5708, subtype='ANGLE')
+    camera_elevation_max: bpy.props.FloatProperty(name="Elevation Max", default=1.2, min=-1.5708, max=1.5708, subtype='ANGLE')
+    camera_roll: bpy.props.FloatProperty(
+        name="Roll Jitter",
+        description="Maximum camera roll either way",
+        default=0.0,
+        min=0.0,
+        max=3.14159,
+        subtype='ANGLE',
+    )
+
+    randomize_lights: bpy.props.BoolProperty(name="Lights", default=True)
+    light_collection: bpy.props.PointerProperty(
+        name="Light Collection",
+        description="Lights to randomize. All scene lights are used when empty",
+        type=bpy.types.Collection,
+    )
+    light_distance_min: bpy.props.FloatProperty(name="Distance Min", default=4.0, min=0.0, subtype='DISTANCE')
+    light_distance_max: bpy.props.FloatProperty(name="Distance Max", default=8.0, min=0.0, subtype='DISTANCE')
+    light_elevation_min: bpy.props.FloatProperty(name="Elevation Min", default=0.3, min=-1.5708, max=1.5708, subtype='ANGLE')
+    light_elevation_max: bpy.props.FloatProperty(name="Elevation Max", default=1.4, min=-1.5708, max=1.5708, subtype='ANGLE')
+    light_energy_min: bpy.props.FloatProperty(name="Power Min", default=500.0, min=0.0, subtype='POWER')
+    light_energy_max: bpy.props.FloatProperty(name="Power Max", default=1500.0, min=0.0, subtype='POWER')
+    light_temperature_min: bpy.props.FloatProperty(name="Temperature Min (K)", default=3000.0, min=1000.0, max=40000.0)
+    light_temperature_max: bpy.props.FloatProperty(name="Temperature Max (K)", default=7000.0, min=1000.0, max=40000.0)
+
+    randomize_objects: bpy.props.BoolProperty(
+        name="Object Placement",
+        description="Randomize location, rotation and scale of the tracked objects",
+        default=True,
+    )
+    placement_extent: bpy.props.FloatVectorProperty(
+        name="Placement Extent",
+        description="Half size of the box around the target objects are placed in",
+        default=(2.0, 2.0, 0.0),
+        min=0.0,
+        subtype='XYZ',
+    )
+    rotation_mode: bpy.props.EnumProperty(
+        name="Rotation",
+        items=[
+            ('NONE', "None", "Keep objects upright with no rotation"),
+            ('Z', "Vertical Axis", "Random rotation about the vertical axis"),
+            ('FULL', "Full", "Uniformly random 3D rotation"),
+        ],
+        default='Z',
+    )
+    scale_min: bpy.props.FloatProperty(name="Scale Min", default=1.0, min=0.0)
+    scale_max: bpy.props.FloatProperty(name="Scale Max", default=1.0, min=0.0)
+
+    randomize_materials: bpy.props.BoolProperty(
+        name="Material Variation",
+        description="Set a random object color (Object Info > Color) and a random 'blv_variation' value "
+                    "(Attribute node, type Object) on the tracked objects for materials to use",
+        default=False,
+    )
+    saturation_min: bpy.props.FloatProperty(name="Saturation Min", default=0.5, min=0.0, max=1.0)
+    saturation_max: bpy.props.FloatProperty(name="Saturation Max", default=1.0, min=0.0, max=1.0)
+    value_min: bpy.props.FloatProperty(name="Value Min", default=0.5, min=0.0, max=1.0)
+    value_max: bpy.props.FloatProperty(name="Value Max", default=1.0, min=0.0, max=1.0)
+
+
+# --------------------------
+# UI Panel
+# --------------------------
+
+class BBOX_PT_RandomizationPanel(bpy.types.Panel):
+    bl_label = "Domain Randomization"
+    bl_idname = "BBOX_PT_RandomizationPanel"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "BL Vision"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.blv_random
+
+        layout.prop(props, "use_randomization")
+        layout.prop(props, "seed")
+        layout.prop(props, "table_path")
+        layout.prop(props, "target")
+
+        layout.prop(props, "randomize_camera")
+        if props.randomize_camera:
+            layout.prop(props, "camera_mode")
+            col = layout.column(align=True)
+            col.prop(props, "camera_distance_min")
+            col.prop(props, "camera_distance_max")
+            if props.camera_mode == 'PLANNED':
+                col.prop(props, "shell")
+                if props.shell == 'SHELL':
+                    col.prop(props, "camera_elevation_min")
+                    col.prop(props, "camera_elevation_max")
+                col.prop(props, "planner_attempts")
+                col.prop(props, "min_visible_targets")
+            else:
+                col.prop(props, "camera_elevation_min")
+                col.prop(props, "camera_elevation_max")
+                col.prop(props, "camera_roll")
+
+        layout.prop(props, "randomize_lights")
+        if props.randomize_lights:
+            layout.prop(props, "light_collection")
+            col = layout.column(align=True)
+            col.prop(props, "light_distance_min")
+            col.prop(props, "light_distance_max")
+            col.prop(props, "light_elevation_min")
+            col.prop(props, "light_elevation_max")
+            col.prop(props, "light_energy_min")
+            col.prop(props, "light_energy_max")
+            col.prop(props, "light_temperature_min")
+            col.prop(props, "light_temperature_max")
+
+        layout.prop(props, "randomize_objects")
+        if props.randomize_objects:
+            layout.prop(props, "placement_extent")
+            layout.prop(props, "rotation_mode")
+            col = layout.column(align=True)
+            col.prop(props, "scale_min")
+            col.prop(props, "scale_max")
+
+        layout.prop(props, "randomize_materials")
+        if props.randomize_materials:
+            col = layout.column(align=True)
+            col.prop(props, "saturation_min")
+            col.prop(props, "saturation_max")
+            col.prop(props, "value_min")
+            col.prop(props, "value_max")
+
+        layout.operator("blv.build_randomization", text="Build Randomization Table")
+
+
+# --------------------------
+# Registration
+# --------------------------
+
+classes = [
+    BBoxRandomizationProperties,
+    BBOX_PT_RandomizationPanel,
+]
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    bpy.types.Scene.blv_random = bpy.props.PointerProperty(type=BBoxRandomizationProperties)
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+    del bpy.types.Scene.blv_random
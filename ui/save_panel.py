@@ -22,6 +22,10 @@ import bpy
 from pathlib import Path
 from bpy.app.handlers import persistent
 from .. import addon_updater_ops
+from ..utils.file_utils import FSYNC_POLICIES, clear_directory_listings, reset_fsync_interval, sync_unsynced_files
+from ..utils.columnar_bbox import flush_columnar_writers, has_parquet
+from ..utils.dataset_split import get_frame_split
+from ..utils.manifest import get_manifest_path, commit_manifest_entries, clear_manifests
 
 DEFAULT_SAVE_PATH = str(Path.home() / "Downloads")
 
@@ -47,12 +51,68 @@ class saveDataProperties(bpy.types.PropertyGroup):
         items=[
             ("YOLO", "YOLO", "Save data in YOLO format"),
             ("COCO", "COCO", "Save data in COCO format"),
+            ("COLUMNAR", "Columnar", "Save one row per box as Parquet (if pyarrow is installed) or .npz parts"),
         ]
     )
+    columnar_frames_per_part: bpy.props.IntProperty(
+        name="Frames per Part",
+        description="Number of frames collected into one columnar part file (one row group per frame)",
+        default=10,
+        min=1,
+    )
+    fsync_enum: bpy.props.EnumProperty(
+        name="Flush to Disk",
+        description="How often label files are fsynced. Files are always replaced atomically",
+        items=FSYNC_POLICIES,
+        default="NONE",
+    )
+    fsync_interval: bpy.props.IntProperty(
+        name="Frames",
+        description="Number of frames between fsyncs",
+        default=10,
+        min=1,
+    )
+    use_split: bpy.props.BoolProperty(
+        name="Split Dataset",
+        description="Assign every frame to train/val/test from a hash of (seed, frame) and save it into that split's folders",
+        default=False,
+        update=lambda self, context: toggle_change_render_dir(self, context),
+    )
+    split_seed: bpy.props.IntProperty(
+        name="Split Seed",
+        description="Seed of the split assignment. The same seed always puts a frame into the same split",
+        default=0,
+        min=0,
+    )
+    split_train: bpy.props.FloatProperty(
+        name="Train",
+        description="Share of frames in the train split",
+        default=0.8,
+        min=0.0,
+        max=1.0,
+        subtype="FACTOR",
+    )
+    split_val: bpy.props.FloatProperty(
+        name="Val",
+        description="Share of frames in the val split",
+        default=0.1,
+        min=0.0,
+        max=1.0,
+        subtype="FACTOR",
+    )
+    split_test: bpy.props.FloatProperty(
+        name="Test",
+        description="Share of frames in the test split",
+        default=0.1,
+        min=0.0,
+        max=1.0,
+        subtype="FACTOR",
+    )
     overwrite_bool: bpy.props.BoolProperty(
         name="Overwrite",
-        description="Overwrite",
-        default=False,
+        description="Re-render and relabel frames that are already complete. When off, existing images and labels are kept",
+        default=True,
+        update=lambda self, context: toggle_render_overwrite(self, context),
     )
     bbox_bool: bpy.props.BoolProperty(
         name="Bounding Box",
@@ -60,6 +120,11 @@ class saveDataProperties(bpy.types.PropertyGroup):
         default=False,
         update=lambda self, context: update_handler_and_render_path(self, context),
     )
+    keypoint_bool: bpy.props.BoolProperty(
+        name="Cuboid Keypoints",
+        description="Also export the 8 projected bounding box corners and the centroid as keypoints (YOLO-pose / COCO keypoints)",
+        default=False,
+    )
     segm_bool: bpy.props.BoolProperty(
         name="Segmentation (Coming Soon)",
         description="Output segmentation",
@@ -119,21 +184,32 @@ class saveDataProperties(bpy.types.PropertyGroup):
 ####################################
 # Functions for handling save paths
 ####################################
-# Utility to resolve dataset paths
-def get_dataset_paths(props):
+# Utility to resolve dataset paths. `split` is one of SPLITS (see get_frame_split).
+def get_dataset_paths(props, split="train"):
     root = Path(props.root_path)
     fmt = props.format_enum
 
     if props.use_custom_paths:
-        return Path(props.custom_image_path), Path(props.custom_label_path)
+        image_path, label_path = Path(props.custom_image_path), Path(props.custom_label_path)
+        if not props.use_split:
+            return image_path, label_path
+        # COCO keeps all splits in one folder as {split}.json
+        return image_path / split, label_path if fmt == "COCO" else label_path / split
 
     if fmt == "YOLO":
-        return root / "images" / "train", root / "labels" / "train"
+        return root / "images" / split, root / "labels" / split
     elif fmt == "COCO":
-        return root / "images" / "train", root / "annotations"
+        return root / "images" / split, root / "annotations"
+    elif fmt == "COLUMNAR":
+        label_path = root / "annotations" / "columnar"
+        return root / "images" / split, label_path / split if props.use_split else label_path
     else:
         return root, root
 
+# Blender's own Overwrite setting keeps the images of an animation render in step with the labels
+def toggle_render_overwrite(self, context):
+    context.scene.render.use_overwrite = self.overwrite_bool
+
 # Create output folder if it doesn't exist (except for images)
 def ensure_label_folder_exists(path):
     path = Path(path)
@@ -144,7 +220,7 @@ def ensure_label_folder_exists(path):
 # set render path and label path
 def toggle_change_render_dir(self, context):
     if self.bbox_bool:
-        image_path, label_path = get_dataset_paths(self)
+        image_path, label_path = get_dataset_paths(self, get_frame_split(self, context.scene.frame_current))
         bpy.context.scene.render.filepath = str(Path(image_path) / self.file_prefix)
         self.image_path = str(image_path)
         self.label_path = str(label_path)
@@ -155,7 +231,14 @@ def toggle_change_render_dir(self, context):
 def render_handler(scene):
     props = scene.blv_save
     if props.bbox_bool:
-        image_path, label_path = get_dataset_paths(props)
+        image_path, label_path = get_dataset_paths(props, get_frame_split(props, scene.frame_current))
+        use_camera_rig = scene.blv_settings.use_camera_rig and scene.camera is not None
+        if use_camera_rig:
+            # Each rig camera has its own image folder, matching its label folder
+            image_path = image_path / scene.camera.name
+        if props.use_split or use_camera_rig:
+            # Route the image of this frame into its split. The output path is resolved after render_pre.
+            scene.render.filepath = str(image_path / props.file_prefix)
         props.image_path = str(image_path)
         props.label_path = str(label_path)
         ensure_label_folder_exists(label_path)
@@ -169,6 +252,32 @@ def render_handler(scene):
         print("✅ Running Segmentation Mask Operator before render...")
         bpy.ops.blv.run_segmentation_mask()
 
+# Write out columnar parts still buffered when a render finishes or is cancelled, and flush the files
+# the fsync interval has not reached yet.
+@persistent
+def flush_annotations_handler(scene, *args):
+    flush_columnar_writers()
+    sync_unsynced_files()
+
+# At the start of every render: apply the overwrite policy to Blender's image output as well, so images
+# and labels are always kept or replaced together, re-read the directory listings, which files may
+# have been added to or removed from since the last render, and restart the fsync interval.
+@persistent
+def render_init_handler(scene, *args):
+    props = scene.blv_save
+    if props.bbox_bool:
+        scene.render.use_overwrite = props.overwrite_bool
+    clear_directory_listings()
+    reset_fsync_interval()
+
+# Record the labeled frame in the dataset manifest once its image is written, with the image checksums.
+@persistent
+def manifest_write_handler(scene, *args):
+    props = scene.blv_save
+    if props.bbox_bool:
+        fsync = props.fsync_enum != "NONE"
+        commit_manifest_entries(get_manifest_path(props), scene.frame_current, fsync=fsync)
+
 # toggle function for setting pre-render handler. Appends to the render_pre handler.
 # Calls the render handler every render.
 def toggle_render_handler(self, context):
@@ -209,8 +318,14 @@ class saveDataPanel(bpy.types.Panel):
         save_props = scene.blv_save
 
         layout.prop(save_props, "format_enum")
+        if save_props.format_enum == "COLUMNAR":
+            layout.prop(save_props, "columnar_frames_per_part")
+            backend = "Parquet" if has_parquet() else "NPZ (install pyarrow for Parquet)"
+            layout.label(text=f"Backend: {backend}")
         
         layout.prop(save_props, "bbox_bool")
+        if save_props.bbox_bool:
+            layout.prop(save_props, "keypoint_bool")
         col = layout.column()
         col.active = False
         col.prop(save_props, "pose_bool")
@@ -223,9 +338,26 @@ class saveDataPanel(bpy.types.Panel):
             if save_props.use_custom_paths:
                 layout.prop(save_props, "custom_image_path")
                 layout.prop(save_props, "custom_label_path")
+            layout.prop(save_props, "use_split")
+            if save_props.use_split:
+                row = layout.row(align=True)
+                row.prop(save_props, "split_train")
+                row.prop(save_props, "split_val")
+                row.prop(save_props, "split_test")
+                layout.prop(save_props, "split_seed")
+            row = layout.row(align=True)
+            row.prop(save_props, "overwrite_bool")
+            row.operator("blv.resume_render", text="Resume Render")
+            row = layout.row(align=True)
+            row.prop(save_props, "fsync_enum")
+            if save_props.fsync_enum == "INTERVAL":
+                row.prop(save_props, "fsync_interval")
 
             # Display paths without modifying them in draw()
-            image_path, label_path = get_dataset_paths(save_props)
+            split = get_frame_split(save_props, scene.frame_current)
+            image_path, label_path = get_dataset_paths(save_props, split)
+            if save_props.use_split:
+                layout.label(text=f"🔀 Frame {scene.frame_current}: {split}")
             layout.label(text=f"📁 Images: {image_path}")
             layout.label(text=f"📝 Labels/Annotations: {label_path}")
 
@@ -285,10 +417,30 @@ def register():
         bpy.app.handlers.load_post.append(auto_register_handler_on_load)
         print("📦 Registered load_post handler for bbox_bool")
 
+    for handlers in (bpy.app.handlers.render_complete, bpy.app.handlers.render_cancel):
+        if flush_annotations_handler not in handlers:
+            handlers.append(flush_annotations_handler)
+
+    if manifest_write_handler not in bpy.app.handlers.render_write:
+        bpy.app.handlers.render_write.append(manifest_write_handler)
+    if render_init_handler not in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.append(render_init_handler)
+
 def unregister():
     if auto_register_handler_on_load in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.remove(auto_register_handler_on_load)
 
+    for handlers in (bpy.app.handlers.render_complete, bpy.app.handlers.render_cancel):
+        if flush_annotations_handler in handlers:
+            handlers.remove(flush_annotations_handler)
+    flush_columnar_writers()
+
+    if manifest_write_handler in bpy.app.handlers.render_write:
+        bpy.app.handlers.render_write.remove(manifest_write_handler)
+    if render_init_handler in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.remove(render_init_handler)
+    clear_manifests()
+
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.blv_save
@@ -0,0 +1,390 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import zlib
+import numpy as np
+
+###
+# Pure NumPy annotation core. No bpy: every function takes plain arrays
+# (corners, camera matrices, resolution) so it can run and be measured outside Blender.
+# utils/bbox_utils.py is the Blender adapter around it.
+###
+
+MIN_BBOX_SIZE = 5  # Set a minimum size threshold (in pixels) for bounding boxes
+BOUNDS_TOLERANCE = 1e-4  # Margin of raycast hit tests against world bounds, relative to the box diagonal
+
+# Box filters applied by bbox_filter_mask. A max of 0 disables that filter.
+DEFAULT_BBOX_FILTERS = {
+    "min_size": MIN_BBOX_SIZE,      # Minimum width and height in pixels
+    "min_area": 0.0,                # Minimum area in pixels
+    "max_truncation": 1.0,          # Maximum fraction of the projected box outside the frame
+    "max_aspect_ratio": 0.0,        # Maximum long side / short side
+    "min_screen_fraction": 0.0,     # Minimum box area / image area
+    "max_depth": 0.0,               # Maximum camera-space depth of the box center
+}
+
+# Keypoint layout for cuboid export: the 8 bound_box corners (in Blender's bound_box order) plus the centroid
+BBOX_KEYPOINT_NAMES = [f"corner_{i}" for i in range(8)] + ["centroid"]
+# Cuboid edges between bound_box corners (0-based indices into BBOX_KEYPOINT_NAMES)
+BBOX_KEYPOINT_SKELETON = [
+    (0, 1), (1, 2), (2, 3), (3, 0),
+    (4, 5), (5, 6), (6, 7), (7, 4),
+    (0, 4), (1, 5), (2, 6), (3, 7),
+]
+
+
+###
+# Camera projection
+###
+
+def project_points_to_ndc(points_world, world_to_camera, frame, is_ortho):
+    """
+    Vectorized equivalent of bpy_extras.object_utils.world_to_camera_view for an (..., 3) array.
+    `world_to_camera` is the (4, 4) inverse camera matrix, `frame` the first 3 corners of the camera view frame
+    in camera space (top right, bottom right, bottom left) and `is_ortho` the projection type.
+    Returns (..., 3) with normalized x, y and the distance in front of the camera as z.
+    """
+    co_local = points_world @ world_to_camera[:3, :3].T + world_to_camera[:3, 3]
+    z = -co_local[..., 2]
+
+    if is_ortho:
+        min_x, max_x = frame[2, 0], frame[1, 0]
+        min_y, max_y = frame[1, 1], frame[0, 1]
+        x = (co_local[..., 0] - min_x) / (max_x - min_x)
+        y = (co_local[..., 1] - min_y) / (max_y - min_y)
+    else:
+        # The view frame scaled to depth z (all frame corners share the same frame z)
+        behind = z == 0.0
+        safe_z = np.where(behind, 1.0, z)
+        min_x, max_x = -frame[2, 0] / frame[2, 2] * safe_z, -frame[1, 0] / frame[1, 2] * safe_z
+        min_y, max_y = -frame[1, 1] / frame[1, 2] * safe_z, -frame[0, 1] / frame[0, 2] * safe_z
+        x = np.where(behind, 0.5, (co_local[..., 0] - min_x) / (max_x - min_x))
+        y = np.where(behind, 0.5, (co_local[..., 1] - min_y) / (max_y - min_y))
+
+    return np.stack([x, y, z], axis=-1)
+
+
+class CameraModel:
+    """
+    Projection data of one camera for one frame, as plain arrays:
+    `world_to_camera` (4, 4), the view `frame` (see project_points_to_ndc), the projection type,
+    clip range, render resolution in pixels, pixel aspect, sensor fit and lens shift.
+    Build it once per frame and share it between every projection and culling step.
+    """
+
+    def __init__(self, world_to_camera, frame, is_ortho, *, clip_start=0.1, clip_end=1000.0,
+                 resolution=(1920, 1080), pixel_aspect=(1.0, 1.0), sensor_fit='AUTO', shift=(0.0, 0.0)):
+        self.world_to_camera = np.asarray(world_to_camera, dtype=np.float64)
+        self.frame = np.asarray(frame, dtype=np.float64)
+        self.is_ortho = is_ortho
+        self.clip_start = clip_start
+        self.clip_end = clip_end
+        self.resolution = tuple(resolution)
+        self.pixel_aspect = tuple(pixel_aspect)
+        self.sensor_fit = sensor_fit
+        self.shift = tuple(shift)
+        self.location = np.linalg.inv(self.world_to_camera)[:3, 3]
+
+    @property
+    def projection(self):
+        """(world_to_camera, frame, is_ortho), the camera arguments of project_points_to_ndc."""
+        return self.world_to_camera, self.frame, self.is_ortho
+
+    def project(self, points_world):
+        """project_points_to_ndc for this camera."""
+        return project_points_to_ndc(points_world, self.world_to_camera, self.frame, self.is_ortho)
+
+    def to_pixels(self, points_ndc):
+        """(..., 2) pixel coordinates (y down) of projected points."""
+        res_x, res_y = self.resolution
+        return np.stack([points_ndc[..., 0] * res_x, (1 - points_ndc[..., 1]) * res_y], axis=-1)
+
+
+def transform_corners(matrices, local_corners):
+    """
+    World-space corners of boxes: (N, 4, 4) matrices applied to (8, 3) local corners shared by all boxes,
+    or to (N, 8, 3) corners per box. Returns (N, 8, 3).
+    """
+    subscripts = 'nij,kj->nki' if local_corners.ndim == 2 else 'nij,nkj->nki'
+    return np.einsum(subscripts, matrices[:, :3, :3], local_corners) + matrices[:, None, :3, 3]
+
+
+def corner_bounds(corners_world):
+    """(N, 2, 3) axis-aligned min/max of (N, 8, 3) corners."""
+    return np.stack([corners_world.min(axis=1), corners_world.max(axis=1)], axis=1)
+
+
+def points_in_bounds(points, lower, upper, tolerance=BOUNDS_TOLERANCE):
+    """
+    Mask of (..., 3) points inside (..., 3) min/max bounds, grown by `tolerance` times the box diagonal
+    plus a few float32 steps of the coordinates. Ray hits on a box face are computed in float32 and
+    often land just outside the exact bounds.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    magnitude = np.maximum(np.abs(lower), np.abs(upper)).max(axis=-1, keepdims=True)
+    margin = (tolerance * np.linalg.norm(upper - lower, axis=-1, keepdims=True)
+              + 4 * np.finfo(np.float32).eps * magnitude)
+    return np.all((lower - margin <= points) & (points <= upper + margin), axis=-1)
+
+
+def shift_view_frame(frame, shift_x, sensor_fit='AUTO'):
+    """
+    Move a (3, 3) view frame (see project_points_to_ndc) sideways by a lens shift of `shift_x`.
+    Shift is a fraction of the frame side selected by `sensor_fit` (the larger side for AUTO), as in Blender.
+    """
+    width = frame[1, 0] - frame[2, 0]
+    height = frame[0, 1] - frame[1, 1]
+    if sensor_fit == 'HORIZONTAL':
+        size = width
+    elif sensor_fit == 'VERTICAL':
+        size = height
+    else:
+        size = max(width, height)
+
+    frame = np.array(frame, dtype=np.float64)
+    frame[:, 0] += shift_x * size
+    return frame
+
+
+def stereo_eye_transform(is_left, interocular_distance, convergence_distance, convergence_mode='OFFAXIS',
+                         pivot='LEFT', lens=50.0, sensor_width=36.0):
+    """
+    Placement of one eye of a stereo camera relative to the camera, following Blender's stereo settings.
+    Returns (x offset along the camera X axis, toe-in rotation about the camera Y axis in radians,
+    extra horizontal lens shift). The pivot eye stays on the camera itself.
+    """
+    if (pivot == 'LEFT' and is_left) or (pivot == 'RIGHT' and not is_left):
+        return 0.0, 0.0, 0.0
+
+    fac = 0.5 if pivot == 'CENTER' else 1.0
+    # The left eye sits on the camera's -X side
+    offset = interocular_distance * fac * (-1.0 if is_left else 1.0)
+
+    angle = 0.0
+    shift_x = 0.0
+    if convergence_mode == 'TOE':
+        # Turn towards the convergence point in front of the camera
+        angle = float(np.arctan2(offset, convergence_distance))
+    elif convergence_mode == 'OFFAXIS':
+        # Shear the frustum so both eyes frame the same plane at the convergence distance
+        shift_x = -offset / sensor_width * lens / convergence_distance
+    return offset, angle, shift_x
+
+
+###
+# Boxes, filters and keypoints
+###
+
+def calculate_bbox_from_ndc(corners_ndc, render_size, filters=None):
+    """
+    Compute the clamped pixel bbox of projected corners.
+    Returns ((min_x, min_y), (max_x, max_y), visible_fraction) or None if the box is rejected.
+    """
+    accepted, boxes, visible_fraction = calculate_bboxes_from_ndc_batch(corners_ndc[None], render_size, filters)
+    if not accepted[0]:
+        return None
+
+    min_x, min_y, max_x, max_y = boxes[0].tolist()
+    return (min_x, min_y), (max_x, max_y), float(visible_fraction[0])
+
+def calculate_keypoints_from_ndc(points_ndc, render_size):
+    """
+    Convert projected cuboid points (8 corners + centroid) to pixel keypoints.
+    Returns a (9, 3) array of (pixel_x, pixel_y, visibility) using the COCO convention:
+    2 = in front of the camera and inside the frame, 0 = not labeled (coordinates zeroed).
+    """
+    res_x, res_y = render_size
+
+    keypoints = np.zeros(points_ndc.shape)
+    in_frame = (
+        (points_ndc[..., 2] > 0)
+        & (points_ndc[..., 0] >= 0) & (points_ndc[..., 0] <= 1)
+        & (points_ndc[..., 1] >= 0) & (points_ndc[..., 1] <= 1)
+    )
+    keypoints[in_frame, 0] = points_ndc[in_frame, 0] * res_x
+    keypoints[in_frame, 1] = (1 - points_ndc[in_frame, 1]) * res_y  # Flip Y-axis for image coordinates
+    keypoints[in_frame, 2] = 2
+    return keypoints
+
+
+def bbox_filter_mask(boxes, visible_fraction, depth, render_size, filters=None):
+    """
+    Vectorized box filters over all candidates. Returns an (N,) mask of the boxes to keep.
+    `boxes` are (N, 4) clamped pixel boxes, `visible_fraction` the fraction of the projected box inside the frame
+    and `depth` the camera-space depth of the box center. `filters` is a dict like DEFAULT_BBOX_FILTERS.
+    """
+    filters = DEFAULT_BBOX_FILTERS if filters is None else {**DEFAULT_BBOX_FILTERS, **filters}
+    res_x, res_y = render_size
+    width = boxes[:, 2] - boxes[:, 0]
+    height = boxes[:, 3] - boxes[:, 1]
+    area = width * height
+
+    keep = (
+        (visible_fraction > 0)
+        & (width >= filters["min_size"])
+        & (height >= filters["min_size"])
+        & (area >= filters["min_area"])
+        & (area >= filters["min_screen_fraction"] * res_x * res_y)
+        & (1 - visible_fraction <= filters["max_truncation"])
+    )
+    if filters["max_aspect_ratio"] > 0:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aspect = np.maximum(width, height) / np.minimum(width, height)
+        keep &= aspect <= filters["max_aspect_ratio"]
+    if filters["max_depth"] > 0:
+        keep &= depth <= filters["max_depth"]
+    return keep
+
+
+def calculate_bboxes_from_ndc_batch(corners_ndc, render_size, filters=None):
+    """
+    Vectorized calculate_bbox_from_ndc for (N, 8, 3) projected corners.
+    Returns (accepted mask, (N, 4) clamped pixel boxes as x0, y0, x1, y1, visible fraction).
+    """
+    res_x, res_y = render_size
+    xy = corners_ndc[..., :2]
+    in_front = corners_ndc[..., 2] > 0
+
+    # Need more than 3 corners in front of the camera
+    enough_points = in_front.sum(axis=1) > 3
+
+    # Total area covered by projected bounding box (regardless of screen bounds)
+    total_area = np.prod(xy.max(axis=1) - xy.min(axis=1), axis=1)
+
+    # Clamp visible points to screen space and calculate visible area
+    clipped = np.clip(xy, 0, 1)
+    in_front_xy = in_front[..., None]
+    visible_min = np.where(in_front_xy, clipped, np.inf).min(axis=1)
+    visible_max = np.where(in_front_xy, clipped, -np.inf).max(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        visible_area = np.prod(visible_max - visible_min, axis=1)
+        visible_fraction = np.where(total_area > 0, visible_area / total_area, 0)
+
+    # Convert NDC coordinates to pixel coordinates and clamp to image boundaries
+    pixel_x = xy[..., 0] * res_x
+    pixel_y = (1 - xy[..., 1]) * res_y  # Flip Y-axis for image coordinates
+    boxes = np.stack([
+        np.maximum(0, pixel_x.min(axis=1)),
+        np.maximum(0, pixel_y.min(axis=1)),
+        np.maximum(0, np.minimum(pixel_x.max(axis=1), res_x)),
+        np.maximum(0, np.minimum(pixel_y.max(axis=1), res_y)),
+    ], axis=1)
+
+    accepted = enough_points & bbox_filter_mask(
+        boxes, visible_fraction, corners_ndc[..., 2].mean(axis=1), render_size, filters
+    )
+    return accepted, boxes, visible_fraction
+
+
+###
+# Transforms
+###
+
+def quaternions_to_matrices(quaternions):
+    """Convert (N, 4) w, x, y, z quaternions to (N, 3, 3) rotation matrices."""
+    norms = np.linalg.norm(quaternions, axis=1, keepdims=True)
+    q = np.where(norms > 0, quaternions / np.where(norms > 0, norms, 1), [1.0, 0.0, 0.0, 0.0])
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=1),
+    ], axis=1)
+
+
+def compose_matrices(locations, rotations, sizes):
+    """Build (N, 4, 4) LocRotScale matrices from locations, w-first quaternions and uniform sizes."""
+    matrices = np.zeros((len(locations), 4, 4))
+    matrices[:, :3, :3] = quaternions_to_matrices(rotations) * sizes[:, None, None]
+    matrices[:, :3, 3] = locations
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+###
+# Instance identity
+###
+
+# Levels of a depsgraph instance persistent_id; unused levels hold INT_MAX
+PERSISTENT_ID_LEVELS = 8
+PERSISTENT_ID_UNUSED = 2 ** 31 - 1
+NO_INSTANCER = -1  # Instancer code of objects that are not instances
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def name_code(name):
+    """Stable 32-bit code of an object name, the same in every session."""
+    return zlib.crc32(name.encode("utf-8"))
+
+
+def _mix64(z):
+    # SplitMix64 finalizer (uint64 array arithmetic wraps)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def instance_keys(object_codes, persistent_ids, instancer_codes):
+    """
+    Int64 identity of (N,) boxes from the code of the instanced object, the full (N, 8) persistent_id and
+    the code of the instancer (NO_INSTANCER for real objects). persistent_id[0] alone repeats across
+    emitters, particle systems and instancers that instance the same object at the same index.
+    """
+    columns = [np.asarray(object_codes, dtype=np.int64), np.asarray(instancer_codes, dtype=np.int64)]
+    persistent_ids = np.asarray(persistent_ids, dtype=np.int64).reshape(len(columns[0]), -1)
+    columns.extend(persistent_ids.T)
+
+    z = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        z = _mix64((z ^ column.astype(np.uint64)) + _GOLDEN_GAMMA)
+    return z.view(np.int64)
+
+
+def object_keys(object_codes):
+    """instance_keys of real (non-instanced) objects."""
+    object_codes = np.asarray(object_codes, dtype=np.int64)
+    return instance_keys(object_codes, np.zeros((len(object_codes), PERSISTENT_ID_LEVELS), dtype=np.int64),
+                         np.full(len(object_codes), NO_INSTANCER, dtype=np.int64))
+
+
+###
+# Sampling
+###
+
+def stratified_box_samples(num_samples):
+    """
+    Fixed sample pattern for raycast_multi: the box center followed by `num_samples` stratified points
+    (a 3D Hammersley set, kept away from the faces), as (num_samples + 1, 3) unit-cube coordinates.
+    """
+    def radical_inverse(i, base):
+        inverse, scale = 0.0, 1.0 / base
+        while i:
+            inverse += (i % base) * scale
+            i //= base
+            scale /= base
+        return inverse
+
+    points = [(0.5, 0.5, 0.5)]
+    for i in range(num_samples):
+        points.append(((i + 0.5) / num_samples, radical_inverse(i + 1, 2), radical_inverse(i + 1, 3)))
+    return 0.1 + 0.8 * np.array(points, dtype=np.float64)
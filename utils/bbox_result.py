@@ -0,0 +1,161 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+# Column name -> (dtype, fill value for rows appended without that column)
+BBOX_COLUMNS = {
+    "x0": (np.float64, 0.0),
+    "y0": (np.float64, 0.0),
+    "x1": (np.float64, 0.0),
+    "y1": (np.float64, 0.0),
+    "category": (np.int32, 0),
+    "object_id": (np.int32, -1),
+    "instance_id": (np.int64, -1),
+    "instance_key": (np.int64, -1),     # bbox_core.instance_keys identity of instances, -1 for real objects
+    "visibility": (np.float32, 1.0),
+    "depth": (np.float32, 0.0),
+}
+
+
+class BBoxResult:
+    """
+    Struct-of-arrays container for the 2D bounding boxes found in one frame.
+    Every column is a NumPy array grown in place; `object_id` indexes into `object_names`.
+    Pixel coordinates are (x0, y0) top-left and (x1, y1) bottom-right.
+    Keypoints are an optional (N, K, 3) column, enabled with `num_keypoints`.
+    World bounds are an optional (N, 2, 3) column with the world-space min/max of each box's
+    3D bound_box corners, enabled with `world_bounds` (used by the occlusion prepass).
+    """
+
+    def __init__(self, capacity=64, num_keypoints=0, world_bounds=False):
+        self._size = 0
+        self._capacity = max(1, capacity)
+        self._columns = {
+            name: np.full(self._capacity, fill, dtype=dtype)
+            for name, (dtype, fill) in BBOX_COLUMNS.items()
+        }
+        self.num_keypoints = num_keypoints
+        if num_keypoints:
+            self._columns["keypoints"] = np.zeros((self._capacity, num_keypoints, 3))
+        if world_bounds:
+            self._columns["world_bounds"] = np.zeros((self._capacity, 2, 3))
+        self.object_names = []
+        self._object_lookup = {}
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __getattr__(self, name):
+        # Column access returns a view of the filled rows, e.g. result.x0
+        columns = self.__dict__.get("_columns")
+        if columns is not None and name in columns:
+            return columns[name][:self._size]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @property
+    def has_keypoints(self):
+        return "keypoints" in self._columns
+
+    @property
+    def has_world_bounds(self):
+        return "world_bounds" in self._columns
+
+    @property
+    def xyxy(self):
+        """(N, 4) array of x0, y0, x1, y1."""
+        return np.stack([self.x0, self.y0, self.x1, self.y1], axis=1)
+
+    def register_object(self, name):
+        """Return the id for an object name, registering it on first use."""
+        object_id = self._object_lookup.get(name)
+        if object_id is None:
+            object_id = len(self.object_names)
+            self._object_lookup[name] = object_id
+            self.object_names.append(name)
+        return object_id
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2)
+        for name, column in self._columns.items():
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def append(self, x0, y0, x1, y1, category, *, object_id=-1, instance_id=-1, instance_key=-1,
+               visibility=1.0, depth=0.0, keypoints=None, world_bounds=None):
+        """Append a single box."""
+        self._reserve(1)
+        i = self._size
+        columns = self._columns
+        columns["x0"][i] = x0
+        columns["y0"][i] = y0
+        columns["x1"][i] = x1
+        columns["y1"][i] = y1
+        columns["category"][i] = category
+        columns["object_id"][i] = object_id
+        columns["instance_id"][i] = instance_id
+        columns["instance_key"][i] = instance_key
+        columns["visibility"][i] = visibility
+        columns["depth"][i] = depth
+        if "keypoints" in columns:
+            columns["keypoints"][i] = 0.0 if keypoints is None else keypoints
+        if "world_bounds" in columns:
+            columns["world_bounds"][i] = 0.0 if world_bounds is None else world_bounds
+        self._size += 1
+
+    def extend(self, **arrays):
+        """
+        Append a block of boxes given as equally sized arrays (or scalars) per column.
+        Columns that are not given are filled with their default value.
+        """
+        count = None
+        for value in arrays.values():
+            if np.ndim(value) > 0:
+                count = len(value)
+                break
+        if not count:
+            return
+
+        self._reserve(count)
+        start, stop = self._size, self._size + count
+        for name, column in self._columns.items():
+            if name in arrays:
+                column[start:stop] = arrays[name]
+            elif name in ("keypoints", "world_bounds"):
+                column[start:stop] = 0.0
+            else:
+                column[start:stop] = BBOX_COLUMNS[name][1]
+        self._size = stop
+
+    def filter(self, mask):
+        """Keep only the rows where `mask` is True (in place)."""
+        mask = np.asarray(mask, dtype=bool)
+        kept = int(mask.sum())
+        for name, column in self._columns.items():
+            column[:kept] = column[:self._size][mask]
+        self._size = kept
@@ -20,12 +20,21 @@ Created by Ryan Revilla
 
 import bpy
 from mathutils import Vector, Matrix
-from bpy_extras.object_utils import world_to_camera_view
 import numpy as np
 import bmesh
 from mathutils.bvhtree import BVHTree
+from .occlusion import (HierarchicalZBuffer, clip_boxes_to_near_plane, project_occluder_boxes,
+                        candidate_lookup, match_candidate_rows)
+from .bbox_core import (BBOX_KEYPOINT_SKELETON, CameraModel, transform_corners, corner_bounds,
+                        calculate_bbox_from_ndc, calculate_bboxes_from_ndc_batch, calculate_keypoints_from_ndc,
+                        compose_matrices, stratified_box_samples, shift_view_frame, stereo_eye_transform,
+                        points_in_bounds, PERSISTENT_ID_LEVELS, PERSISTENT_ID_UNUSED, NO_INSTANCER,
+                        name_code, instance_keys, object_keys)
+from .profiling import bulk_particle_limit
 
-MIN_BBOX_SIZE = 5  # Set a minimum size threshold (in pixels) for bounding boxes
+PROJECTION_BLOCK_SIZE = 65536  # Default instances per block, bounds the size of temporary arrays
+# Object types whose evaluated geometry scene.ray_cast can hit, so they can hide a box from raycast_fast
+OCCLUDER_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT', 'META'}
 
 
 def raycast_accurate(base_obj, camera, visibility_threshold=0.5,bbox=None,
@@ -51,16 +60,19 @@ def raycast_accurate(base_obj, camera, visibility_threshold=0.5,bbox=None,
     obj_origin = world_matrix @ Vector((0, 0, 0))
     view_direction = (obj_origin - cam_location).normalized()
 
-    visible_vertices = []
-
-    for v in mesh.vertices:
-        world_pos = world_matrix @ v.co
-        to_vertex = world_pos - cam_location
-
-        if to_vertex.dot(view_direction) > 0:
-            co_ndc = world_to_camera_view(scene, camera, world_pos)
-            if 0.0 <= co_ndc.x <= 1.0 and 0.0 <= co_ndc.y <= 1.0 and co_ndc.z > 0.0:
-                visible_vertices.append(world_pos)
+    # Vertices in front of the camera and inside the frame, culled in one pass
+    co = np.empty(len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("co", co)
+    matrix = np.array(world_matrix, dtype=np.float64)
+    world_co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    co_ndc = get_camera_model(camera, scene).project(world_co)
+    in_view = (
+        ((world_co - cam_location[:]) @ view_direction[:] > 0)
+        & (co_ndc[:, 0] >= 0) & (co_ndc[:, 0] <= 1)
+        & (co_ndc[:, 1] >= 0) & (co_ndc[:, 1] <= 1)
+        & (co_ndc[:, 2] > 0)
+    )
+    visible_vertices = [Vector(p) for p in world_co[in_view]]
 
     if not visible_vertices:
         obj_eval.to_mesh_clear()
@@ -97,86 +109,184 @@ def raycast_fast(target_location, camera, instance_object, bbox=None):
     direction = (target_location - cam_location).normalized()
 
     hit, loc, norm, idx, hit_obj, matrix = scene.ray_cast(depsgraph, cam_location, direction)
-    print("raycast hit loc: ", loc)
-    print("hit object: ", hit_obj)
-    print("desired object: ", instance_object)
     loc_in_box = False
     if bbox is not None:
         loc_in_box = is_point_in_bbox(bbox, loc)
-        print("location in box: ",loc_in_box)
 
     return hit and hit_obj.name == instance_object.name and (bbox is None or loc_in_box)
 
 
     
+def raycast_multi(corners_world, camera, target_name, visibility_threshold=0.5, num_samples=8,
+                  depsgraph=None, scene=None):
+    """
+    Middle tier between raycast_fast and raycast_accurate: cast rays to the bbox center plus `num_samples`
+    stratified points inside the 3D bound box given by its 8 world corners (bound_box order).
+    A ray counts as visible if it first hits `target_name` inside the box, as occluded if another object
+    is hit before the sample point, and is ignored otherwise (the ray passes through empty box space).
+    Stops as soon as the visible fraction is certain to reach `visibility_threshold` or can no longer reach it.
+    """
+    if scene is None:
+        scene = bpy.context.scene
+    if depsgraph is None:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    corners = np.asarray(corners_world, dtype=np.float64)
+    lower, upper = corners.min(axis=0), corners.max(axis=0)
+    # bound_box corners 4, 3 and 1 are the +x, +y and +z neighbours of corner 0
+    axes = np.stack([corners[4] - corners[0], corners[3] - corners[0], corners[1] - corners[0]])
+    points = corners[0] + stratified_box_samples(num_samples) @ axes
+
+    cam_location = camera.matrix_world.translation
+    num_visible = num_occluded = 0
+    remaining = len(points)
+
+    for point in points:
+        remaining -= 1
+        target = Vector(point)
+        to_target = target - cam_location
+        hit, loc, norm, idx, hit_obj, matrix = scene.ray_cast(depsgraph, cam_location, to_target.normalized())
+
+        if hit and hit_obj.name == target_name and points_in_bounds(loc[:], lower, upper):
+            num_visible += 1
+        elif hit and (loc - cam_location).length < to_target.length:
+            num_occluded += 1
+
+        # Bounds of the final visible fraction, whatever the remaining rays return
+        total = num_visible + num_occluded + remaining
+        if num_visible and num_visible >= visibility_threshold * total:
+            return True
+        if num_visible + remaining < visibility_threshold * total or (not num_visible and not remaining):
+            return False
+
+    return False
+
+
 def project_world_corners_to_ndc(corners_world, camera, scene):
-    return np.array([
-        world_to_camera_view(scene, camera, corner) for corner in corners_world
-    ])
+    return get_camera_model(camera, scene).project(np.array(corners_world, dtype=np.float64))
+
+
+class CameraView:
+    """
+    One rendered view of a camera object: the camera itself, or one eye of a stereo camera.
+    Carries what projection and raycasting read from a camera (name, matrix_world, data),
+    so it can be passed anywhere a camera object is accepted.
+    """
+
+    def __init__(self, camera, name=None, matrix_world=None, shift_x=0.0):
+        self.object = camera
+        self.data = camera.data
+        self.name = name or camera.name
+        self.matrix_world = matrix_world if matrix_world is not None else camera.matrix_world
+        self.shift_x = shift_x  # Extra lens shift of the view (stereo off-axis)
+
+
+def as_camera_view(camera):
+    return camera if isinstance(camera, CameraView) else CameraView(camera)
+
+
+def get_stereo_eye(camera, is_left, file_suffix):
+    """CameraView of the left or right eye of `camera`, placed from its stereo settings."""
+    data = camera.data
+    stereo = data.stereo
+    offset, angle, shift_x = stereo_eye_transform(
+        is_left, stereo.interocular_distance, stereo.convergence_distance,
+        convergence_mode=stereo.convergence_mode, pivot=stereo.pivot,
+        lens=data.lens, sensor_width=data.sensor_width,
+    )
+    matrix_world = camera.matrix_world.normalized() @ Matrix.Translation((offset, 0.0, 0.0)) @ Matrix.Rotation(angle, 4, 'Y')
+    return CameraView(camera, name=f"{camera.name}{file_suffix}", matrix_world=matrix_world, shift_x=shift_x)
+
+
+def get_multiview_camera(camera, scene, view):
+    """Camera of a render view in multi-view mode: the camera named with the view's camera suffix."""
+    base_name = camera.name
+    for other in scene.render.views:
+        if other.camera_suffix and base_name.endswith(other.camera_suffix):
+            base_name = base_name[:-len(other.camera_suffix)]
+            break
+    view_camera = scene.objects.get(base_name + view.camera_suffix)
+    if view_camera is None or view_camera.type != 'CAMERA':
+        return camera
+    return view_camera
+
+
+def get_render_views(camera, scene):
+    """
+    (CameraView, file suffix) of every view Blender renders for `camera`. Without multiview this is
+    the camera itself with no suffix; in stereo 3D mode its left and right eye; in multi-view mode the
+    camera of each enabled view. Suffixes are the view file suffixes Blender appends to the images.
+    """
+    render = scene.render
+    if not render.use_multiview:
+        return [(CameraView(camera), "")]
+
+    if render.views_format == 'STEREO_3D':
+        return [
+            (get_stereo_eye(camera, name == "left", render.views[name].file_suffix), render.views[name].file_suffix)
+            for name in ("left", "right")
+        ]
+
+    return [
+        (CameraView(get_multiview_camera(camera, scene, view)), view.file_suffix)
+        for view in render.views if view.use
+    ]
+
+
+# Camera view name -> (state key, CameraModel). Entries are rebuilt only when the state key changes.
+_camera_models = {}
+
+
+def get_camera_state(camera, scene):
+    """Everything a CameraModel depends on: camera transform, camera data and render settings."""
+    view = as_camera_view(camera)
+    data = view.data
+    render = scene.render
+    return (
+        tuple(value for row in view.matrix_world for value in row),
+        data.type, data.lens, data.ortho_scale,
+        data.sensor_width, data.sensor_height, data.sensor_fit,
+        data.shift_x + view.shift_x, data.shift_y, data.clip_start, data.clip_end,
+        render.resolution_x, render.resolution_y, render.pixel_aspect_x, render.pixel_aspect_y,
+    )
+
+
+def get_camera_model(camera, scene):
+    """
+    Cached CameraModel of `camera` (a camera object or CameraView) for the current frame. The view frame
+    and the inverted camera matrix are only recomputed when the camera, its data or the render settings change.
+    """
+    view = as_camera_view(camera)
+    state = get_camera_state(view, scene)
+    cached = _camera_models.get(view.name)
+    if cached is not None and cached[0] == state:
+        return cached[1]
+
+    data = view.data
+    render = scene.render
+    frame = np.array([v[:] for v in data.view_frame(scene=scene)[:3]], dtype=np.float64)
+    if view.shift_x:
+        frame = shift_view_frame(frame, view.shift_x, data.sensor_fit)
+    model = CameraModel(
+        np.array(view.matrix_world.normalized().inverted(), dtype=np.float64),
+        frame,
+        data.type == 'ORTHO',
+        clip_start=data.clip_start,
+        clip_end=data.clip_end,
+        resolution=(render.resolution_x, render.resolution_y),
+        pixel_aspect=(render.pixel_aspect_x, render.pixel_aspect_y),
+        sensor_fit=data.sensor_fit,
+        shift=(data.shift_x + view.shift_x, data.shift_y),
+    )
+    _camera_models[view.name] = (state, model)
+    return model
+
 
 def is_point_in_bbox(bbox_world, point_world):
     # takes in bbox corners and a point, both in world space
-    
-    # calculate min and max XYZ in world space
-    min_corner = Vector((
-        min(c[0] for c in bbox_world),
-        min(c[1] for c in bbox_world),
-        min(c[2] for c in bbox_world),
-    ))
-    max_corner = Vector((
-        max(c[0] for c in bbox_world),
-        max(c[1] for c in bbox_world),
-        max(c[2] for c in bbox_world),
-    ))
-    
-    # Step 4: Check if the point is inside
-    return all(min_corner[i] <= point_world[i] <= max_corner[i] for i in range(3))
-
-def calculate_bbox_from_ndc(corners_ndc, render_size, visibility_threshold, min_bbox_size):
-    res_x, res_y = render_size
-
-    # Filter for points in front of the camera (positive Z in NDC)
-    visible_points = corners_ndc[(corners_ndc[:, 2] > 0)]
-    if len(visible_points) <= 3:
-        return None
-
-    # Total area covered by projected bounding box (regardless of screen bounds)
-    total_rect_min = corners_ndc[:, :2].min(axis=0)
-    total_rect_max = corners_ndc[:, :2].max(axis=0)
-    total_area = np.prod(total_rect_max - total_rect_min)
-
-    # Clamp visible points to screen space and calculate visible area
-    clipped_visible = np.clip(visible_points[:, :2], 0, 1)
-    visible_rect_min = clipped_visible.min(axis=0)
-    visible_rect_max = clipped_visible.max(axis=0)
-    visible_area = np.prod(visible_rect_max - visible_rect_min)
-
-    # Compute how much of the object's projected area is actually visible on screen
-    visibility_percentage = (visible_area / total_area) * 100 if total_area > 0 else 0
-    if visibility_percentage < visibility_threshold:
-        return None
-
-    # Convert NDC coordinates to pixel coordinates
-    bbox_2d = []
-    for co_2d in corners_ndc:
-        x, y, z = co_2d
-        pixel_x = x * res_x
-        pixel_y = (1 - y) * res_y  # Flip Y-axis for image coordinates
-        bbox_2d.append((pixel_x, pixel_y))
-
-    # Clamp to image boundaries
-    min_x = max(0, min(p[0] for p in bbox_2d))
-    max_x = max(0, min(max(p[0] for p in bbox_2d), res_x))
-    min_y = max(0, min(p[1] for p in bbox_2d))
-    max_y = max(0, min(max(p[1] for p in bbox_2d), res_y))
-
-    # Filter out very small bounding boxes
-    bbox_width = max_x - min_x
-    bbox_height = max_y - min_y
-    if bbox_width < min_bbox_size or bbox_height < min_bbox_size:
-        return None
-
-    return (min_x, min_y), (max_x, max_y)
+    corners = np.array([c[:] for c in bbox_world], dtype=np.float64)
+    # Hits on the box faces may round to just outside it, see points_in_bounds
+    return bool(points_in_bounds(point_world[:], corners.min(axis=0), corners.max(axis=0)))
 
 def get_bbox_center_world(obj):
     # Each corner is in object space, so transform with obj.matrix_world
@@ -186,22 +296,27 @@ def get_bbox_center_world(obj):
     center_world = sum(bbox_corners_world, Vector()) / 8
     return center_world
 
-def get_filtered_bbox(obj, cam, render_resolution, *,min_bbox_size=5,visibility_threshold=0.5, use_raycast=True, raycast_method="accurate"):
+def get_filtered_bbox(obj, cam, render_resolution, result, category_id, *, filters=None, visibility_threshold=0.5, use_raycast=True, raycast_method="accurate", ray_samples=8):
+    """
+    Compute the filtered 2D bounding box of a mesh object and append it to `result` (a BBoxResult).
+    Returns True if a box was added.
+    """
     # Get the active scene and object's bounding box corners in world space
     scene = bpy.context.scene
     corners_world = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
 
-    # Project the 3D world-space corners to normalized device coordinates (NDC)
-    corners_ndc = project_world_corners_to_ndc(corners_world, cam, scene)
+    # Project the 3D world-space corners (plus the centroid when exporting keypoints) to NDC
+    points_world = corners_world
+    if result.has_keypoints:
+        points_world = corners_world + [sum(corners_world, Vector()) / 8]
+    points_ndc = project_world_corners_to_ndc(points_world, cam, scene)
+    corners_ndc = points_ndc[:8]
 
     # Calculate the 2D bounding box from the projected NDC values
-    bbox_2d = calculate_bbox_from_ndc(
-        corners_ndc, render_resolution,
-        visibility_threshold, min_bbox_size
-    )
+    bbox_2d = calculate_bbox_from_ndc(corners_ndc, render_resolution, filters)
 
     if bbox_2d is None:
-        return None
+        return False
 
     # Optionally perform raycasting to confirm visibility
     if use_raycast:
@@ -213,23 +328,54 @@ def get_filtered_bbox(obj, cam, render_resolution, *,min_bbox_size=5,visibility_
             # obj_origin = obj.matrix_world @ Vector((0, 0, 0))
             obj_origin = get_bbox_center_world(obj)
             is_visible = raycast_fast(obj_origin, cam, obj)
+        elif raycast_method == "multi":
+            is_visible = raycast_multi(corners_world, cam, obj.name, visibility_threshold, ray_samples)
         if not is_visible:
-            return None
-
-    return bbox_2d
-
-
-
-
-def get_instance_2d_bounding_box(matrix_world, instance_obj, camera_obj, scene,
-                                 min_bbox_size=5, use_raycast=False,
-                                 raycast_method='fast', visibility_threshold=0.5):
+            return False
+
+    append_bbox(result, bbox_2d, corners_ndc, category_id,
+                object_id=result.register_object(obj.name),
+                keypoints_ndc=points_ndc, render_size=render_resolution,
+                corners_world=corners_world)
+    return True
+
+
+def append_bbox(result, bbox_2d, corners_ndc, category_id, *, object_id=-1, instance_id=-1, instance_key=-1,
+                keypoints_ndc=None, render_size=None, corners_world=None):
+    """Append a bbox returned by calculate_bbox_from_ndc to a BBoxResult."""
+    (min_x, min_y), (max_x, max_y), visible_fraction = bbox_2d
+
+    keypoints = None
+    if result.has_keypoints:
+        keypoints = calculate_keypoints_from_ndc(keypoints_ndc, render_size)
+
+    world_bounds = None
+    if result.has_world_bounds:
+        corners = np.array(corners_world, dtype=np.float64)
+        world_bounds = (corners.min(axis=0), corners.max(axis=0))
+
+    result.append(min_x, min_y, max_x, max_y, category_id,
+                  object_id=object_id,
+                  instance_id=instance_id,
+                  instance_key=instance_key,
+                  visibility=visible_fraction,
+                  depth=corners_ndc[:, 2].mean(),  # camera-space depth of the bbox centroid
+                  keypoints=keypoints,
+                  world_bounds=world_bounds)
+
+
+def get_instance_2d_bounding_box(matrix_world, instance_obj, camera_obj, scene, result, category_id,
+                                 filters=None, use_raycast=False,
+                                 raycast_method='fast', visibility_threshold=0.5, ray_samples=8,
+                                 instance_id=-1, instance_key=-1):
     """
-    Compute 2D bounding box for a single instanced object given a transform matrix.
+    Compute 2D bounding box for a single instanced object given a transform matrix
+    and append it to `result` (a BBoxResult). Returns True if a box was added.
+    `instance_key` is the bbox_core.instance_keys identity of the instance, if known.
     Works for particles, GN instances, and collection instances.
     """
     if instance_obj.type != 'MESH':
-        return None
+        return False
 
     # Local space bbox
     local_bbox_corners = [Vector(corner) for corner in instance_obj.bound_box]
@@ -238,17 +384,18 @@ def get_instance_2d_bounding_box(matrix_world, instance_obj, camera_obj, scene,
     corners_world = [matrix_world @ c for c in local_bbox_corners]
     render_size = (scene.render.resolution_x, scene.render.resolution_y)
 
-    # Project to 2D (NDC space)
-    corners_ndc = project_world_corners_to_ndc(corners_world, camera_obj, scene)
+    # Project to 2D (NDC space), adding the centroid when exporting keypoints
+    points_world = corners_world
+    if result.has_keypoints:
+        points_world = corners_world + [sum(corners_world, Vector()) / 8]
+    points_ndc = project_world_corners_to_ndc(points_world, camera_obj, scene)
+    corners_ndc = points_ndc[:8]
 
     # Convert to 2D bbox
-    bbox_2d = calculate_bbox_from_ndc(
-        corners_ndc, render_size,
-        visibility_threshold, min_bbox_size
-    )
+    bbox_2d = calculate_bbox_from_ndc(corners_ndc, render_size, filters)
 
     if bbox_2d is None:
-        return None
+        return False
 
     if use_raycast:
         is_visible = False
@@ -259,134 +406,662 @@ def get_instance_2d_bounding_box(matrix_world, instance_obj, camera_obj, scene,
             # origin = matrix_world @ Vector((0, 0, 0))
             # obj_origin = get_bbox_center_world(instance_obj)
             obj_origin = sum(corners_world, Vector()) / 8
-            print("Target_Location (instance): ", obj_origin)
-            print("Target_Location: ", obj_origin)
             is_visible = raycast_fast(obj_origin, camera_obj, instance_obj, bbox=corners_world)
+        elif raycast_method == "multi":
+            is_visible = raycast_multi(corners_world, camera_obj, instance_obj.name,
+                                       visibility_threshold, ray_samples)
         if not is_visible:
+            return False
+
+    append_bbox(result, bbox_2d, corners_ndc, category_id,
+                object_id=result.register_object(instance_obj.name),
+                instance_id=instance_id,
+                instance_key=instance_key,
+                keypoints_ndc=points_ndc, render_size=render_size,
+                corners_world=corners_world)
+    return True
+
+
+def project_instance_batch(matrices, instance_obj, views, scene, category_id, instance_ids, *,
+                           instance_keys=None, filters=None, use_raycast=False,
+                           raycast_method='fast', visibility_threshold=0.5, ray_samples=8,
+                           block_size=PROJECTION_BLOCK_SIZE):
+    """
+    Batched get_instance_2d_bounding_box: project the bound_box of `instance_obj` through every
+    (4, 4) matrix in `matrices` into every (camera, BBoxResult) pair of `views` and append the accepted boxes.
+    Work is done in blocks of `block_size` instances; world-space corners are computed once per block
+    and shared by all cameras. Raycasting, when enabled, only runs for boxes that pass the projection filter.
+    `instance_keys` optionally gives the bbox_core.instance_keys identity of every instance.
+    Returns the number of boxes added over all views.
+    """
+    if instance_obj.type != 'MESH' or not len(matrices):
+        return 0
+
+    local_corners = np.array([corner[:] for corner in instance_obj.bound_box], dtype=np.float64)
+    cameras = [
+        (cam, result, get_camera_model(cam, scene), result.register_object(instance_obj.name))
+        for cam, result in views
+    ]
+    depsgraph = bpy.context.evaluated_depsgraph_get() if use_raycast else None
+    num_added = 0
+
+    for start in range(0, len(matrices), block_size):
+        block = matrices[start:start + block_size]
+        block_ids = instance_ids[start:start + block_size]
+        block_keys = None if instance_keys is None else instance_keys[start:start + block_size]
+
+        # (N, 8, 3) world space corners, plus the centroid when exporting keypoints
+        corners_world = transform_corners(block, local_corners)
+        points_world = np.concatenate([corners_world, corners_world.mean(axis=1, keepdims=True)], axis=1)
+
+        for cam, result, camera_model, object_id in cameras:
+            render_size = camera_model.resolution
+            points_ndc = camera_model.project(points_world if result.has_keypoints else corners_world)
+            corners_ndc = points_ndc[:, :8]
+
+            accepted, boxes, visible_fraction = calculate_bboxes_from_ndc_batch(corners_ndc, render_size, filters)
+
+            if use_raycast and raycast_method in ("accurate", "multi"):
+                for i in np.flatnonzero(accepted):
+                    if raycast_method == "accurate":
+                        corners = [Vector(c) for c in corners_world[i]]
+                        is_visible = raycast_accurate(instance_obj, cam, visibility_threshold,
+                                                      bbox=corners, world_matrix=Matrix(block[i].tolist()))
+                    else:
+                        is_visible = raycast_multi(corners_world[i], cam, instance_obj.name, visibility_threshold,
+                                                   ray_samples, depsgraph=depsgraph, scene=scene)
+                    accepted[i] = is_visible
+            elif use_raycast:
+                # One ray per accepted box to its center, with a single depsgraph for the block
+                rows = np.flatnonzero(accepted)
+                accepted[rows] = raycast_fast_batch(
+                    corners_world[rows].mean(axis=1), corner_bounds(corners_world[rows]),
+                    [instance_obj.name] * len(rows), cam, depsgraph, scene
+                )
+
+            if not accepted.any():
+                continue
+
+            columns = {
+                "x0": boxes[accepted, 0],
+                "y0": boxes[accepted, 1],
+                "x1": boxes[accepted, 2],
+                "y1": boxes[accepted, 3],
+                "category": category_id,
+                "object_id": object_id,
+                "instance_id": block_ids[accepted],
+                "visibility": visible_fraction[accepted],
+                "depth": corners_ndc[accepted, :, 2].mean(axis=1),
+            }
+            if block_keys is not None:
+                columns["instance_key"] = block_keys[accepted]
+            if result.has_keypoints:
+                columns["keypoints"] = calculate_keypoints_from_ndc(points_ndc[accepted], render_size)
+            if result.has_world_bounds:
+                columns["world_bounds"] = corner_bounds(corners_world[accepted])
+            result.extend(**columns)
+            num_added += int(accepted.sum())
+
+    return num_added
+
+
+def read_particle_fields(particles, start, stop, is_hair):
+    """
+    Float32 location (N, 3), rotation (N, 4, w first) and size, plus is_exist, birth_time and die_time of the
+    particles [start, stop) of a particle system, as a dict of arrays. The whole system is read with foreach_get;
+    foreach_get has no range, so a sub-range is read particle by particle and memory stays bounded by the range.
+    Hair systems use the root hair key as location, which is always read per particle.
+    """
+    count = stop - start
+    fields = {
+        "location": np.empty((count, 3), dtype=np.float32),
+        "rotation": np.empty((count, 4), dtype=np.float32),
+        "size": np.empty(count, dtype=np.float32),
+        "is_exist": np.empty(count, dtype=bool),
+        "birth_time": np.empty(count, dtype=np.float32),
+        "die_time": np.empty(count, dtype=np.float32),
+    }
+
+    whole = start == 0 and stop == len(particles)
+    if whole:
+        for name, array in fields.items():
+            if name != "location" or not is_hair:
+                particles.foreach_get(name, array.ravel())
+    if whole and not is_hair:
+        return fields
+
+    for i, particle in enumerate(particles if whole else particles[start:stop]):
+        fields["location"][i] = particle.hair_keys[0].co if is_hair else particle.location
+        if not whole:
+            fields["rotation"][i] = particle.rotation
+            fields["size"][i] = particle.size
+            fields["is_exist"][i] = particle.is_exist
+            fields["birth_time"][i] = particle.birth_time
+            fields["die_time"][i] = particle.die_time
+
+    return fields
+
+
+def particle_instance_keys(instance_obj, emitter_obj, psys_index, particle_indices):
+    """
+    instance_keys of the duplis `emitter_obj` renders for particles `particle_indices` of its particle system
+    `psys_index`, whose persistent_id is (particle index, particle system index, unused...).
+    """
+    count = len(particle_indices)
+    persistent_ids = np.full((count, PERSISTENT_ID_LEVELS), PERSISTENT_ID_UNUSED, dtype=np.int64)
+    persistent_ids[:, 0] = particle_indices
+    persistent_ids[:, 1] = psys_index
+    return instance_keys(np.full(count, name_code(instance_obj.name)), persistent_ids,
+                         np.full(count, name_code(emitter_obj.name)))
+
+
+def get_rendered_particle_mask(fields, psys_settings, frame):
+    """
+    Boolean mask of the particles of `fields` (see read_particle_fields) that are actually rendered at `frame`.
+    Unborn and dead particles are dropped unless the settings show them.
+    The viewport-only display percentage is ignored on purpose.
+    """
+    exists = fields["is_exist"]
+    if psys_settings.type == "HAIR":
+        return exists
+
+    unborn = frame < fields["birth_time"]
+    dead = frame >= fields["die_time"]
+    rendered = ~unborn & ~dead
+    if psys_settings.show_unborn:
+        rendered |= unborn
+    if psys_settings.use_dead:
+        rendered |= dead
+
+    return exists & rendered
+
+
+def iter_particle_blocks(psys, psys_settings, frame, block_size=PROJECTION_BLOCK_SIZE):
+    """
+    Yield (particle indices, float64 world matrices) of the particles of `psys` rendered at `frame`, in blocks
+    of at most `block_size`. Systems of up to bulk_particle_limit(block_size) particles are read at once with
+    foreach_get, larger ones `block_size` particles at a time, so memory stays under the configured ceiling.
+    Parents are skipped entirely when only child particles are rendered.
+    """
+    if psys_settings.child_type != 'NONE' and not psys_settings.use_parent_particles:
+        return
+
+    particles = psys.particles
+    count = len(particles)
+    is_hair = psys_settings.type == "HAIR"
+    chunk = count if count <= bulk_particle_limit(block_size) else block_size
+
+    for chunk_start in range(0, count, max(chunk, 1)):
+        fields = read_particle_fields(particles, chunk_start, min(chunk_start + chunk, count), is_hair)
+        rendered = np.flatnonzero(get_rendered_particle_mask(fields, psys_settings, frame))
+        for start in range(0, len(rendered), block_size):
+            rows = rendered[start:start + block_size]
+            matrices = compose_matrices(fields["location"][rows].astype(np.float64),
+                                        fields["rotation"][rows].astype(np.float64),
+                                        fields["size"][rows].astype(np.float64))
+            yield chunk_start + rows, matrices
+
+
+def get_collection_members(collection):
+    """Mesh objects a particle system can instance from `collection`, with an object -> index lookup."""
+    members = [obj for obj in collection.all_objects if obj.type == 'MESH']
+    return members, {obj: index for index, obj in enumerate(members)}
+
+
+def stream_instances(depsgraph, match, process_block, block_size=PROJECTION_BLOCK_SIZE):
+    """
+    Single traversal of depsgraph.object_instances shared by the particle and GN/collection instance paths.
+    `match(inst)` returns a (bucket key, member index) tuple for instances to keep, or None.
+    Matched transforms are copied into one fixed-size buffer shared by all buckets; whenever it is full (and at
+    the end) its rows are grouped by bucket and `process_block(key, matrices, member_indices, instance_ids, keys)`
+    is called per bucket, so memory stays bounded by `block_size` regardless of the instance and bucket count.
+    `keys` are the instance_keys of the block, from the object, the full persistent_id and the instancer.
+    Returns the number of matched instances.
+    """
+    bucket_lookup = {}
+    bucket_keys = []
+    matrices = np.empty((block_size, 4, 4))
+    member_indices = np.empty(block_size, dtype=np.int64)
+    instance_ids = np.empty(block_size, dtype=np.int64)
+    persistent_ids = np.empty((block_size, PERSISTENT_ID_LEVELS), dtype=np.int64)
+    object_codes = np.empty(block_size, dtype=np.int64)
+    instancer_codes = np.empty(block_size, dtype=np.int64)
+    buckets = np.empty(block_size, dtype=np.int64)
+
+    def flush(count):
+        keys = instance_keys(object_codes[:count], persistent_ids[:count], instancer_codes[:count])
+        order = np.argsort(buckets[:count], kind='stable')
+        groups, starts = np.unique(buckets[:count][order], return_index=True)
+        stops = list(starts[1:]) + [count]
+        for bucket, start, stop in zip(groups, starts, stops):
+            rows = order[start:stop]
+            process_block(bucket_keys[bucket], matrices[rows], member_indices[rows], instance_ids[rows], keys[rows])
+
+    count = 0
+    num_matched = 0
+    for inst in depsgraph.object_instances:
+        if not inst.is_instance:
+            continue
+        matched = match(inst)
+        if matched is None:
+            continue
+
+        key, member_index = matched
+        bucket = bucket_lookup.get(key)
+        if bucket is None:
+            bucket = bucket_lookup[key] = len(bucket_keys)
+            bucket_keys.append(key)
+
+        persistent_id = inst.persistent_id
+        matrices[count] = inst.matrix_world
+        member_indices[count] = member_index
+        instance_ids[count] = persistent_id[0]
+        persistent_ids[count] = persistent_id
+        object_codes[count] = name_code(inst.object.name)
+        instancer_codes[count] = name_code(inst.parent.name) if inst.parent else NO_INSTANCER
+        buckets[count] = bucket
+        count += 1
+        num_matched += 1
+
+        if count == block_size:
+            flush(count)
+            count = 0
+
+    if count:
+        flush(count)
+
+    return num_matched
+
+
+def stream_particle_instances(depsgraph, member_lookups, process_block, block_size=PROJECTION_BLOCK_SIZE):
+    """
+    Stream the render instances generated by particle systems, filtered by `inst.parent` and
+    `inst.particle_system`. Blender has already picked which object each particle instances,
+    so the member is resolved through `member_lookups` ({(emitter, psys name): {object: member index}}).
+    Blocks are passed to `process_block` keyed by (emitter, psys name), see stream_instances.
+    """
+    def match(inst):
+        psys = inst.particle_system
+        if psys is None:
+            return None
+        parent = inst.parent
+        if parent is None:
+            return None
+        key = (parent.original, psys.name)
+        lookup = member_lookups.get(key)
+        if lookup is None:
             return None
+        member_index = lookup.get(inst.object.original)
+        if member_index is None:
+            return None
+        return key, member_index
+
+    return stream_instances(depsgraph, match, process_block, block_size)
+
+
+def get_particle_system_members(psys_settings):
+    """Objects a particle system renders (instance_object or the instance_collection members), with a lookup."""
+    if psys_settings.render_type == 'COLLECTION' and psys_settings.instance_collection:
+        return get_collection_members(psys_settings.instance_collection)
+    if psys_settings.render_type == 'OBJECT' and psys_settings.instance_object:
+        instance_obj = psys_settings.instance_object
+        if instance_obj.type == 'MESH':
+            return [instance_obj], {instance_obj: 0}
+    return [], {}
 
-    return bbox_2d
+
+def project_member_instance_batch(matrices, member_indices, members, views, scene, category_id, instance_ids,
+                                  member_category_ids=None, instance_keys=None, **kwargs):
+    """
+    project_instance_batch for instances of several source objects: instances are grouped by member
+    and each group is projected with its own bound_box. `member_category_ids` optionally overrides
+    `category_id` per member. Returns the number of boxes added.
+    """
+    num_added = 0
+    order = np.argsort(member_indices, kind='stable')
+    groups, starts = np.unique(member_indices[order], return_index=True)
+    bounds = list(starts[1:]) + [len(order)]
+
+    for member_index, start, stop in zip(groups, starts, bounds):
+        rows = order[start:stop]
+        member_category = category_id if member_category_ids is None else member_category_ids[member_index]
+        num_added += project_instance_batch(
+            matrices[rows], members[member_index], views, scene, member_category,
+            instance_ids=instance_ids[rows],
+            instance_keys=None if instance_keys is None else instance_keys[rows], **kwargs
+        )
+    return num_added
+
+
+def loop_over_particle_instances(emitter_list, views, scene, *,
+                                 filters=None, use_raycast=False,
+                                 raycast_method='fast', visibility_threshold=0.5, ray_samples=8,
+                                 systems=None, block_size=PROJECTION_BLOCK_SIZE):
+    """
+    Label particle systems of every selected emitter from the depsgraph instance stream, in one traversal,
+    into every (camera, BBoxResult) pair of `views`.
+    Transforms are exactly the rendered ones (including hair and child particles).
+    `systems` optionally restricts this to a set of (emitter, psys name) keys.
+    Returns a dict of category_id -> rendered object/collection name for the systems that produced boxes.
+    """
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    cat_names = {}
+
+    member_tables = {}
+    for sel_emitter in emitter_list:
+        emitter_obj = sel_emitter.emitter_obj
+        if emitter_obj is None:
+            continue
+        for psys in emitter_obj.particle_systems:
+            key = (emitter_obj, psys.name)
+            if systems is not None and key not in systems:
+                continue
+            members, lookup = get_particle_system_members(psys.settings)
+            if members:
+                member_tables[key] = (members, lookup, sel_emitter.category_id, psys.settings)
+
+    if not member_tables:
+        return cat_names
+
+    def process_block(key, matrices, member_indices, particle_indices, keys):
+        members, lookup, cat_id, psys_settings = member_tables[key]
+        num_added = project_member_instance_batch(
+            matrices, member_indices, members, views, scene, cat_id,
+            instance_ids=particle_indices,
+            instance_keys=keys,
+            filters=filters,
+            use_raycast=use_raycast,
+            raycast_method=raycast_method,
+            visibility_threshold=visibility_threshold,
+            ray_samples=ray_samples,
+            block_size=block_size
+        )
+        if num_added:
+            if psys_settings.render_type == 'COLLECTION':
+                cat_names[cat_id] = psys_settings.instance_collection.name
+            else:
+                cat_names[cat_id] = members[0].name
+
+    stream_particle_instances(
+        depsgraph, {key: lookup for key, (members, lookup, cat_id, settings) in member_tables.items()},
+        process_block, block_size
+    )
+
+    return cat_names
 
 
-def loop_over_particles(sel_emitter, cam, scene, *,
-                        min_bbox_size=5, use_raycast=False,
-                        raycast_method='fast', visibility_threshold=0.5):
+def loop_over_particles(sel_emitter, views, scene, *,
+                        filters=None, use_raycast=False,
+                        raycast_method='fast', visibility_threshold=0.5, ray_samples=8,
+                        messages=None, block_size=PROJECTION_BLOCK_SIZE):
     """
-    Iterate over particle systems and compute 2D bounding boxes.
+    Iterate over particle systems and compute 2D bounding boxes into every (camera, BBoxResult) pair of `views`.
+    Only particles that are rendered at the current frame are projected.
+    Returns a dict of category_id -> instanced object name for the systems that produced boxes.
+    Warnings are appended to `messages` as (level, message) tuples if given.
     """
     emitter_obj = sel_emitter.emitter_obj
     depsgraph = bpy.context.evaluated_depsgraph_get()
     particle_systems = emitter_obj.evaluated_get(depsgraph).particle_systems
 
-    bboxes = []
-    cat_ids = []
-    cat_names = []
+    # Systems rendering a collection: which member each particle shows comes from the depsgraph instances
+    collection_systems = {
+        (emitter_obj, psys.name) for psys in emitter_obj.particle_systems
+        if psys.settings.render_type == 'COLLECTION'
+    }
+    cat_names = {}
+    if collection_systems:
+        cat_names = loop_over_particle_instances(
+            [sel_emitter], views, scene,
+            filters=filters,
+            use_raycast=use_raycast,
+            raycast_method=raycast_method,
+            visibility_threshold=visibility_threshold,
+            ray_samples=ray_samples,
+            systems=collection_systems,
+            block_size=block_size
+        )
 
     for i, psys in enumerate(particle_systems):
         psys_settings = emitter_obj.particle_systems[i].settings
         cat_id = sel_emitter.category_id
 
         instance_obj = psys_settings.instance_object
-        cat_name = instance_obj.name
-
 
         if not instance_obj:
             continue
 
-        psys_type = psys_settings.type
-        print("Type: ", psys_type)
-
-        for p in psys.particles:
-            # Compute world transform of the particle (position, rotation, scale)
-            
-            if psys_type == "HAIR":
-                # case for hair system
-                particle_matrix = Matrix.LocRotScale(
-                    p.hair_keys[0].co,
-                    p.rotation,
-                    Vector.Fill(3,p.size)
-                )
-            else:
-                # Case for normal particle system
-                particle_matrix = Matrix.LocRotScale(
-                    p.location,
-                    p.rotation,
-                    Vector.Fill(3, p.size)
-                )
-            # compute 2D bounding box
-            
-            bb_2d = get_instance_2d_bounding_box(
-                matrix_world=particle_matrix,
-                instance_obj=instance_obj,
-                camera_obj=cam,
-                scene=scene,
-                min_bbox_size=min_bbox_size,
+        cat_name = instance_obj.name
+
+        if psys_settings.render_type != 'OBJECT':
+            continue
+
+        if psys_settings.child_type != 'NONE' and messages is not None:
+            messages.append(('WARNING', f"{emitter_obj.name}: child particles of '{psys.name}' are not labeled"))
+
+        # Unborn/dead/non-rendered particles are dropped before projecting
+        num_added = 0
+        for particle_indices, matrices in iter_particle_blocks(psys, psys_settings, scene.frame_current_final,
+                                                               block_size):
+            num_added += project_instance_batch(
+                matrices, instance_obj, views, scene, cat_id,
+                instance_ids=particle_indices,
+                instance_keys=particle_instance_keys(instance_obj, emitter_obj, i, particle_indices),
+                filters=filters,
                 use_raycast=use_raycast,
                 raycast_method=raycast_method,
-                visibility_threshold=visibility_threshold
+                visibility_threshold=visibility_threshold,
+                ray_samples=ray_samples,
+                block_size=block_size
             )
-            if bb_2d:
-                bboxes.append(bb_2d)
-                cat_ids.append(cat_id)
-                cat_names.extend(cat_name)
+        if num_added:
+            cat_names[cat_id] = cat_name
 
-    return bboxes, cat_ids, cat_names
+    return cat_names
 
 
-def loop_over_instances_from_selection(object_to_cat, cam, scene, *,
-                                       min_bbox_size=5, use_raycast=False,
-                                       raycast_method='fast', visibility_threshold=0.5):
+def loop_over_instances_from_selection(object_to_cat, views, scene, *,
+                                       filters=None, use_raycast=False,
+                                       raycast_method='fast', visibility_threshold=0.5, ray_samples=8,
+                                       block_size=PROJECTION_BLOCK_SIZE):
     """
     Iterate over depsgraph instances, matching against a dict of original objects
-    (with assigned category IDs), and compute bounding boxes.
+    (with assigned category IDs), and compute bounding boxes into every (camera, BBoxResult) pair of `views`.
     Assumes filtering by 'include_instances' was already performed.
+    Instances are streamed and projected in blocks of `block_size`.
+    Returns the number of boxes added.
     """
     depsgraph = bpy.context.evaluated_depsgraph_get()
-    bboxes = []
-    cat_ids = []
 
-    print("Obj to Cat: ", object_to_cat)
-    for inst in depsgraph.object_instances:
-        if not inst.is_instance:
-            print("not instance")
+    # Precomputed lookups: the category of an instance comes from its source object or its shared mesh data
+    object_lookup = {}
+    data_lookup = {}
+    for match_obj, cat_id in object_to_cat.items():
+        if match_obj.type != 'MESH':
             continue
-        print("is instance")
+        object_lookup[match_obj] = cat_id
+        data_lookup.setdefault(match_obj.data, cat_id)
+
+    if not object_lookup:
+        return 0
+
+    # One member per instanced source object, so that instances sharing mesh data with a selected object
+    # are projected with their own bound_box (modifiers, dimensions) and raycast against their own name
+    members = []
+    member_category_ids = []
+    member_lookup = {}
+
+    def match(inst):
+        source_obj = inst.object.original
+        member_index = member_lookup.get(source_obj)
+        if member_index is not None:
+            return "selection", member_index
+
+        cat_id = object_lookup.get(source_obj)
+        if cat_id is None and source_obj.type == 'MESH':
+            cat_id = data_lookup.get(source_obj.data)
+        if cat_id is None:
+            return None
+        member_index = member_lookup[source_obj] = len(members)
+        members.append(source_obj.evaluated_get(depsgraph))
+        member_category_ids.append(cat_id)
+        return "selection", member_index
+
+    num_added = 0
+
+    def process_block(key, matrices, member_indices, instance_ids, keys):
+        nonlocal num_added
+        num_added += project_member_instance_batch(
+            matrices, member_indices, members, views, scene, None,
+            instance_ids=instance_ids,
+            instance_keys=keys,
+            member_category_ids=member_category_ids,
+            filters=filters,
+            use_raycast=use_raycast,
+            raycast_method=raycast_method,
+            visibility_threshold=visibility_threshold,
+            ray_samples=ray_samples,
+            block_size=block_size
+        )
 
-        # Get the source mesh from evaluated instance object
-        source_obj = inst.object.evaluated_get(depsgraph)
-        print("Source Object: ", source_obj)
-        if not source_obj or source_obj.type != 'MESH':
-            continue
+    stream_instances(depsgraph, match, process_block, block_size)
+    return num_added
 
-        # Match source_obj against user-specified originals (by identity or data block)
-        matched_cat_id = None
-        for match_obj, cat_id in object_to_cat.items():
-            if source_obj.original == match_obj or source_obj.data == match_obj.data:
-                matched_cat_id = cat_id
-                break
 
-        if matched_cat_id is None:
-            print("No matched category ID")
+def stream_occluders(depsgraph, process_block, block_size=PROJECTION_BLOCK_SIZE):
+    """
+    World-space bound_box corners of every rendered object of OCCLUDER_TYPES (objects and instances), in one
+    depsgraph traversal. Unlabeled objects count too, since raycast_fast stops at any surface.
+    Blocks are passed to `process_block(corners_world, keys)` with (N, 8, 3) corners and their (N,)
+    bbox_core.instance_keys (object_keys for non-instances), the identity the boxes of a BBoxResult carry.
+    """
+    shape_lookup = {}
+    shapes = []
+    matrices = np.empty((block_size, 4, 4))
+    shape_indices = np.empty(block_size, dtype=np.int64)
+    persistent_ids = np.empty((block_size, PERSISTENT_ID_LEVELS), dtype=np.int64)
+    object_codes = np.empty(block_size, dtype=np.int64)
+    instancer_codes = np.empty(block_size, dtype=np.int64)
+
+    def flush(count):
+        local_corners = np.array(shapes)[shape_indices[:count]]
+        keys = instance_keys(object_codes[:count], persistent_ids[:count], instancer_codes[:count])
+        process_block(transform_corners(matrices[:count], local_corners), keys)
+
+    count = 0
+    for inst in depsgraph.object_instances:
+        obj = inst.object
+        if obj.type not in OCCLUDER_TYPES:
             continue
-        print("Matched cat id: ", matched_cat_id)
-
-        bb_2d = get_instance_2d_bounding_box(
-            matrix_world=inst.matrix_world,
-            instance_obj=source_obj,
-            camera_obj=cam,
-            scene=scene,
-            min_bbox_size=min_bbox_size,
-            use_raycast=use_raycast,
-            raycast_method=raycast_method,
-            visibility_threshold=visibility_threshold
-        )
+        if inst.is_instance:
+            persistent_ids[count] = inst.persistent_id
+            instancer_codes[count] = name_code(inst.parent.name) if inst.parent else NO_INSTANCER
+        elif inst.show_self:
+            persistent_ids[count] = 0
+            instancer_codes[count] = NO_INSTANCER
+        else:
+            continue
+
+        shape_index = shape_lookup.get(obj.data)
+        if shape_index is None:
+            shape_index = shape_lookup[obj.data] = len(shapes)
+            shapes.append([corner[:] for corner in obj.bound_box])
+
+        matrices[count] = inst.matrix_world
+        shape_indices[count] = shape_index
+        object_codes[count] = name_code(obj.name)
+        count += 1
+        if count == block_size:
+            flush(count)
+            count = 0
+
+    if count:
+        flush(count)
+
+
+def insert_occluders(hzb, camera_model, corners_world, rows):
+    """Project (N, 8, 3) occluder corners into `camera_model` and insert their screen boxes into `hzb`."""
+    clip_start = camera_model.clip_start
+    corner_depths = camera_model.project(corners_world)[..., 2]
+    points, valid = clip_boxes_to_near_plane(corners_world, corner_depths, clip_start, BBOX_KEYPOINT_SKELETON)
+    boxes, near, keep = project_occluder_boxes(camera_model.project(points), valid,
+                                               camera_model.resolution, clip_start)
+    hzb.insert(boxes[keep], near[keep], rows[keep])
+
 
-        if bb_2d:
-            bboxes.append(bb_2d)
-            cat_ids.append(matched_cat_id)
+def raycast_fast_batch(centers_world, world_bounds, names, cam, depsgraph, scene):
+    """
+    raycast_fast for many targets with a single depsgraph: one ray from the camera to each center.
+    A target is visible if the first hit is the object called `names[i]` inside its world bounds (min, max).
+    Returns a boolean array.
+    """
+    cam_location = cam.matrix_world.translation
+    visible = np.zeros(len(centers_world), dtype=bool)
+
+    for i, (center, (lower, upper), name) in enumerate(zip(centers_world, world_bounds, names)):
+        direction = (Vector(center) - cam_location).normalized()
+        hit, loc, norm, idx, hit_obj, matrix = scene.ray_cast(depsgraph, cam_location, direction)
+        if hit and hit_obj.name == name:
+            visible[i] = bool(points_in_bounds(loc[:], lower, upper))
+
+    return visible
 
-    return bboxes, cat_ids
 
+def get_candidate_keys(result):
+    """instance_keys of the boxes of `result`, with object_keys of their object for boxes of real objects."""
+    keys = result.instance_key.copy()
+    is_object = (keys == -1) & (result.object_id >= 0)
+    if is_object.any():
+        codes = np.array([name_code(name) for name in result.object_names], dtype=np.int64)
+        keys[is_object] = object_keys(codes[result.object_id[is_object]])
+    return keys
 
 
+def apply_fast_occlusion(views, scene, block_size=PROJECTION_BLOCK_SIZE):
+    """
+    Fast-mode occlusion for every box of every (camera, BBoxResult) pair in `views` (results with world bounds).
+    All rendered geometry (labeled or not) is gathered once and rasterized as coarse boxes into one
+    HierarchicalZBuffer per camera; a box whose 3D center has nothing nearer in front of it is kept without a ray.
+    Only the remaining, ambiguous boxes are raycast (raycast_fast). Occluded boxes are removed in place.
+    Unlike raycast_fast alone, a kept box is not required to have its own surface on the ray to its center,
+    so objects whose center ray misses them (rings, hollow or concave shapes seen through an opening) are kept
+    as long as nothing else is in front of them. Returns the number of removed boxes.
+    """
+    views = [(cam, result) for cam, result in views if result]
+    if not views:
+        return 0
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    tests = []
+    for cam, result in views:
+        # Rows are the candidate's own id in the buffer, so a box is never occluded by itself
+        lookup = candidate_lookup(get_candidate_keys(result))
+        camera_model = get_camera_model(cam, scene)
+        tests.append((cam, result, lookup, camera_model, HierarchicalZBuffer(*camera_model.resolution)))
+
+    def process_block(corners_world, keys):
+        for cam, result, lookup, camera_model, hzb in tests:
+            insert_occluders(hzb, camera_model, corners_world, match_candidate_rows(lookup, keys))
+
+    stream_occluders(depsgraph, process_block, block_size)
+
+    num_removed = 0
+    for cam, result, lookup, camera_model, hzb in tests:
+        centers_world = result.world_bounds.mean(axis=1)
+        centers_ndc = camera_model.project(centers_world)
+        center_depths = centers_ndc[:, 2]
+        occluder_depths = hzb.occluder_depth(camera_model.to_pixels(centers_ndc), np.arange(len(result)))
+
+        visible = (center_depths > camera_model.clip_start) & (occluder_depths >= center_depths)
+        ambiguous = np.flatnonzero(~visible)
+        if len(ambiguous):
+            visible[ambiguous] = raycast_fast_batch(
+                centers_world[ambiguous], result.world_bounds[ambiguous],
+                [result.object_names[object_id] for object_id in result.object_id[ambiguous].tolist()],
+                cam, depsgraph, scene
+            )
+        print(f"🔍 Occlusion prepass ({cam.name}): {len(result) - len(ambiguous)} clear, {len(ambiguous)} raycast")
 
+        num_removed += len(result) - int(visible.sum())
+        result.filter(visible)
+    return num_removed
@@ -0,0 +1,147 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+from .bbox_core import project_points_to_ndc, calculate_bboxes_from_ndc_batch
+from .randomization import look_at_matrices, orbit_positions
+
+###
+# Camera viewpoint planner (NumPy only, no bpy).
+# Candidate viewpoints come from a low-discrepancy sequence over the shell, so the first candidates
+# of all frames already cover it evenly. A candidate is rejected with the same projected box filters
+# the annotations use; the next candidate of the frame is tried instead.
+###
+
+# Elevation range (radians) of the predefined shells. SHELL uses the range given by the caller.
+SHELL_ELEVATIONS = {
+    "SPHERE": (-np.pi / 2, np.pi / 2),
+    "HEMISPHERE": (0.0, np.pi / 2),
+}
+
+PLANNER_BLOCK_ELEMENTS = 1 << 20  # Projected corners per block, bounds the size of temporary arrays
+PLANNER_ROUND_ATTEMPTS = 4  # Candidates tried per frame at once
+
+
+def radical_inverse(indices, base):
+    """Van der Corput radical inverse of integer `indices` in `base`, vectorized."""
+    indices = np.asarray(indices, dtype=np.int64).copy()
+    inverse = np.zeros(indices.shape)
+    scale = 1.0 / base
+    while indices.any():
+        inverse += (indices % base) * scale
+        indices //= base
+        scale /= base
+    return inverse
+
+
+def shell_viewpoints(indices, seed, elevation_range, distance_range):
+    """
+    Viewpoint number `indices` of the seeded Halton sequence on a shell, as (azimuth, elevation, distance).
+    Points are spread uniformly over the area of the shell band; the seed rotates the whole sequence.
+    """
+    offsets = np.random.default_rng([int(seed) % 2 ** 32]).random(3)
+    u = np.stack([radical_inverse(indices + 1, base) for base in (2, 3, 5)], axis=-1)
+    u = (u + offsets) % 1.0
+
+    low, high = np.sin(elevation_range[0]), np.sin(elevation_range[1])
+    elevation = np.arcsin(np.clip(low + u[..., 1] * (high - low), -1.0, 1.0))
+    distance = distance_range[0] + u[..., 2] * (distance_range[1] - distance_range[0])
+    return 2 * np.pi * u[..., 0], elevation, distance
+
+
+def count_framed_targets(camera_matrices, target_corners, frame, is_ortho, render_size, filters=None):
+    """
+    Number of targets whose projected box passes `filters` for every candidate camera.
+    `camera_matrices` is (..., 4, 4) camera world matrices, `target_corners` the matching (..., T, 8, 3)
+    world corners. Returns an (...) integer array.
+    """
+    world_to_camera = np.linalg.inv(camera_matrices)
+    co_local = (np.einsum('...ij,...tkj->...tki', world_to_camera[..., :3, :3], target_corners)
+                + world_to_camera[..., None, None, :3, 3])
+    corners_ndc = project_points_to_ndc(co_local, np.eye(4), frame, is_ortho)
+
+    shape = corners_ndc.shape[:-2]
+    accepted, _, _ = calculate_bboxes_from_ndc_batch(corners_ndc.reshape(-1, 8, 3), render_size, filters)
+    return accepted.reshape(shape).sum(axis=-1)
+
+
+def plan_camera_schedule(seed, target_corners, frame, is_ortho, render_size, *, shell="HEMISPHERE",
+                         elevation_range=(0.0, np.pi / 2), distance_range=(5.0, 10.0),
+                         max_attempts=16, min_targets=1, filters=None, first_index=0, total_frames=None):
+    """
+    Pick one camera per frame from (F, T, 8, 3) world corners of the targets in each frame.
+    Candidate `a` of frame row `i` is viewpoint (first_index + i) + a * total_frames of the shell sequence,
+    so attempt 0 of all frames covers the shell first. The camera looks at the center of the targets.
+    The first candidate framing at least `min_targets` targets (see count_framed_targets) is kept;
+    if none does, the candidate framing the most targets is used and the frame is marked rejected.
+    Returns (camera matrices (F, 4, 4), framed target counts (F,), accepted mask (F,)).
+    """
+    target_corners = np.asarray(target_corners, dtype=np.float64)
+    num_frames, num_targets = target_corners.shape[:2]
+    total_frames = num_frames if total_frames is None else total_frames
+    elevation_range = SHELL_ELEVATIONS.get(shell, elevation_range)
+    max_attempts = max(1, max_attempts)
+
+    if num_targets:
+        centers = (target_corners.min(axis=(1, 2)) + target_corners.max(axis=(1, 2))) / 2
+    else:
+        centers = np.zeros((num_frames, 3))
+
+    matrices = np.empty((num_frames, 4, 4))
+    counts = np.full(num_frames, -1, dtype=np.int64)
+    pending = np.arange(num_frames)
+
+    # Rounds of a few attempts each; only frames without an accepted camera are tried again
+    for first_attempt in range(0, max_attempts, PLANNER_ROUND_ATTEMPTS):
+        attempts = np.arange(first_attempt, min(first_attempt + PLANNER_ROUND_ATTEMPTS, max_attempts))
+        block = max(1, PLANNER_BLOCK_ELEMENTS // max(1, len(attempts) * num_targets * 8))
+        still_pending = []
+
+        for start in range(0, len(pending), block):
+            rows = pending[start:start + block]
+            indices = (first_index + rows)[:, None] + attempts[None, :] * total_frames
+            azimuth, elevation, distance = shell_viewpoints(indices, seed, elevation_range, distance_range)
+            eyes = orbit_positions(np.zeros(3), azimuth, elevation, distance) + centers[rows, None, :]
+            candidates = look_at_matrices(eyes, np.broadcast_to(centers[rows, None, :], eyes.shape))
+
+            if num_targets:
+                corners = target_corners[rows]
+                framed = count_framed_targets(
+                    candidates, np.broadcast_to(corners[:, None], (len(rows), len(attempts)) + corners.shape[1:]),
+                    frame, is_ortho, render_size, filters,
+                )
+            else:
+                framed = np.zeros(indices.shape, dtype=np.int64)
+
+            # First accepted candidate, otherwise the best one so far
+            good = framed >= min_targets
+            choice = np.where(good.any(axis=1), good.argmax(axis=1), framed.argmax(axis=1))
+            best = framed[np.arange(len(rows)), choice]
+            better = best > counts[rows]
+            matrices[rows[better]] = candidates[np.flatnonzero(better), choice[better]]
+            counts[rows[better]] = best[better]
+            still_pending.append(rows[~good.any(axis=1)])
+
+        pending = np.concatenate(still_pending) if still_pending else pending[:0]
+        if not len(pending):
+            break
+
+    counts = np.maximum(counts, 0)
+    return matrices, counts, counts >= min_targets
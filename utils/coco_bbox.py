@@ -20,65 +20,234 @@ Created by Ryan Revilla
 
 from pathlib import Path
 import json
-
-def save_bboxes_coco_format(bboxes, category_ids, frame_num, image_width, image_height, output_dir, prefix=""):
-    """ Saves bounding boxes in COCO JSON format """
+import os
+import time
+from .file_utils import atomic_write_text
+
+def load_coco_data(json_path):
+    """ Load a COCO annotation file, or an empty dataset if it does not exist.
+    An unreadable file is moved aside (`.corrupt-<time>`) instead of being overwritten. """
+    json_path = Path(json_path)
+    if not json_path.exists():
+        return {"images": [], "annotations": [], "categories": []}
+
+    with json_path.open("r") as f:
+        try:
+            coco_data = json.load(f)
+        except json.JSONDecodeError:
+            coco_data = None
+    if coco_data is None:
+        # Keep the unreadable file around instead of silently overwriting the dataset
+        backup_path = json_path.with_name(f"{json_path.name}.corrupt-{int(time.time())}")
+        json_path.replace(backup_path)
+        print(f"⚠️ Could not parse {json_path}. Moved it to {backup_path} and started a new file.")
+        coco_data = {"images": [], "annotations": [], "categories": []}
+    return coco_data
+
+
+class CocoIndex:
+    """ A COCO file held in memory with image id -> image position and image id -> annotation positions,
+    so re-labeling a frame replaces its annotations in place instead of scanning (or duplicating) the
+    annotation list. Replaced annotations that are not reused become holes (None) in memory and are
+    dropped when the file is written. """
+
+    def __init__(self, coco_data, signature=None):
+        self.data = coco_data
+        self.signature = signature  # (mtime, size) of the file this index matches
+        self.images = {image["id"]: i for i, image in enumerate(coco_data["images"])}
+        self.annotations = {}
+        for i, annotation in enumerate(coco_data["annotations"]):
+            self.annotations.setdefault(annotation["image_id"], []).append(i)
+        self.next_annotation_id = max((annotation["id"] for annotation in coco_data["annotations"]), default=0) + 1
+
+    def has_image(self, image_id):
+        return image_id in self.images
+
+    def set_image(self, image):
+        position = self.images.get(image["id"])
+        if position is None:
+            self.images[image["id"]] = len(self.data["images"])
+            self.data["images"].append(image)
+        else:
+            self.data["images"][position] = image
+
+    def replace_annotations(self, image_id, annotations):
+        """Replace the annotations of an image, reusing the positions and ids of the old ones."""
+        rows = self.data["annotations"]
+        old_positions = self.annotations.pop(image_id, [])
+        positions = []
+        for i, annotation in enumerate(annotations):
+            if i < len(old_positions):
+                position = old_positions[i]
+                annotation["id"] = rows[position]["id"]
+                rows[position] = annotation
+            else:
+                position = len(rows)
+                annotation["id"] = self.next_annotation_id
+                self.next_annotation_id += 1
+                rows.append(annotation)
+            positions.append(position)
+        for position in old_positions[len(annotations):]:
+            rows[position] = None
+        if positions:
+            self.annotations[image_id] = positions
+
+    def to_json(self):
+        data = dict(self.data)
+        data["annotations"] = [annotation for annotation in self.data["annotations"] if annotation is not None]
+        return json.dumps(data, indent=4)
+
+
+# JSON path -> CocoIndex of the file as last read or written by this process
+_coco_indexes = {}
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_coco_index(json_path):
+    """ Cached CocoIndex of a COCO file. The file is only parsed again when it was changed
+    by someone else (its modification time or size differs from the last read or write). """
+    key = str(json_path)
+    index = _coco_indexes.get(key)
+    if index is None or index.signature != _file_signature(json_path):
+        coco_data = load_coco_data(json_path)
+        index = _coco_indexes[key] = CocoIndex(coco_data, _file_signature(json_path))
+    return index
+
+
+def coco_image_exists(json_path, image_id):
+    return get_coco_index(json_path).has_image(image_id)
+
+
+def clear_coco_indexes():
+    _coco_indexes.clear()
+
+
+def save_bboxes_coco_format(result, frame_num, image_width, image_height, output_dir, prefix="",
+                            keypoint_names=None, keypoint_skeleton=None, fsync=False,
+                            suffix="", view_index=0, num_views=1, split="train", overwrite=True):
+    """ Saves the boxes of a BBoxResult in COCO JSON format.
+    For multi-view renders, `suffix` is the view file suffix of the image and image ids are
+    frame_num * num_views + view_index, so every view of a frame is its own image.
+    If the result carries keypoints, annotations follow the COCO keypoints layout
+    and categories are described with `keypoint_names` and `keypoint_skeleton` (0-based edges).
+    Annotations go to `{split}.json`, so each dataset split has its own file.
+    A frame that is already in the file has its image and annotations replaced in place, or is left
+    untouched when `overwrite` is False.
+    The JSON file is replaced atomically; `fsync` also flushes it to disk. Returns the JSON file path. """
     
     output_dir = Path(output_dir)
-    json_path = output_dir / "train.json"
+    json_path = output_dir / f"{split}.json"
 
-    # Defensive check: ensure train.json is not a folder
+    # Defensive check: ensure the JSON path is not a folder
     if json_path.exists() and json_path.is_dir():
         raise ValueError(f"Expected a file path for COCO annotations, but found a directory: {json_path}")
     
     # Ensure output directory exists
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    image_filename = f"{prefix}{frame_num:04d}.png"
-
-    # Try to load existing data
-    if json_path.exists():
-        with json_path.open("r") as f:
-            try:
-                coco_data = json.load(f)
-            except json.JSONDecodeError:
-                coco_data = {"images": [], "annotations": [], "categories": []}
-    else:
-        coco_data = {"images": [], "annotations": [], "categories": []}
-
-    image_id = frame_num
-    if not any(img["id"] == image_id for img in coco_data["images"]):
-        coco_data["images"].append({
-            "id": image_id,
-            "file_name": image_filename,
-            "width": image_width,
-            "height": image_height
-        })
-
-    for i, bbox in enumerate(bboxes):
-        min_x, min_y = bbox[0]
-        max_x, max_y = bbox[1]
-        width = max_x - min_x
-        height = max_y - min_y
-
-        annotation_id = len(coco_data["annotations"]) + 1
-
-        coco_data["annotations"].append({
-            "id": annotation_id,
+    image_filename = f"{prefix}{frame_num:04d}{suffix}.png"
+
+    index = get_coco_index(json_path)
+    coco_data = index.data
+
+    image_id = frame_num * num_views + view_index
+    if not overwrite and index.has_image(image_id):
+        print(f"⏭️ Frame {frame_num} is already in {json_path}. Skipping (overwrite is off).")
+        return json_path
+
+    index.set_image({
+        "id": image_id,
+        "file_name": image_filename,
+        "width": image_width,
+        "height": image_height
+    })
+
+    # Convert whole columns at once instead of unpacking each box
+    category_ids = result.category.tolist()
+    boxes = zip(result.x0.tolist(), result.y0.tolist(),
+                (result.x1 - result.x0).tolist(), (result.y1 - result.y0).tolist())
+
+    keypoint_rows = None
+    if result.has_keypoints:
+        keypoint_rows = result.keypoints.reshape(len(result), -1).tolist()
+        num_keypoints = (result.keypoints[:, :, 2] > 0).sum(axis=1).tolist()
+
+    annotations = []
+    for i, (min_x, min_y, width, height) in enumerate(boxes):
+        annotation = {
+            "id": None,  # Assigned by replace_annotations
             "image_id": image_id,
             "category_id": category_ids[i],
             "bbox": [min_x, min_y, width, height],
             "area": width * height,
             "iscrowd": 0
-        })
+        }
+        if keypoint_rows is not None:
+            annotation["keypoints"] = keypoint_rows[i]
+            annotation["num_keypoints"] = num_keypoints[i]
+
+        annotations.append(annotation)
+
+    index.replace_annotations(image_id, annotations)
 
     # Add categories if missing
     if not coco_data["categories"]:
         unique_cats = sorted(set(category_ids))
         coco_data["categories"] = [{"id": cid, "name": f"class_{cid}"} for cid in unique_cats]
 
-    with json_path.open("w") as f:
-        json.dump(coco_data, f, indent=4)
+    if keypoint_rows is not None and keypoint_names:
+        # COCO skeletons are 1-based
+        skeleton = [[a + 1, b + 1] for a, b in (keypoint_skeleton or [])]
+        for category in coco_data["categories"]:
+            category.setdefault("keypoints", list(keypoint_names))
+            category.setdefault("skeleton", skeleton)
 
-    print(f"📄 Saved COCO annotation file: {json_path}")
+    atomic_write_text(json_path, index.to_json(), fsync=fsync)
+    index.signature = _file_signature(json_path)
 
+    print(f"📄 Saved COCO annotation file: {json_path}")
+    return json_path
+
+
+
+def repair_coco_file(json_path, frames, num_views=1, fsync=False):
+    """ Remove the images of `frames` (image id // num_views) and their annotations from a COCO file,
+    along with duplicate images and annotations of missing images, e.g. left behind by a render that was
+    interrupted after labeling. Annotation ids are renumbered so new annotations get unique ids.
+    Returns the number of removed images; the file is only rewritten if something changed. """
+
+    json_path = Path(json_path)
+    if not json_path.is_file():
+        return 0
+
+    coco_data = load_coco_data(json_path)
+    frames = set(frames)
+    images = []
+    image_ids = set()
+    for image in coco_data["images"]:
+        if image["id"] // num_views in frames or image["id"] in image_ids:
+            continue
+        image_ids.add(image["id"])
+        images.append(image)
+
+    annotations = [annotation for annotation in coco_data["annotations"] if annotation["image_id"] in image_ids]
+    renumbered = any(annotation["id"] != i for i, annotation in enumerate(annotations, start=1))
+    num_removed = len(coco_data["images"]) - len(images)
+    if not num_removed and len(annotations) == len(coco_data["annotations"]) and not renumbered:
+        return 0
+
+    for i, annotation in enumerate(annotations, start=1):
+        annotation["id"] = i
+    coco_data["images"] = images
+    coco_data["annotations"] = annotations
+    atomic_write_text(json_path, json.dumps(coco_data, indent=4), fsync=fsync)
+    _coco_indexes.pop(str(json_path), None)
+    print(f"🩹 Repaired COCO annotation file: {json_path} ({num_removed} images removed)")
+    return num_removed
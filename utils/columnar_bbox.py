@@ -0,0 +1,335 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import io
+import json
+import os
+import re
+from pathlib import Path
+import numpy as np
+from .file_utils import atomic_write_bytes, file_exists, forget_file
+from .manifest import release_columnar_frames
+
+# pyarrow is not bundled with Blender. Use it when the user installed it, otherwise fall back to .npz parts.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# One row per box. object_name is stored dictionary-encoded (object_id + object_names).
+COLUMNAR_FIELDS = ["frame", "category", "x0", "y0", "x1", "y1", "visibility", "object_id", "instance_id"]
+# Every frame of a part, with or without boxes: Parquet schema metadata (JSON list) / .npz array
+PART_FRAMES_KEY = "part_frames"
+
+
+def has_parquet():
+    return pq is not None
+
+
+class ColumnarWriter:
+    """
+    Buffers per-frame box tables and writes them as part files of `frames_per_part` frames.
+    Parquet parts hold one row group per frame; the .npz fallback holds the concatenated columns.
+    Parts also list their frames (PART_FRAMES_KEY), so frames without boxes are known to be written.
+    """
+
+    def __init__(self, output_dir, prefix="", frames_per_part=1, suffix=""):
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.suffix = suffix
+        self.frames_per_part = max(1, frames_per_part)
+        self._frames = []
+
+    def add_frame(self, result, frame_num, fsync=False):
+        """Add the boxes of a BBoxResult for one frame. Writes a part file once enough frames are buffered."""
+        names = result.object_names
+        columns = {
+            "frame": np.full(len(result), frame_num, dtype=np.int32),
+            "category": result.category.copy(),
+            "x0": result.x0.copy(),
+            "y0": result.y0.copy(),
+            "x1": result.x1.copy(),
+            "y1": result.y1.copy(),
+            "visibility": result.visibility.copy(),
+            "object_id": result.object_id.copy(),
+            "instance_id": result.instance_id.copy(),
+        }
+        self._frames.append((frame_num, columns, list(names)))
+
+        if len(self._frames) >= self.frames_per_part:
+            self.flush(fsync=fsync)
+
+    def flush(self, fsync=False):
+        """Write all buffered frames to one part file."""
+        if not self._frames:
+            return None
+
+        first, last = self._frames[0][0], self._frames[-1][0]
+        stem = f"{self.prefix}part-{first:06d}-{last:06d}{self.suffix}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        if has_parquet():
+            part_path = self.output_dir / f"{stem}.parquet"
+            data = self._encode_parquet()
+        else:
+            part_path = self.output_dir / f"{stem}.npz"
+            data = self._encode_npz()
+
+        atomic_write_bytes(part_path, data, fsync=fsync)
+        # Only now are these frames complete in the dataset manifest
+        release_columnar_frames(self.output_dir, self.suffix, [frame for frame, *_ in self._frames], part_path,
+                                fsync=fsync)
+        self._frames = []
+        print(f"📄 Saved columnar annotation part: {part_path}")
+        return part_path
+
+    def _encode_parquet(self):
+        tables = []
+        for frame_num, columns, names in self._frames:
+            arrays = {field: pa.array(columns[field]) for field in COLUMNAR_FIELDS if field != "object_id"}
+            arrays["object_name"] = pa.DictionaryArray.from_arrays(
+                pa.array(columns["object_id"]), pa.array(names, type=pa.string())
+            )
+            tables.append(pa.table(arrays))
+        return _write_parquet_tables(tables, [frame for frame, *_ in self._frames])
+
+    def _encode_npz(self):
+        # Merge the per-frame name tables into one vocabulary for the part
+        vocabulary = {}
+        object_ids = []
+        for frame_num, columns, names in self._frames:
+            remap = np.array([vocabulary.setdefault(name, len(vocabulary)) for name in names] or [0], dtype=np.int32)
+            ids = columns["object_id"]
+            object_ids.append(np.where(ids >= 0, remap[np.maximum(ids, 0)], -1).astype(np.int32))
+
+        arrays = {
+            field: np.concatenate([columns[field] for _, columns, _ in self._frames])
+            for field in COLUMNAR_FIELDS if field != "object_id"
+        }
+        arrays["object_id"] = np.concatenate(object_ids)
+        arrays["object_names"] = np.array(list(vocabulary), dtype=str)
+        arrays[PART_FRAMES_KEY] = np.array([frame for frame, *_ in self._frames], dtype=np.int32)
+        return _write_npz(arrays)
+
+
+def _write_parquet_tables(tables, frames):
+    """Parquet bytes of one row group per table, with `frames` in the schema metadata."""
+    sink = pa.BufferOutputStream()
+    schema = tables[0].schema.with_metadata({PART_FRAMES_KEY: json.dumps(list(frames))})
+    writer = pq.ParquetWriter(sink, schema)
+    for table in tables:
+        # Each write_table call becomes its own row group, so frames can be filtered without decoding others
+        writer.write_table(table.replace_schema_metadata(schema.metadata))
+    writer.close()
+    return sink.getvalue().to_pybytes()
+
+
+def _write_npz(arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+# Open writers keyed by output directory and view suffix. Flushed when a render finishes or is cancelled.
+_writers = {}
+
+
+def save_bboxes_columnar_format(result, frame_num, output_dir, prefix="", frames_per_part=1, fsync=False,
+                                suffix=""):
+    """ Appends the boxes of a BBoxResult to the columnar annotation store in `output_dir`.
+    Each render view (`suffix`, e.g. "_L") is written to its own part files.
+    Returns the annotation directory (the part file is only known once it is flushed). """
+    key = (str(Path(output_dir)), suffix)
+    writer = _writers.get(key)
+    if writer is None or writer.prefix != prefix or writer.frames_per_part != max(1, frames_per_part):
+        if writer is not None:
+            writer.flush()
+        writer = ColumnarWriter(output_dir, prefix=prefix, frames_per_part=frames_per_part, suffix=suffix)
+        _writers[key] = writer
+
+    writer.add_frame(result, frame_num, fsync=fsync)
+    return writer.output_dir
+
+
+def flush_columnar_writers(fsync=False):
+    """Write out every buffered frame (call at the end of a render)."""
+    for writer in _writers.values():
+        writer.flush(fsync=fsync)
+    _writers.clear()
+
+
+def _view_parts(directory, suffix, pattern):
+    """Part files of the render view `suffix` in `directory` matching the glob `pattern`, in order."""
+    part_stem = re.compile(r"part-\d+-\d+" + re.escape(suffix) + "$")
+    return sorted(path for path in Path(directory).glob(pattern) if part_stem.search(path.stem))
+
+
+def _view_part_files(directory, suffix):
+    """Parquet parts of the render view when pyarrow can read them and there are any, otherwise .npz parts."""
+    if has_parquet():
+        parquet_files = _view_parts(directory, suffix, "*.parquet")
+        if parquet_files:
+            return parquet_files
+    return _view_parts(directory, suffix, "*.npz")
+
+
+def _write_order(paths):
+    """Part files from the oldest to the most recently written one."""
+    return sorted(paths, key=lambda path: (path.stat().st_mtime_ns, path.name))
+
+
+def read_part_frames(path):
+    """
+    Frames written to a part file, including frames without boxes. Only the part's frame list is read;
+    parts written before frames were listed only report the frames with at least one box.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        if not has_parquet():
+            return set()
+        metadata = pq.read_schema(path).metadata or {}
+        frames = metadata.get(PART_FRAMES_KEY.encode())
+        if frames is not None:
+            return set(json.loads(frames))
+        return set(pq.read_table(path, columns=["frame"]).column("frame").to_numpy().tolist())
+    with np.load(path) as data:
+        if PART_FRAMES_KEY in data.files:
+            return set(data[PART_FRAMES_KEY].tolist())
+        return set(data["frame"].tolist())
+
+
+def load_columnar_frames(directory, suffix=""):
+    """Frames written to any part of the render view `suffix` in `directory`, including frames without boxes."""
+    frames = set()
+    for path in _view_parts(directory, suffix, "*.parquet") + _view_parts(directory, suffix, "*.npz"):
+        frames |= read_part_frames(path)
+    return frames
+
+
+def read_part_columns(path):
+    """Columns of one part file as a dict of arrays plus `object_name`."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        table = pq.read_table(path)
+        columns = {}
+        for field in table.column_names:
+            column = table.column(field)
+            if field == "object_name":
+                columns[field] = np.array(column.to_pylist(), dtype=str)
+            else:
+                columns[field] = column.to_numpy()
+        return columns
+
+    with np.load(path) as data:
+        columns = {key: data[key] for key in data.files if key != PART_FRAMES_KEY}
+    names = columns.pop("object_names")
+    ids = columns.pop("object_id")
+    columns["object_name"] = np.where(ids >= 0, names[np.maximum(ids, 0)] if len(names) else "", "")
+    return columns
+
+
+def load_columnar_annotations(directory, suffix=""):
+    """
+    Load every part of the render view `suffix` in `directory` as a dict of column arrays plus `object_name`.
+    Reads Parquet parts through pyarrow when available, otherwise .npz parts.
+    A frame written to several parts (rendered again after an interrupted render) is taken from the part
+    written last only.
+    """
+    paths = _view_part_files(directory, suffix)
+    if not paths:
+        return {}
+
+    owners = {}
+    for path in _write_order(paths):
+        owners.update(dict.fromkeys(read_part_frames(path), path))
+    owned = {path: [] for path in paths}
+    for frame, path in owners.items():
+        owned[path].append(frame)
+
+    parts = []
+    for path in paths:
+        columns = read_part_columns(path)
+        keep = np.isin(columns["frame"], owned[path])
+        parts.append({key: column[keep] for key, column in columns.items()})
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def remove_columnar_frames(directory, suffix, frames, fsync=False):
+    """
+    Remove `frames` from the parts of the render view `suffix` in `directory`, e.g. frames whose rows an
+    interrupted render wrote without their image, so they are not duplicated once they are rendered again.
+    Parts left without frames are deleted. Returns the number of removed frames.
+    """
+    frames = set(frames)
+    num_removed = 0
+    for path in _view_parts(directory, suffix, "*.parquet") + _view_parts(directory, suffix, "*.npz"):
+        if path.suffix == ".parquet" and not has_parquet():
+            continue
+        part_frames = read_part_frames(path)
+        removed = part_frames & frames
+        if not removed:
+            continue
+        num_removed += len(removed)
+        kept = sorted(part_frames - removed)
+        if not kept:
+            os.remove(path)
+            forget_file(path)
+            continue
+
+        if path.suffix == ".parquet":
+            table = pq.read_table(path)
+            frame_column = table.column("frame").to_numpy()
+            tables = [table.filter(pa.array(frame_column == frame)) for frame in kept]
+            data = _write_parquet_tables(tables, kept)
+        else:
+            with np.load(path) as part:
+                arrays = {key: part[key] for key in part.files}
+            keep = np.isin(arrays["frame"], kept)
+            for field in COLUMNAR_FIELDS:
+                arrays[field] = arrays[field][keep]
+            arrays[PART_FRAMES_KEY] = np.array(kept, dtype=np.int32)
+            data = _write_npz(arrays)
+        atomic_write_bytes(path, data, fsync=fsync)
+
+    if num_removed:
+        print(f"🩹 Removed {num_removed} frames of unfinished renders from the columnar parts in {directory}")
+    return num_removed
+
+
+def is_columnar_entry_written(entry, frame, root, part_frames):
+    """
+    True if the part file of a columnar manifest entry exists and holds `frame`.
+    `part_frames` caches the frames read per part file.
+    """
+    if not entry["labels"]:
+        return False
+    part_path = Path(root) / entry["labels"]
+    if part_path.suffix not in (".parquet", ".npz") or not file_exists(part_path):
+        return False
+    if not entry["num_boxes"]:
+        # Entries are only written once their part is, and parts written before frames were listed
+        # have no rows to look for
+        return True
+    key = str(part_path)
+    if key not in part_frames:
+        part_frames[key] = read_part_frames(part_path)
+    return frame in part_frames[key]
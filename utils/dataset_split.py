@@ -0,0 +1,82 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+###
+# Deterministic train/val/test split assignment (NumPy only, no bpy)
+###
+
+SPLITS = ("train", "val", "test")
+DEFAULT_SPLIT_RATIOS = (0.8, 0.1, 0.1)
+
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def split_hash(seed, frames):
+    """
+    Uniform [0, 1) value per frame from (seed, frame) with the SplitMix64 finalizer.
+    Independent of render order, so a frame lands in the same split on every run and every machine.
+    """
+    frames = np.atleast_1d(np.asarray(frames, dtype=np.int64)).astype(np.uint64)
+    # Array arithmetic on uint64 wraps silently, the seed offset is computed on Python ints
+    z = (frames + np.uint64(1)) * np.uint64(_GOLDEN_GAMMA) + np.uint64((seed * _GOLDEN_GAMMA) & _UINT64_MASK)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    # Top 53 bits -> exactly representable double in [0, 1)
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def assign_splits(seed, frames, ratios=DEFAULT_SPLIT_RATIOS):
+    """
+    Split index (into SPLITS) of every frame. `ratios` are the relative train/val/test shares and
+    are normalized; a split with ratio 0 never gets a frame. All-zero ratios put everything in train.
+    """
+    ratios = np.clip(np.asarray(ratios, dtype=np.float64), 0.0, None)
+    total = ratios.sum()
+    values = split_hash(seed, frames)
+    if total <= 0.0:
+        return np.zeros(len(values), dtype=np.int64)
+
+    bounds = np.cumsum(ratios / total)[:-1]
+    indices = np.searchsorted(bounds, values, side="right")
+    # Rounding in the cumulative sum must not send a frame to a split with ratio 0
+    empty = ratios[indices] == 0.0
+    if empty.any():
+        indices[empty] = np.flatnonzero(ratios)[-1]
+    return indices
+
+
+def frame_split(seed, frame, ratios=DEFAULT_SPLIT_RATIOS):
+    """Name of the split of a single frame."""
+    return SPLITS[int(assign_splits(seed, [frame], ratios)[0])]
+
+
+def get_frame_split(props, frame):
+    """Split of `frame` for the scene save settings (blv_save). Always "train" when splitting is disabled."""
+    if not props.use_split:
+        return "train"
+    return frame_split(props.split_seed, frame, get_split_ratios(props))
+
+
+def get_split_ratios(props):
+    return (props.split_train, props.split_val, props.split_test)
@@ -0,0 +1,210 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+###
+# Atomic file writes
+###
+
+# Mode of files created with open(path, "w"); reading the umask means setting it, so it is read once
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+DEFAULT_FILE_MODE = 0o666 & ~_UMASK
+
+
+def atomic_write_bytes(path, data, fsync=False):
+    """
+    Write `data` to `path` through a temp file in the same directory followed by a rename.
+    Readers (and a crashed Blender) only ever see the old or the new file, never a truncated one.
+    The file keeps the mode of the file it replaces, new files get the usual umask-based mode.
+    With `fsync`, the data and the directory entry are flushed to disk before returning.
+    """
+    path = Path(path)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        mode = DEFAULT_FILE_MODE
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp creates the file owner-only (0600)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+        record_file(path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync:
+        fsync_directory(path.parent)
+    else:
+        track_unsynced(path)
+
+
+def atomic_write_text(path, text, fsync=False):
+    """Text variant of atomic_write_bytes (UTF-8)."""
+    atomic_write_bytes(path, text.encode("utf-8"), fsync=fsync)
+
+
+def fsync_directory(path):
+    """Flush a directory entry (the rename) to disk. Not supported on Windows, where it is skipped."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+###
+# Fsync policy
+###
+
+FSYNC_POLICIES = [
+    ("NONE", "None", "Atomic writes only; survives a Blender crash but not a power loss"),
+    ("FRAME", "Every Frame", "Flush label files to disk after every frame"),
+    ("INTERVAL", "Every N Frames", "Flush label files to disk every N frames"),
+]
+
+_frames_since_fsync = 0
+# Files written without fsync since the last interval sync, only tracked under the INTERVAL policy
+_unsynced = set()
+_track_unsynced = False
+
+
+def should_fsync(policy, interval=1):
+    """
+    Decide whether the current frame's writes should be fsynced. Call once per frame, before its writes.
+    `policy` is one of the FSYNC_POLICIES identifiers. Under INTERVAL, the files written in the frames
+    in between are remembered and flushed on the interval frame, so at most `interval` frames can be lost.
+    """
+    global _frames_since_fsync, _track_unsynced
+
+    _track_unsynced = policy == "INTERVAL"
+    if policy == "FRAME":
+        return True
+    if policy == "INTERVAL":
+        _frames_since_fsync += 1
+        if _frames_since_fsync >= max(1, interval):
+            _frames_since_fsync = 0
+            sync_unsynced_files()
+            return True
+    return False
+
+
+def track_unsynced(path):
+    """Remember a file written without fsync, to be flushed by the next interval sync."""
+    if _track_unsynced:
+        _unsynced.add(str(path))
+
+
+def sync_unsynced_files():
+    """Fsync every file (and its directory) written without fsync since the last sync. Returns the file count."""
+    directories = set()
+    num_synced = 0
+    for path in _unsynced:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            # Replaced or removed since, its successor is tracked on its own
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        directories.add(os.path.dirname(path))
+        num_synced += 1
+    for directory in directories:
+        fsync_directory(directory)
+    _unsynced.clear()
+    return num_synced
+
+
+def reset_fsync_interval():
+    """Start a new render: flush what the previous one left unsynced and restart the frame count."""
+    global _frames_since_fsync
+    sync_unsynced_files()
+    _frames_since_fsync = 0
+
+
+###
+# Cached directory listings
+###
+
+# Directory -> set of entry names. Filled with one scandir per directory instead of one exists() per file.
+_listings = {}
+
+
+def list_directory(path):
+    """
+    Names in a directory, read once and cached. Files written or removed through record_file/forget_file
+    keep the cache current; call clear_directory_listings when other processes may have changed the tree.
+    A missing directory lists as empty.
+    """
+    key = str(path)
+    names = _listings.get(key)
+    if names is None:
+        try:
+            with os.scandir(key) as entries:
+                names = {entry.name for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            names = set()
+        _listings[key] = names
+    return names
+
+
+def file_exists(path):
+    """exists() through the cached listing of the parent directory."""
+    path = Path(path)
+    return path.name in list_directory(path.parent)
+
+
+def record_file(path):
+    path = Path(path)
+    names = _listings.get(str(path.parent))
+    if names is not None:
+        names.add(path.name)
+
+
+def forget_file(path):
+    path = Path(path)
+    names = _listings.get(str(path.parent))
+    if names is not None:
+        names.discard(path.name)
+
+
+def clear_directory_listings():
+    _listings.clear()
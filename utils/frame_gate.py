@@ -0,0 +1,87 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import io
+from pathlib import Path
+import numpy as np
+from .file_utils import atomic_write_bytes
+
+###
+# Pre-render frame gate (NumPy only, no bpy)
+###
+
+# Requirements a frame's labels must meet to be worth rendering
+DEFAULT_FRAME_GATE = {
+    "min_boxes": 1,         # Boxes with at least min_visibility
+    "min_classes": 0,       # Distinct categories among those boxes
+    "min_visibility": 0.0,  # Minimum box visibility for a box to count
+}
+
+
+def evaluate_label_gate(results, gate=None):
+    """
+    Check the BBoxResults of one frame (one per camera view) against the gate thresholds.
+    Every view has to pass. Returns (passed, boxes counted, classes counted), the counts being
+    those of the weakest view.
+    """
+    gate = {**DEFAULT_FRAME_GATE, **(gate or {})}
+    num_boxes = num_classes = None
+
+    for result in results:
+        counted = result.visibility >= gate["min_visibility"]
+        view_boxes = int(counted.sum())
+        view_classes = len(np.unique(result.category[counted]))
+        num_boxes = view_boxes if num_boxes is None else min(num_boxes, view_boxes)
+        num_classes = view_classes if num_classes is None else min(num_classes, view_classes)
+
+    if num_boxes is None:
+        return False, 0, 0
+    passed = num_boxes >= gate["min_boxes"] and num_classes >= gate["min_classes"]
+    return passed, num_boxes, num_classes
+
+
+def new_frame_plan(frames):
+    """Empty frame plan: per frame whether it passed the gate, its counts and the randomization variant used."""
+    num_frames = len(frames)
+    return {
+        "frame": np.asarray(frames, dtype=np.int64),
+        "accepted": np.zeros(num_frames, dtype=bool),
+        "num_boxes": np.zeros(num_frames, dtype=np.int64),
+        "num_classes": np.zeros(num_frames, dtype=np.int64),
+        "variant": np.zeros(num_frames, dtype=np.int64),
+    }
+
+
+def save_frame_plan(path, plan, fsync=False):
+    """Write a frame plan as an .npz file (atomically)."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **plan)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(path, buffer.getvalue(), fsync=fsync)
+
+
+def load_frame_plan(path):
+    """Read a plan written by save_frame_plan. Returns None if the file does not exist."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
@@ -0,0 +1,284 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+from .file_utils import track_unsynced
+
+###
+# Dataset manifest (no bpy)
+###
+
+MANIFEST_NAME = "manifest.jsonl"
+CHECKSUM_CHUNK = 1 << 20  # Bytes read at once when hashing a file
+
+
+class DatasetManifest:
+    """
+    Append-only JSONL index of the exported frames under the dataset root, one line per frame view.
+    A later line for the same (frame, view) supersedes the earlier ones. The file is read once into
+    a dict, so lookups are O(1) per frame and appending never rewrites the file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index = {}
+        self._size = 0
+        self._needs_newline = False
+        self.reload()
+
+    def reload(self):
+        """Re-read the manifest file, e.g. after another process appended to it."""
+        self.index = {}
+        self._size = 0
+        self._needs_newline = False
+        if not self.path.is_file():
+            return
+
+        with self.path.open("rb") as f:
+            data = f.read()
+        self._size = len(data)
+        # A line cut short by a crash is ignored, the next append starts on a new line
+        self._needs_newline = bool(data) and not data.endswith(b"\n")
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if isinstance(entry, dict) and "frame" in entry:
+                self.index[(entry["frame"], entry.get("view", ""))] = entry
+
+    def is_stale(self):
+        """True if the file changed size since it was read (written by another process)."""
+        try:
+            return self.path.stat().st_size != self._size
+        except FileNotFoundError:
+            return self._size != 0
+
+    def get(self, frame, view=""):
+        return self.index.get((frame, view))
+
+    def frame_entries(self, frame):
+        """Entries of every view of `frame`."""
+        return [entry for (entry_frame, _), entry in self.index.items() if entry_frame == frame]
+
+    def frames(self):
+        return {frame for frame, _ in self.index}
+
+    def __len__(self):
+        return len(self.index)
+
+    def append(self, entries, fsync=False):
+        """Append entries (dicts with at least "frame" and "view") as one write."""
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        if self._needs_newline:
+            lines = "\n" + lines
+        data = lines.encode("utf-8")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if not fsync:
+            track_unsynced(self.path)
+        self._size += len(data)
+        self._needs_newline = False
+        for entry in entries:
+            self.index[(entry["frame"], entry.get("view", ""))] = entry
+
+
+# Manifest path -> DatasetManifest
+_manifests = {}
+
+
+def get_manifest_path(props):
+    """Manifest file of the scene save settings (blv_save): manifest.jsonl in the dataset root."""
+    return Path(props.root_path) / MANIFEST_NAME
+
+
+def get_manifest(path):
+    """Cached manifest of `path`, re-read only when the file was changed by someone else."""
+    key = str(path)
+    manifest = _manifests.get(key)
+    if manifest is None:
+        manifest = _manifests[key] = DatasetManifest(path)
+    elif manifest.is_stale():
+        manifest.reload()
+    return manifest
+
+
+def clear_manifests():
+    _manifests.clear()
+    _staged.clear()
+    _unflushed.clear()
+    _flushed_parts.clear()
+
+
+###
+# Entry contents
+###
+
+def file_checksum(path):
+    """SHA-256 of a file, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHECKSUM_CHUNK), b""):
+                digest.update(chunk)
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+    return digest.hexdigest()
+
+
+def boxes_checksum(result):
+    """SHA-256 of the box columns of a BBoxResult, independent of the label format."""
+    digest = hashlib.sha256()
+    for column in (result.category, result.x0, result.y0, result.x1, result.y1):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    if result.has_keypoints:
+        digest.update(np.ascontiguousarray(result.keypoints).tobytes())
+    return digest.hexdigest()
+
+
+def category_histogram(result):
+    """Number of boxes per category id (JSON object keys are strings)."""
+    categories, counts = np.unique(result.category, return_counts=True)
+    return {str(category): count for category, count in zip(categories.tolist(), counts.tolist())}
+
+
+def state_hash(state):
+    """Short stable hash of a JSON-serializable description of the scene state."""
+    text = json.dumps(state, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def relative_path(path, root):
+    """`path` relative to the dataset root when it lies inside it, otherwise as given."""
+    if path is None:
+        return None
+    try:
+        return Path(path).relative_to(root).as_posix()
+    except ValueError:
+        return Path(path).as_posix()
+
+
+def new_manifest_entry(frame, view, result, root, image_path=None, label_path=None, label_format="",
+                       split="train", scene_hash="", label_checksum=None):
+    """Manifest entry of one frame view. The image checksum is filled in once the image is written."""
+    return {
+        "frame": frame,
+        "view": view,
+        "split": split,
+        "image": relative_path(image_path, root),
+        "labels": relative_path(label_path, root),
+        "format": label_format,
+        "num_boxes": len(result),
+        "categories": category_histogram(result),
+        "scene_hash": scene_hash,
+        "boxes_checksum": boxes_checksum(result),
+        "label_checksum": label_checksum,
+        "image_checksum": None,
+        "time": round(time.time(), 3),
+    }
+
+
+###
+# Staging until the image is written
+###
+
+# Manifest path -> (frame, entries, part keys) labeled before the render, appended once the image is on disk
+_staged = {}
+
+# Columnar rows are buffered until their part file is written, and the image may be written before or
+# after that. Part key (label directory, view suffix, frame) -> (manifest path, entry) of frames whose
+# image is written but whose rows are not, and -> part file of frames whose rows were written first.
+_unflushed = {}
+_flushed_parts = {}
+
+
+def columnar_part_key(label_dir, suffix, frame):
+    return str(Path(label_dir)), suffix, frame
+
+
+def stage_manifest_entries(path, frame, entries, part_keys=None):
+    """
+    Stage the entries of `frame` until its image is written. `part_keys` (see columnar_part_key) holds,
+    per entry, the columnar writer the boxes were buffered in, or None when the labels are already written.
+    """
+    _staged[str(path)] = (frame, entries, part_keys or [None] * len(entries))
+
+
+def commit_manifest_entries(path, frame, with_images=True, fsync=False):
+    """
+    Append the entries staged for `frame`, with the checksum of each rendered image. Entries whose
+    columnar rows are still buffered are held back until release_columnar_frames.
+    Returns the number of entries written (0 when nothing is staged for the frame).
+    """
+    key = str(path)
+    staged = _staged.get(key)
+    if staged is None or staged[0] != frame:
+        return 0
+    del _staged[key]
+
+    root = Path(path).parent
+    _, entries, part_keys = staged
+    ready = []
+    for entry, part_key in zip(entries, part_keys):
+        if with_images and entry["image"] is not None:
+            entry["image_checksum"] = file_checksum(root / entry["image"])
+        if part_key is None:
+            ready.append(entry)
+            continue
+        part_path = _flushed_parts.pop(part_key, None)
+        if part_path is None:
+            _unflushed[part_key] = (key, entry)
+        else:
+            entry["labels"] = relative_path(part_path, root)
+            ready.append(entry)
+    get_manifest(path).append(ready, fsync=fsync)
+    return len(ready)
+
+
+def release_columnar_frames(label_dir, suffix, frames, part_path, fsync=False):
+    """
+    Called once the columnar rows of `frames` are written to `part_path`: appends the held entries of
+    those frames, pointing at the part file, or remembers the part file until their image is written.
+    """
+    by_manifest = {}
+    for frame in frames:
+        part_key = columnar_part_key(label_dir, suffix, frame)
+        held = _unflushed.pop(part_key, None)
+        if held is None:
+            _flushed_parts[part_key] = part_path
+            continue
+        path, entry = held
+        entry["labels"] = relative_path(part_path, Path(path).parent)
+        by_manifest.setdefault(path, []).append(entry)
+
+    for path, entries in by_manifest.items():
+        get_manifest(path).append(entries, fsync=fsync)
@@ -0,0 +1,186 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+###
+# Occlusion prepass (NumPy only, no bpy)
+###
+
+HZB_CELL_SIZE = 4  # Pixels per cell on the finest level
+HZB_MAX_SPAN = 4  # Cells a box may span per axis on the level it is stored on
+
+
+def clip_boxes_to_near_plane(corners_world, corner_depths, clip_start, edges):
+    """
+    Points bounding the part of each (N, 8, 3) box that lies beyond the camera clip_start plane:
+    the 8 corners plus the intersection of every edge in `edges` with the plane.
+    Returns ((N, 8 + E, 3) world points, (N, 8 + E) mask of points on or beyond clip_start).
+    """
+    edges = np.asarray(edges)
+    a, b = edges[:, 0], edges[:, 1]
+    depth_a, depth_b = corner_depths[:, a], corner_depths[:, b]
+    crosses = (depth_a - clip_start) * (depth_b - clip_start) < 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(crosses, (clip_start - depth_a) / (depth_b - depth_a), 0.0)
+    edge_points = corners_world[:, a] + t[..., None] * (corners_world[:, b] - corners_world[:, a])
+
+    points = np.concatenate([corners_world, edge_points], axis=1)
+    valid = np.concatenate([corner_depths >= clip_start, crosses], axis=1)
+    return points, valid
+
+
+def project_occluder_boxes(points_ndc, valid, render_size, clip_start):
+    """
+    Conservative screen-space footprint of occluders from projected (N, P, 3) points
+    (see clip_boxes_to_near_plane), ignoring points where `valid` is False.
+    Returns (pixel boxes (N, 4) as x0, y0, x1, y1, near depth (N,), mask of boxes that can occlude anything).
+    """
+    res_x, res_y = render_size
+    pixel_x = points_ndc[..., 0] * res_x
+    pixel_y = (1 - points_ndc[..., 1]) * res_y
+
+    boxes = np.stack([
+        np.clip(np.where(valid, pixel_x, np.inf).min(axis=1), 0, res_x),
+        np.clip(np.where(valid, pixel_y, np.inf).min(axis=1), 0, res_y),
+        np.clip(np.where(valid, pixel_x, -np.inf).max(axis=1), 0, res_x),
+        np.clip(np.where(valid, pixel_y, -np.inf).max(axis=1), 0, res_y),
+    ], axis=1)
+    near = np.maximum(np.where(valid, points_ndc[..., 2], np.inf).min(axis=1), clip_start)
+
+    on_screen = valid.any(axis=1) & (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+    return boxes, near, on_screen
+
+
+def candidate_lookup(candidate_keys):
+    """Sorted keys and their row order, to find candidate boxes by key (see match_candidate_rows)."""
+    candidate_keys = np.asarray(candidate_keys, dtype=np.int64)
+    order = np.argsort(candidate_keys, kind='stable')
+    return candidate_keys[order], order
+
+
+def match_candidate_rows(lookup, keys):
+    """Row of the candidate box with each of `keys` (see bbox_core.instance_keys), -1 where none has it."""
+    sorted_keys, order = lookup
+    keys = np.asarray(keys, dtype=np.int64)
+    if not len(sorted_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    pos = np.clip(np.searchsorted(sorted_keys, keys), 0, len(sorted_keys) - 1)
+    return np.where(sorted_keys[pos] == keys, order[pos], -1)
+
+
+class HierarchicalZBuffer:
+    """
+    Low resolution, min-depth hierarchical Z-buffer built from screen-space boxes.
+    Each box is stored on the finest level where it spans at most HZB_MAX_SPAN cells per axis,
+    so inserting N boxes costs O(N) regardless of their size. Every cell keeps its two nearest
+    boxes, which lets a query ignore the box of the candidate itself. Coverage is always a superset of the boxes, so "nothing in front"
+    answers are conservative.
+    """
+
+    def __init__(self, width, height, cell_size=HZB_CELL_SIZE):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.num_levels = int(np.ceil(np.log2(max(width, height, cell_size) / cell_size))) + 1
+        self._levels = {}
+
+    def _grid(self, level):
+        size = self.cell_size * 2 ** level
+        return size, int(np.ceil(self.width / size)), int(np.ceil(self.height / size))
+
+    def insert(self, boxes, near_depths, ids):
+        """Insert (N, 4) pixel boxes with their nearest depth and an integer id per box (-1 = anonymous)."""
+        boxes = np.asarray(boxes, dtype=np.float64)
+        near_depths = np.asarray(near_depths, dtype=np.float64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(boxes):
+            return
+
+        extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        with np.errstate(divide='ignore'):
+            levels = np.ceil(np.log2(np.maximum(extent, 1e-6) / (self.cell_size * (HZB_MAX_SPAN - 1))))
+        levels = np.clip(levels, 0, self.num_levels - 1).astype(np.int64)
+
+        for level in np.unique(levels):
+            sel = levels == level
+            size, nx, ny = self._grid(level)
+            cx0 = np.clip((boxes[sel, 0] // size).astype(np.int64), 0, nx - 1)
+            cy0 = np.clip((boxes[sel, 1] // size).astype(np.int64), 0, ny - 1)
+            cx1 = np.clip((boxes[sel, 2] // size).astype(np.int64), 0, nx - 1)
+            cy1 = np.clip((boxes[sel, 3] // size).astype(np.int64), 0, ny - 1)
+
+            # A box spans at most HZB_MAX_SPAN cells per axis on its level
+            cells, depths, owners = [], [], []
+            for dx in range(HZB_MAX_SPAN):
+                for dy in range(HZB_MAX_SPAN):
+                    valid = (cx0 + dx <= cx1) & (cy0 + dy <= cy1)
+                    cells.append(((cy0 + dy) * nx + (cx0 + dx))[valid])
+                    depths.append(near_depths[sel][valid])
+                    owners.append(ids[sel][valid])
+            self._add_to_level(level, np.concatenate(cells), np.concatenate(depths), np.concatenate(owners))
+
+    def _add_to_level(self, level, cells, depths, owners):
+        existing = self._levels.get(level)
+        if existing is not None:
+            # Merge with the two entries already kept per cell
+            old_cells, min1, id1, min2, id2 = existing
+            cells = np.concatenate([cells, old_cells, old_cells])
+            depths = np.concatenate([depths, min1, min2])
+            owners = np.concatenate([owners, id1, id2])
+
+        order = np.lexsort((depths, cells))
+        cells, depths, owners = cells[order], depths[order], owners[order]
+        unique_cells, first = np.unique(cells, return_index=True)
+
+        second = first + 1
+        has_second = second < len(cells)
+        has_second[has_second] = cells[second[has_second]] == unique_cells[has_second]
+        second = np.where(has_second, second, first)
+
+        self._levels[level] = (
+            unique_cells,
+            depths[first], owners[first],
+            np.where(has_second, depths[second], np.inf), np.where(has_second, owners[second], -2),
+        )
+
+    def occluder_depth(self, points, exclude_ids):
+        """
+        Nearest depth of any box covering each (M, 2) pixel point, ignoring the box whose id equals
+        the matching entry of `exclude_ids`. Returns inf where nothing covers the point.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        exclude_ids = np.asarray(exclude_ids, dtype=np.int64)
+        nearest = np.full(len(points), np.inf)
+
+        for level, (cells, min1, id1, min2, id2) in self._levels.items():
+            size, nx, ny = self._grid(level)
+            cx = np.clip((points[:, 0] // size).astype(np.int64), 0, nx - 1)
+            cy = np.clip((points[:, 1] // size).astype(np.int64), 0, ny - 1)
+            query = cy * nx + cx
+
+            pos = np.clip(np.searchsorted(cells, query), 0, len(cells) - 1)
+            found = cells[pos] == query
+            own = (id1[pos] == exclude_ids) & (exclude_ids >= 0)
+            depth = np.where(own, min2[pos], min1[pos])
+            nearest = np.where(found, np.minimum(nearest, depth), nearest)
+
+        return nearest
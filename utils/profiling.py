@@ -0,0 +1,114 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+
+# Rough peak bytes needed per instance while a block is projected
+# (matrix, world corners, NDC points and the temporaries of the bbox filter).
+BYTES_PER_INSTANCE = 2048
+MIN_BLOCK_SIZE = 1024
+# Bytes per particle of whole-system foreach_get reads (location, rotation, size, existence and lifetimes,
+# plus the copies of the rendered rows)
+BYTES_PER_PARTICLE_READ = 64
+
+
+def block_size_for_memory(limit_mb):
+    """Number of instances processed per block so a block stays under `limit_mb` megabytes."""
+    return max(MIN_BLOCK_SIZE, int(limit_mb * 1024 * 1024) // BYTES_PER_INSTANCE)
+
+
+def bulk_particle_limit(block_size):
+    """Most particles read with whole-system foreach_get calls within the memory budget of `block_size`."""
+    return block_size * BYTES_PER_INSTANCE // BYTES_PER_PARTICLE_READ
+
+
+def get_current_rss_mb():
+    """Current resident set size of the Blender process in MB, or None if it can't be read on this platform."""
+    if sys.platform == "win32":
+        counters = _get_memory_counters_windows()
+        return None if counters is None else counters.WorkingSetSize / (1024 * 1024)
+
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def get_peak_rss_mb():
+    """
+    Peak resident set size of the Blender process over its whole lifetime in MB, or None if it can't be read
+    on this platform. It never goes down, see get_current_rss_mb for the memory in use now.
+    """
+    if sys.platform == "win32":
+        counters = _get_memory_counters_windows()
+        return None if counters is None else counters.PeakWorkingSetSize / (1024 * 1024)
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def _get_memory_counters_windows():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ok = ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+    except (AttributeError, OSError):
+        return None
+    if not ok:
+        return None
+    return counters
@@ -0,0 +1,281 @@
+'''
+Copyright (C) 2025 RRX Engineering
+http://www.rrxengineering.com
+
+Created by Ryan Revilla
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import io
+import json
+from pathlib import Path
+import numpy as np
+from .file_utils import atomic_write_bytes
+
+###
+# Domain randomization parameter table (NumPy only, no bpy).
+# Every frame draws its parameters from its own generator seeded with (seed, frame), so any frame
+# can be reproduced on its own and the table never depends on the frame range it was built for.
+###
+
+# Parameter ranges used by build_randomization_table. Angles are in radians, distances in scene units.
+DEFAULT_RANDOMIZATION_PARAMS = {
+    "target": (0.0, 0.0, 0.0),          # Point the camera and lights orbit and look at
+    "camera_distance": (5.0, 10.0),
+    "camera_elevation": (0.2, 1.2),     # Above the target's horizontal plane
+    "camera_roll": 0.0,                 # Maximum roll jitter either way
+    "light_distance": (4.0, 8.0),
+    "light_elevation": (0.3, 1.4),
+    "light_energy": (500.0, 1500.0),    # Watts
+    "light_temperature": (3000.0, 7000.0),  # Kelvin
+    "placement_extent": (2.0, 2.0, 0.0),    # Half size of the placement box around the target
+    "rotation_mode": "Z",               # NONE, Z (about the vertical axis) or FULL (uniform 3D rotation)
+    "scale": (1.0, 1.0),
+    "saturation": (0.5, 1.0),
+    "value": (0.5, 1.0),
+}
+
+# Uniform draws per frame, in the order they are taken from the frame generator.
+# Everything is always drawn, so disabling one part never changes the values of another.
+CAMERA_DRAWS = 4  # azimuth, elevation, distance, roll
+LIGHT_DRAWS = 5  # azimuth, elevation, distance, energy, temperature
+OBJECT_DRAWS = 11  # x, y, z, 3 rotation, scale, hue, saturation, value, variation
+
+
+# Table entries that describe the whole table rather than one frame
+TABLE_METADATA = ("object_names", "light_names", "key")
+
+
+def frame_uniforms(seed, frames, width, variants=None):
+    """
+    (F, width) uniform [0, 1) draws, one row per frame from a generator seeded with (seed, frame),
+    or (seed, frame, variant) for re-randomized frames with a non-zero variant.
+    """
+    table = np.empty((len(frames), width))
+    for row, frame in enumerate(frames):
+        entropy = [int(seed) % 2 ** 32, int(frame) % 2 ** 32]
+        if variants is not None and variants[row]:
+            entropy.append(int(variants[row]))
+        table[row] = np.random.default_rng(entropy).random(width)
+    return table
+
+
+def uniform_range(u, value_range):
+    low, high = value_range
+    return low + u * (high - low)
+
+
+def orbit_positions(target, azimuth, elevation, distance):
+    """(N, 3) points at `distance` from `target`, at the given azimuth and elevation (radians)."""
+    horizontal = np.cos(elevation) * distance
+    return np.asarray(target, dtype=np.float64) + np.stack([
+        horizontal * np.cos(azimuth),
+        horizontal * np.sin(azimuth),
+        np.sin(elevation) * distance,
+    ], axis=-1)
+
+
+def sample_elevation(u, elevation_range):
+    """Elevations spread uniformly over the area of the sphere band between the two angles."""
+    low, high = np.sin(elevation_range[0]), np.sin(elevation_range[1])
+    return np.arcsin(np.clip(low + u * (high - low), -1.0, 1.0))
+
+
+def look_at_matrices(eyes, targets, roll=None):
+    """
+    (N, 4, 4) world matrices of cameras/lights at `eyes` looking at `targets` (Blender convention:
+    looking down local -Z with local +Y up), rolled about the view axis by `roll` radians.
+    """
+    eyes = np.asarray(eyes, dtype=np.float64)
+    forward = np.asarray(targets, dtype=np.float64) - eyes
+    forward /= np.maximum(np.linalg.norm(forward, axis=-1, keepdims=True), 1e-12)
+
+    # World Z is up, unless looking straight up or down
+    up = np.broadcast_to([0.0, 0.0, 1.0], forward.shape)
+    vertical = np.abs(forward[..., 2]) > 0.999999
+    up = np.where(vertical[..., None], [0.0, 1.0, 0.0], up)
+
+    right = np.cross(forward, up)
+    right /= np.linalg.norm(right, axis=-1, keepdims=True)
+    camera_up = np.cross(right, forward)
+
+    if roll is not None:
+        cos_roll, sin_roll = np.cos(roll)[..., None], np.sin(roll)[..., None]
+        right, camera_up = cos_roll * right + sin_roll * camera_up, cos_roll * camera_up - sin_roll * right
+
+    matrices = np.zeros(eyes.shape[:-1] + (4, 4))
+    matrices[..., :3, 0] = right
+    matrices[..., :3, 1] = camera_up
+    matrices[..., :3, 2] = -forward
+    matrices[..., :3, 3] = eyes
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def random_quaternions(u1, u2, u3):
+    """Uniformly distributed w-first unit quaternions from three uniform [0, 1) draws (Shoemake)."""
+    a, b = np.sqrt(1 - u1), np.sqrt(u1)
+    return np.stack([
+        b * np.cos(2 * np.pi * u3),
+        a * np.sin(2 * np.pi * u2),
+        a * np.cos(2 * np.pi * u2),
+        b * np.sin(2 * np.pi * u3),
+    ], axis=-1)
+
+
+def z_rotation_quaternions(angle):
+    """w-first quaternions of rotations by `angle` radians about +Z."""
+    return np.stack([np.cos(angle / 2), np.zeros_like(angle), np.zeros_like(angle), np.sin(angle / 2)], axis=-1)
+
+
+def kelvin_to_rgb(temperature):
+    """Approximate linear 0-1 RGB of a black body at `temperature` Kelvin (1000-40000 K)."""
+    t = np.clip(np.asarray(temperature, dtype=np.float64), 1000.0, 40000.0) / 100.0
+    hot = np.maximum(t - 60.0, 1e-6)
+    red = np.where(t <= 66, 255.0, 329.698727446 * hot ** -0.1332047592)
+    green = np.where(t <= 66, 99.4708025861 * np.log(t) - 161.1195681661, 288.1221695283 * hot ** -0.0755148492)
+    blue = np.where(t >= 66, 255.0, np.where(t <= 19, 0.0, 138.5177312231 * np.log(np.maximum(t - 10, 1e-6)) - 305.0447927307))
+    return np.clip(np.stack([red, green, blue], axis=-1) / 255.0, 0.0, 1.0)
+
+
+def hsv_to_rgb(hue, saturation, value):
+    """Vectorized HSV (all 0-1) to RGB conversion."""
+    h6 = (np.asarray(hue) % 1.0) * 6.0
+    sector = np.floor(h6).astype(np.int64) % 6
+    f = h6 - np.floor(h6)
+    p = value * (1 - saturation)
+    q = value * (1 - saturation * f)
+    t = value * (1 - saturation * (1 - f))
+    choices = [
+        np.stack([value, t, p], axis=-1),
+        np.stack([q, value, p], axis=-1),
+        np.stack([p, value, t], axis=-1),
+        np.stack([p, q, value], axis=-1),
+        np.stack([t, p, value], axis=-1),
+        np.stack([value, p, q], axis=-1),
+    ]
+    return np.choose(sector[..., None], choices)
+
+
+def randomization_key(seed, frames, params, object_names, light_names):
+    """Identifies a table: it has to be rebuilt when any of these change."""
+    return json.dumps({
+        "seed": int(seed),
+        "frames": [int(frames[0]), int(frames[-1])] if len(frames) else [],
+        "params": {key: params[key] for key in sorted(params)},
+        "objects": list(object_names),
+        "lights": list(light_names),
+    }, sort_keys=True, default=list)
+
+
+def build_randomization_table(seed, frames, object_names=(), light_names=(), params=None, variants=None):
+    """
+    Precompute the per-frame randomization parameters for `frames` as a dict of arrays:
+        frame (F,)
+        camera_matrix (F, 4, 4)
+        light_matrix (F, L, 4, 4), light_energy (F, L), light_color (F, L, 3)
+        object_location (F, O, 3), object_rotation (F, O, 4) w-first quaternions, object_scale (F, O),
+        object_color (F, O, 3), object_variation (F, O)
+        variant (F,) the re-randomization count of each frame (see frame_uniforms)
+    plus the object_names, light_names and key it was built for. Object columns are float32 to keep
+    tables of 100k frames small; transforms are composed when a frame is applied.
+    """
+    params = {**DEFAULT_RANDOMIZATION_PARAMS, **(params or {})}
+    frames = np.asarray(frames, dtype=np.int64)
+    variants = np.zeros(len(frames), dtype=np.int64) if variants is None else np.asarray(variants, dtype=np.int64)
+    num_lights, num_objects = len(light_names), len(object_names)
+    target = np.asarray(params["target"], dtype=np.float64)
+
+    u = frame_uniforms(seed, frames, CAMERA_DRAWS + LIGHT_DRAWS * num_lights + OBJECT_DRAWS * num_objects, variants)
+    cam_u = u[:, :CAMERA_DRAWS]
+    light_u = u[:, CAMERA_DRAWS:CAMERA_DRAWS + LIGHT_DRAWS * num_lights].reshape(len(frames), num_lights, LIGHT_DRAWS)
+    obj_u = u[:, CAMERA_DRAWS + LIGHT_DRAWS * num_lights:].reshape(len(frames), num_objects, OBJECT_DRAWS)
+
+    # Camera on an orbit around the target, looking at it
+    camera_location = orbit_positions(
+        target, 2 * np.pi * cam_u[:, 0], sample_elevation(cam_u[:, 1], params["camera_elevation"]),
+        uniform_range(cam_u[:, 2], params["camera_distance"]),
+    )
+    roll = uniform_range(cam_u[:, 3], (-params["camera_roll"], params["camera_roll"]))
+    camera_matrix = look_at_matrices(camera_location, np.broadcast_to(target, camera_location.shape), roll)
+
+    # Lights on their own orbit, aimed at the target (matters for spot and area lights)
+    light_location = orbit_positions(
+        target, 2 * np.pi * light_u[..., 0], sample_elevation(light_u[..., 1], params["light_elevation"]),
+        uniform_range(light_u[..., 2], params["light_distance"]),
+    )
+    light_matrix = look_at_matrices(light_location, np.broadcast_to(target, light_location.shape))
+
+    # Objects inside the placement box
+    extent = np.asarray(params["placement_extent"], dtype=np.float64)
+    object_location = target + (2 * obj_u[..., 0:3] - 1) * extent
+    if params["rotation_mode"] == "FULL":
+        object_rotation = random_quaternions(obj_u[..., 3], obj_u[..., 4], obj_u[..., 5])
+    elif params["rotation_mode"] == "Z":
+        object_rotation = z_rotation_quaternions(2 * np.pi * obj_u[..., 3])
+    else:
+        object_rotation = z_rotation_quaternions(np.zeros(obj_u.shape[:-1]))
+
+    return {
+        "frame": frames,
+        "variant": variants,
+        "camera_matrix": camera_matrix,
+        "light_matrix": light_matrix,
+        "light_energy": uniform_range(light_u[..., 3], params["light_energy"]),
+        "light_color": kelvin_to_rgb(uniform_range(light_u[..., 4], params["light_temperature"])),
+        "object_location": object_location.astype(np.float32),
+        "object_rotation": object_rotation.astype(np.float32),
+        "object_scale": uniform_range(obj_u[..., 6], params["scale"]).astype(np.float32),
+        "object_color": hsv_to_rgb(obj_u[..., 7], uniform_range(obj_u[..., 8], params["saturation"]),
+                                   uniform_range(obj_u[..., 9], params["value"])).astype(np.float32),
+        "object_variation": obj_u[..., 10].astype(np.float32),
+        "object_names": np.array(list(object_names), dtype=str),
+        "light_names": np.array(list(light_names), dtype=str),
+        "key": np.array(randomization_key(seed, frames, params, object_names, light_names)),
+    }
+
+
+def table_row(table, frame):
+    """Row index of `frame` in a randomization table, or None if the table does not cover it."""
+    frames = table["frame"]
+    row = int(np.searchsorted(frames, frame))
+    if row < len(frames) and frames[row] == frame:
+        return row
+    return None
+
+
+def replace_table_row(table, row, frame_table):
+    """Overwrite row `row` of `table` with the single frame of `frame_table` (built for the same objects)."""
+    for key, values in frame_table.items():
+        if key not in TABLE_METADATA and key in table:
+            table[key][row] = values[0]
+
+
+def save_randomization_table(path, table, fsync=False):
+    """Write a randomization table as an .npz file (atomically)."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **table)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(path, buffer.getvalue(), fsync=fsync)
+
+
+def load_randomization_table(path):
+    """Read a table written by save_randomization_table. Returns None if the file does not exist."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
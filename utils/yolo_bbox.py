@@ -19,44 +19,82 @@ Created by Ryan Revilla
 '''
 
 from pathlib import Path
+import numpy as np
+from .file_utils import atomic_write_text, file_exists
 
 
 ###
 # Data formatting and saving
 ###
 
-def save_bboxes_yolo_format(bboxes, category_ids, frame_num, image_width, image_height, output_dir, category_mapping, prefix=""):
-    """ Saves bounding boxes in YOLO format and generates category files """
+YOLO_FORMAT_CHUNK = 65536  # Rows formatted per %-operation, bounds the size of the temporary argument tuple
+
+
+def format_yolo_labels(result, image_width, image_height):
+    """
+    Format all boxes of a BBoxResult as YOLO label text in bulk.
+    Output is byte-identical to formatting each line with f"{cat} {x:.6f} ..." (plus YOLO-pose keypoints).
+    """
+    # Normalize all bbox values at once (YOLO format: x_center, y_center, width, height)
+    columns = [
+        result.category.astype(np.float64),
+        ((result.x0 + result.x1) / 2) / image_width,
+        ((result.y0 + result.y1) / 2) / image_height,
+        (result.x1 - result.x0) / image_width,
+        (result.y1 - result.y0) / image_height,
+    ]
+    line_format = "%d %.6f %.6f %.6f %.6f"
+
+    if result.has_keypoints:
+        keypoints = result.keypoints.copy()
+        keypoints[:, :, 0] /= image_width
+        keypoints[:, :, 1] /= image_height
+        columns.extend(keypoints.reshape(len(result), -1).T)
+        line_format += " %.6f %.6f %d" * result.num_keypoints
+    line_format += "\n"
+
+    table = np.column_stack(columns)
+    chunks = []
+    for start in range(0, len(table), YOLO_FORMAT_CHUNK):
+        block = table[start:start + YOLO_FORMAT_CHUNK]
+        chunks.append((line_format * len(block)) % tuple(block.ravel().tolist()))
+    return "".join(chunks)
+
+
+def save_bboxes_yolo_format(result, frame_num, image_width, image_height, output_dir, category_mapping, prefix="",
+                            fsync=False, suffix="", overwrite=True):
+    """ Saves the boxes of a BBoxResult in YOLO format.
+    If the result carries keypoints, each line is extended to the YOLO-pose layout.
+    `suffix` is the render view file suffix (e.g. "_L"), so labels match per-view image names.
+    The label file is replaced atomically; `fsync` also flushes it to disk. With `overwrite` False an
+    existing label file is kept (checked against the cached directory listing). Returns the label file path. """
 
     output_dir = Path(output_dir) 
     output_dir.mkdir(parents=True, exist_ok=True)
-    label_file = output_dir / f"{prefix}{frame_num:04d}.txt"
+    label_file = output_dir / f"{prefix}{frame_num:04d}{suffix}.txt"
 
-    if not bboxes:
-        print(f"⚠️ No valid bboxes for frame {frame_num}. Skipping file.")
-        with open(label_file, "w") as f:
-            pass  # Create an empty label file for completeness
-        return
-
-    # Write YOLO annotation file
-    with label_file.open("w") as f:
-        for i, bbox in enumerate(bboxes):
-            (min_x, min_y), (max_x, max_y) = bbox
+    if not overwrite and file_exists(label_file):
+        print(f"⏭️ {label_file} exists. Skipping (overwrite is off).")
+        return label_file
 
-            # Normalize bbox values (YOLO format: x_center, y_center, width, height)
-            x_center = ((min_x + max_x) / 2) / image_width
-            y_center = ((min_y + max_y) / 2) / image_height
-            width = (max_x - min_x) / image_width
-            height = (max_y - min_y) / image_height
+    if not result:
+        print(f"⚠️ No valid bboxes for frame {frame_num}. Skipping file.")
+        atomic_write_text(label_file, "", fsync=fsync)  # Create an empty label file for completeness
+        return label_file
 
-            f.write(f"{category_ids[i]} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
+    # Format every line up front so the file is written with a single call
+    text = format_yolo_labels(result, image_width, image_height)
+    atomic_write_text(label_file, text, fsync=fsync)
 
     print(f"📄 Saved YOLO annotation file: {label_file}")
+    return label_file
 
   
 
-def generate_yolo_category_files(output_dir, category_mapping):
-    """Generates YOLO category files: `data.yaml` (Ultralytics-style)."""
+def generate_yolo_category_files(output_dir, category_mapping, kpt_shape=None, test_dir=None):
+    """Generates YOLO category files: `data.yaml` (Ultralytics-style).
+    Pass `kpt_shape` (e.g. [9, 3]) when labels carry YOLO-pose keypoints,
+    and `test_dir` (e.g. "images/test") when the dataset has a test split."""
 
     output_dir = Path(output_dir) 
     yaml_path = output_dir.parents[1] / "data.yaml"
@@ -67,7 +105,9 @@ def generate_yolo_category_files(output_dir, category_mapping):
         dataset_root=dataset_root,
         train_dir="images/train",
         val_dir="images/val",
-        category_mapping=category_mapping  # real ID mapping
+        test_dir=test_dir,
+        category_mapping=category_mapping,  # real ID mapping
+        kpt_shape=kpt_shape
     )
     print(f"📄 Saved YOLO data config file: {yaml_path}")
 
@@ -83,19 +123,24 @@ def write_yolo_config_yaml(path, train_path, val_path, class_names):
             f.write(f"  {i}: {name}\n")
 
 # method for writing yolo ultralytics format yaml file
-def write_ultralytics_yaml(output_path, dataset_root, train_dir, val_dir, test_dir=None, category_mapping=None):
+def write_ultralytics_yaml(output_path, dataset_root, train_dir, val_dir, test_dir=None, category_mapping=None, kpt_shape=None):
     output_path = Path(output_path)
     dataset_root = Path(dataset_root)
 
-    with output_path.open("w") as f:
-        f.write(f"path: {dataset_root}\n")
-        f.write(f"train: {train_dir}\n")
-        f.write(f"val: {val_dir}\n")
-        if test_dir:
-            f.write(f"test: {test_dir}\n")
-        f.write("names:\n")
-        for cid in sorted(category_mapping.keys()):
-            f.write(f"  {cid}: {category_mapping[cid]}\n")
+    lines = [
+        f"path: {dataset_root}\n",
+        f"train: {train_dir}\n",
+        f"val: {val_dir}\n",
+    ]
+    if test_dir:
+        lines.append(f"test: {test_dir}\n")
+    if kpt_shape:
+        lines.append(f"kpt_shape: [{kpt_shape[0]}, {kpt_shape[1]}]\n")
+    lines.append("names:\n")
+    for cid in sorted(category_mapping.keys()):
+        lines.append(f"  {cid}: {category_mapping[cid]}\n")
+
+    atomic_write_text(output_path, "".join(lines))
 
 
 